@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+
+"""
+Measures the import time of spfeas with `python -X importtime`
+
+Each statement, and each `spfeas` command line, runs in a new interpreter
+`--repeat` times. The cumulative time of every top-level import is read
+from the importtime report, and the median total (also net of a bare
+interpreter), the median wall time, the heaviest imports and the image
+libraries that were loaded are printed.
+
+Examples:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --statement "from spfeas.spfeas import main" --repeat 9
+    python benchmarks/import_time.py --cli "--version" "--options"
+"""
+
+from __future__ import print_function, division
+
+import sys
+import time
+import argparse
+import subprocess
+
+
+STATEMENTS = ['import spfeas',
+              'from spfeas.spfeas import main',
+              'from spfeas.spserve import submit_job']
+
+# The informational command lines, which should exit without the image libraries.
+CLI_ARGS = ['--version', '--options']
+
+# Runs the `spfeas` entry point, which exits after the informational options.
+CLI_STATEMENT = """import sys
+sys.argv = ['spfeas'] + {cli_args!r}
+from spfeas.spfeas import main
+try:
+    main()
+except SystemExit:
+    pass
+"""
+
+# The libraries that should only load to process an image.
+HEAVY_MODULES = ['osgeo', 'mpglue', 'numpy', 'scipy', 'skimage', 'cv2', 'sklearn', 'matplotlib']
+
+
+def _median(values):
+
+    values = sorted(values)
+    n_values = len(values)
+
+    if n_values % 2 == 1:
+        return values[n_values // 2]
+
+    return (values[n_values // 2 - 1] + values[n_values // 2]) / 2.
+
+
+def parse_importtime(report):
+
+    """
+    Parses an importtime report
+
+    Args:
+        report (str): The stderr of `python -X importtime`.
+
+    Returns:
+        A dictionary of the cumulative time (microseconds) of each
+            top-level import, and the set of every imported module
+    """
+
+    top_imports = dict()
+    imported = set()
+
+    for line in report.splitlines():
+
+        if not line.startswith('import time:') or ('|' not in line):
+            continue
+
+        self_time, cumulative_time, module_name = line[len('import time:'):].split('|')
+
+        if not cumulative_time.strip().isdigit():
+            continue
+
+        # Nested imports are indented below their parent.
+        is_top = len(module_name) - len(module_name.lstrip()) <= 1
+
+        module_name = module_name.strip()
+
+        imported.add(module_name.split('.')[0])
+
+        if is_top:
+            top_imports[module_name] = top_imports.get(module_name, 0) + int(cumulative_time)
+
+    return top_imports, imported
+
+
+def time_statement(statement, repeat=5, python=sys.executable):
+
+    """
+    Times one import statement
+
+    Args:
+        statement (str): The Python statement to run.
+        repeat (Optional[int]): The number of new interpreters.
+        python (Optional[str]): The interpreter.
+
+    Returns:
+        The median total (milliseconds), the median wall time (milliseconds),
+            the median cumulative time (milliseconds) of each top-level import,
+            and the heavy modules that were loaded
+    """
+
+    totals = list()
+    wall_times = list()
+    top_times = dict()
+    heavy_loaded = set()
+
+    for __ in range(0, repeat):
+
+        start_time = time.time()
+
+        process = subprocess.Popen([python, '-X', 'importtime', '-c', statement],
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   universal_newlines=True)
+
+        __, report = process.communicate()
+
+        wall_times.append((time.time() - start_time) * 1000.)
+
+        if process.returncode != 0:
+            raise RuntimeError('{} failed:\n{}'.format(statement, report[-2000:]))
+
+        top_imports, imported = parse_importtime(report)
+
+        totals.append(sum(top_imports.values()) / 1000.)
+
+        for module_name, cumulative_time in top_imports.items():
+            top_times.setdefault(module_name, list()).append(cumulative_time / 1000.)
+
+        heavy_loaded.update([module_name for module_name in HEAVY_MODULES if module_name in imported])
+
+    top_medians = dict([(module_name, _median(module_times)) for module_name, module_times in top_times.items()])
+
+    return _median(totals), _median(wall_times), top_medians, sorted(heavy_loaded)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Measures the import time of spfeas',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-s', '--statement', dest='statements', help='The statements to time', default=STATEMENTS,
+                        nargs='+')
+    parser.add_argument('-c', '--cli', dest='cli', help='The spfeas command lines to time', default=CLI_ARGS,
+                        nargs='+')
+    parser.add_argument('-r', '--repeat', dest='repeat', help='The number of runs of each statement', default=5,
+                        type=int)
+    parser.add_argument('-t', '--top', dest='top', help='The number of heaviest imports to show', default=5,
+                        type=int)
+
+    args = parser.parse_args()
+
+    # The interpreter start-up imports
+    baseline_ms = time_statement('pass', repeat=args.repeat)[0]
+
+    timings = [(statement, statement) for statement in args.statements] + \
+              [('spfeas {}'.format(cli_line), CLI_STATEMENT.format(cli_args=cli_line.split())) for cli_line in args.cli]
+
+    for label, statement in timings:
+
+        total_ms, wall_ms, top_medians, heavy_loaded = time_statement(statement, repeat=args.repeat)
+
+        print('{}: {:.1f} ms ({:.1f} ms over a bare interpreter, {:.1f} ms wall, median of {:d})'.format(label,
+                                                                                                       total_ms,
+                                                                                                       total_ms - baseline_ms,
+                                                                                                       wall_ms,
+                                                                                                       args.repeat))
+
+        for module_name, module_ms in sorted(top_medians.items(), key=lambda mt: mt[1], reverse=True)[:args.top]:
+            print('  {:>9.1f} ms  {}'.format(module_ms, module_name))
+
+        print('  Image libraries loaded: {}'.format(', '.join(heavy_loaded) if heavy_loaded else 'none'))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,31 @@
-from .spfeas import spatial_features
-from .test_spfeas import test_features
+# The processing modules are imported on the first call, so
+#   that importing the package does not load the image libraries.
+def spatial_features(input_image, output_dir, **kwargs):
+
+    """Computes spatial features. See `spfeas.spfeas.spatial_features`"""
+
+    from .spfeas import spatial_features as _spatial_features
+
+    return _spatial_features(input_image, output_dir, **kwargs)
+
+
+def batch_features(manifest, **kwargs):
+
+    """Computes spatial features for several scenes. See `spfeas.spbatch.batch_features`"""
+
+    from .spbatch import batch_features as _batch_features
+
+    return _batch_features(manifest, **kwargs)
+
+
+def test_features():
+
+    """Tests SpFeas features. See `spfeas.test_spfeas.test_features`"""
+
+    from .test_spfeas import test_features as _test_features
+
+    return _test_features()
+
 
 from .data import test_image, \
     training_01_4m, training_02_4m, training_03_4m, training_04_4m, training_05_4m, \
@@ -11,6 +37,7 @@ from .version import __version__
 
 
 __all__ = ['spatial_features',
+           'batch_features',
            'test_features',
            'test_image',
            'training_01_4m',
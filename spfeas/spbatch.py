@@ -0,0 +1,431 @@
+from __future__ import division
+from future.utils import viewitems
+
+import os
+import copy
+import argparse
+import multiprocessing as multi
+
+from .errors import logger
+from .sphelpers import sputilities
+from .sphelpers import spprogress
+from .sphelpers import spprofile
+from .sphelpers import spindices
+from .sphelpers import spneighbors
+
+# YAML
+try:
+    import yaml
+except:
+    logger.error('YAML must be installed')
+    raise ImportError
+
+
+def load_manifest(manifest):
+
+    """
+    Loads a batch manifest
+
+    The manifest is a list of scenes, each given as a dictionary with the
+    `input_image`, the `output_dir` and (optionally) the `spatial_features`
+    `parameters`.
+
+    Args:
+        manifest (str or list): The manifest YAML file or the list of scenes.
+
+    Returns:
+        The list of scenes
+    """
+
+    if isinstance(manifest, str):
+
+        with open(manifest, 'r') as mf:
+            manifest = yaml.safe_load(mf)
+
+    if not isinstance(manifest, list):
+
+        logger.error('  The manifest should be a list of scenes.')
+        raise TypeError
+
+    for scene in manifest:
+
+        if ('input_image' not in scene) or ('output_dir' not in scene):
+
+            logger.error('  Each scene needs an input_image and an output_dir.')
+            raise KeyError
+
+        _check_scene_parameters(scene)
+
+    return manifest
+
+
+def _check_scene_parameters(scene):
+
+    """
+    Checks that the parameters of a scene can share a worker pool
+
+    The single reader (`io_mode: single`) streams sections from the main
+    process to its own workers, so it cannot feed a shared pool.
+
+    Args:
+        scene (dict)
+    """
+
+    if (scene.get('parameters', None) or dict()).get('io_mode', 'parallel') == 'single':
+
+        logger.error('  {}: io_mode single is not supported with a shared worker pool.'.format(scene['input_image']))
+        raise ValueError
+
+
+def _setup_scene(parameter_object, run_configs):
+
+    """
+    Sets up the status and the trigger-band units of a scene
+
+    Args:
+        parameter_object (class)
+        run_configs (dict): The worker run configurations, updated in place.
+
+    Returns:
+        The status object, the section cache (or None), the units, the section costs, the cost model
+    """
+
+    from . import spprocess
+
+    mts, process_image = spprocess._setup_status(parameter_object)
+
+    scene_units = list()
+    section_costs = dict()
+
+    if not process_image:
+
+        logger.warning('The input image, {}, is set as finished processing.'.format(parameter_object.input_image))
+
+        return mts, None, scene_units, section_costs, None
+
+    section_cache = spprocess._setup_image(parameter_object)
+
+    cost_model = spprocess._load_cost_model(parameter_object)
+
+    original_band_positions = copy.copy(parameter_object.band_positions)
+
+    for trigger in parameter_object.triggers:
+
+        parameter_object.update_info(trigger=trigger,
+                                     band_positions=original_band_positions,
+                                     band_counter=0)
+
+        fused_triggers = spindices.get_fused_triggers(parameter_object)
+
+        # Fused spectral indices are processed with the first of them.
+        if fused_triggers and (trigger != fused_triggers[0]):
+            continue
+
+        parameter_object.update_info(fused_triggers=fused_triggers)
+
+        for band_position in parameter_object.band_positions:
+
+            parameter_object.update_info(band_position=band_position)
+
+            sections2process = spprocess._setup_band(parameter_object)
+
+            # The ids of finished jobs may be reused by a server, whose
+            #   tasks always carry their own configurations.
+            config_id = max(run_configs) + 1 if run_configs else 0
+            run_configs[config_id] = spprocess.get_run_config(parameter_object)
+
+            unit_costs = spprocess.get_section_costs(parameter_object, cost_model, sections2process)
+
+            scene_units.append(dict(param_dict=sputilities.class2dict(parameter_object),
+                                    tasks=dict([(section_task.section_counter, section_task)
+                                                for section_task in spprocess.get_section_tasks(parameter_object,
+                                                                                                config_id,
+                                                                                                sections2process)]),
+                                    costs=unit_costs))
+
+            # A section task costs the sum of its trigger-bands.
+            for section_counter, unit_cost in viewitems(unit_costs):
+                section_costs[section_counter] = section_costs.get(section_counter, 0) + unit_cost
+
+            parameter_object.band_counter += spneighbors.get_tile_bands(parameter_object, parameter_object.trigger)
+
+    return mts, section_cache, scene_units, section_costs, cost_model
+
+
+def _scene_section_read_write(scene_task):
+
+    """
+    Processes every trigger and band of one scene section
+
+    The trigger-bands of a section share one output tile, so they
+    are processed in order by the same worker. With `prefetch`, the
+    next trigger-band is read while the current one is computed.
+
+    Args:
+        scene_task (tuple): The scene index, the section counter, and a
+            list of (unit index, `SectionTask`) pairs.
+
+    Returns:
+        The scene index, the section counter, a list of (unit index, `SectionResult`)
+    """
+
+    from . import spprocess
+
+    scene_index, section_counter, unit_tasks = scene_task
+
+    section_tasks = [section_task for unit_index, section_task in unit_tasks]
+
+    if spprocess.run_configs[section_tasks[0].config_id]['prefetch'] > 0:
+        section_results = spprocess._section_batch_read_write(section_tasks)
+    else:
+        section_results = [spprocess._section_read_write(section_task) for section_task in section_tasks]
+
+    unit_results = [(unit_index, section_result)
+                    for (unit_index, section_task), section_result in zip(unit_tasks, section_results)]
+
+    return scene_index, section_counter, unit_results
+
+
+def _load_scene(scene, n_jobs, run_configs):
+
+    """
+    Loads the parameters of a scene and sets it up for a shared worker pool
+
+    Args:
+        scene (dict): The scene `input_image`, `output_dir` and (optional) `parameters`.
+        n_jobs (int): The number of parallel workers.
+        run_configs (dict): The worker run configurations, updated in place.
+
+    Returns:
+        The scene dictionary, a list of (section cost, section counter, unit tasks)
+    """
+
+    from .spfeas import SPParameters
+    from . import spprocess
+
+    _check_scene_parameters(scene)
+
+    scene_parameters = dict(scene.get('parameters', None) or dict())
+    scene_parameters['n_jobs'] = n_jobs
+
+    parameter_object = SPParameters(scene['input_image'], scene['output_dir'])
+    parameter_object.set_params(**scene_parameters)
+
+    spprocess._setup_run(parameter_object)
+
+    # The workers are shared by every scene, so
+    #   only the tuned section size is used.
+    if parameter_object.autotune:
+
+        n_workers = parameter_object.n_jobs
+
+        spprocess._autotune(parameter_object)
+
+        parameter_object.update_info(n_jobs=n_workers)
+
+    if parameter_object.approx and parameter_object.approx_report:
+        spprocess._validate_approx(parameter_object)
+
+    mts, section_cache, scene_units, section_costs, cost_model = _setup_scene(parameter_object, run_configs)
+
+    scene_dict = dict(parameter_object=parameter_object,
+                      mts=mts,
+                      section_cache=section_cache,
+                      cost_model=cost_model,
+                      units=scene_units,
+                      config_ids=sorted(set([section_task.config_id
+                                             for scene_unit in scene_units
+                                             for section_task in scene_unit['tasks'].values()])),
+                      n_remaining=len(section_costs))
+
+    section_tasks = [(section_cost,
+                      section_counter,
+                      [(unit_index, scene_unit['tasks'][section_counter])
+                       for unit_index, scene_unit in enumerate(scene_units)
+                       if section_counter in scene_unit['tasks']])
+                     for section_counter, section_cost in viewitems(section_costs)]
+
+    return scene_dict, section_tasks
+
+
+def _update_scene(scene_dict, section_counter, unit_results, progress_monitor=None):
+
+    """
+    Records the results of one scene section
+
+    Args:
+        scene_dict (dict): The scene dictionary from `_load_scene`.
+        section_counter (int)
+        unit_results (list): The (unit index, `SectionResult`) pairs of the section.
+        progress_monitor (Optional[`ProgressMonitor` object])
+
+    Returns:
+        Whether every section of the scene is finished
+    """
+
+    from . import spprocess
+
+    for unit_index, section_result in unit_results:
+
+        scene_unit = scene_dict['units'][unit_index]
+
+        unit_parameter_object = sputilities.dict2class(copy.copy(scene_unit['param_dict']))
+
+        spprocess._set_section_status(unit_parameter_object, section_counter, section_result.is_corrupt)
+
+        spprocess._update_section_cost(unit_parameter_object,
+                                       scene_dict['cost_model'],
+                                       section_result,
+                                       scene_unit['costs'][section_counter])
+
+        if progress_monitor:
+
+            progress_monitor.update(unit_parameter_object.trigger,
+                                    section_result,
+                                    scene_unit['costs'][section_counter])
+
+    scene_dict['n_remaining'] -= 1
+
+    return scene_dict['n_remaining'] == 0
+
+
+def batch_features(manifest, n_jobs=-1, metrics_file=None, metrics_interval=10.):
+
+    """
+    Computes spatial features for several scenes with one worker pool
+
+    Every (scene, section) is one task. All trigger-bands of a section are
+    processed by the same task. Tasks are dispatched longest first across all
+    scenes, so the pool stays busy across scene boundaries. Each scene keeps its
+    own status file, tiles and VRT mosaic.
+
+    Args:
+        manifest (str or list): The manifest YAML file or the list of scenes. See `load_manifest`.
+        n_jobs (Optional[int]): The number of parallel workers.
+        metrics_file (Optional[str]): A progress metrics file to refresh. See `ProgressMonitor`.
+        metrics_interval (Optional[float]): The time (seconds) between progress metrics refreshes.
+    """
+
+    from . import spprocess
+
+    scenes = load_manifest(manifest)
+
+    # The run configuration of every scene trigger-band,
+    #   installed once in each worker.
+    run_configs = dict()
+
+    scene_info = list()
+    scene_tasks = list()
+
+    for scene_index, scene in enumerate(scenes):
+
+        logger.info('  Setting up scene {:d} of {:d} ({}) ...'.format(scene_index+1,
+                                                                      len(scenes),
+                                                                      scene['input_image']))
+
+        scene_dict, section_tasks = _load_scene(scene, n_jobs, run_configs)
+
+        scene_info.append(scene_dict)
+
+        scene_tasks += [(section_cost, scene_index, section_counter, unit_tasks)
+                        for section_cost, section_counter, unit_tasks in section_tasks]
+
+    # Longest tasks first
+    scene_tasks = [(scene_index, section_counter, unit_tasks)
+                   for section_cost, scene_index, section_counter, unit_tasks in sorted(scene_tasks,
+                                                                                         key=lambda st: st[0],
+                                                                                         reverse=True)]
+
+    logger.info('  Processing {:,d} sections of {:d} scenes ...'.format(len(scene_tasks), len(scenes)))
+
+    # Scenes without sections to process are finished now.
+    for scene_index, scene_dict in enumerate(scene_info):
+
+        if scene_dict['n_remaining'] == 0:
+            _finish_scene(scene_dict)
+
+    if scene_tasks:
+
+        n_workers = scene_info[0]['parameter_object'].n_jobs
+        gdal_cache = max([scene_dict['parameter_object'].gdal_cache for scene_dict in scene_info])
+
+        progress_monitor = spprogress.ProgressMonitor(n_workers,
+                                                      metrics_file=metrics_file,
+                                                      refresh_interval=metrics_interval,
+                                                      label=os.path.basename(manifest) if isinstance(manifest, str) else None)
+
+        progress_monitor.add_sections([unit_cost
+                                       for scene_dict in scene_info
+                                       for scene_unit in scene_dict['units']
+                                       for unit_cost in scene_unit['costs'].values()])
+
+        pool = multi.Pool(processes=n_workers,
+                          initializer=spprocess._init_worker,
+                          initargs=(run_configs, gdal_cache, n_workers))
+
+        try:
+
+            for scene_index, section_counter, unit_results in pool.imap_unordered(_scene_section_read_write,
+                                                                                  scene_tasks,
+                                                                                  chunksize=1):
+
+                if _update_scene(scene_info[scene_index], section_counter, unit_results, progress_monitor=progress_monitor):
+                    _finish_scene(scene_info[scene_index])
+
+        except:
+
+            pool.terminate()
+            raise
+
+        pool.close()
+        pool.join()
+        pool = None
+
+        progress_monitor.refresh()
+
+
+def _finish_scene(scene_dict):
+
+    """Clears the section cache and builds the mosaic of a finished scene"""
+
+    from . import spprocess
+
+    logger.info('  Finishing {} ...'.format(scene_dict['parameter_object'].input_image))
+
+    if scene_dict['section_cache']:
+        scene_dict['section_cache'].clear()
+
+    if scene_dict['cost_model']:
+        spprocess._save_cost_model(scene_dict['parameter_object'], scene_dict['cost_model'])
+
+    if scene_dict['parameter_object'].profile:
+        spprofile.merge_profiles(scene_dict['parameter_object'])
+
+    spprocess._finish_image(scene_dict['parameter_object'], scene_dict['mts'])
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog='spfeas batch',
+                                     description='Computes spatial features for several scenes with one worker pool',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-m', '--manifest', dest='manifest', help='The YAML manifest of scenes', default=None)
+    parser.add_argument('--n-jobs', dest='n_jobs', help='The number of parallel workers', default=-1, type=int)
+    parser.add_argument('--metrics-file', dest='metrics_file',
+                        help='A progress metrics file to refresh during processing (.prom for the Prometheus text format, otherwise JSON)',
+                        default=None)
+    parser.add_argument('--metrics-interval', dest='metrics_interval',
+                        help='The time (seconds) between progress metrics refreshes', default=10., type=float)
+
+    args = parser.parse_args(argv)
+
+    if not args.manifest:
+
+        logger.error('  The manifest must be given.')
+        raise NameError
+
+    batch_features(args.manifest,
+                   n_jobs=args.n_jobs,
+                   metrics_file=args.metrics_file,
+                   metrics_interval=args.metrics_interval)
@@ -16,11 +16,10 @@ import time
 import copy
 
 from .errors import logger
-from . import spprocess
-from .sphelpers.sputilities import set_yaml_file
 
-from mpglue.raster_tools import DRIVER_DICT
-from mpglue import utils
+# MpGlue, GDAL and the spfeas helpers are imported where they are
+#   used, so that importing the package (or submitting a job) does
+#   not load the image libraries. See benchmarks/import_time.py.
 
 try:
     import colorama
@@ -82,7 +81,31 @@ class SPParameters(object):
                               section_size=1000,
                               gdal_cache=256,
                               overwrite=False,
-                              overviews=False)
+                              overviews=False,
+                              storage='float32',
+                              trigger_storage=None,
+                              check_storage=False,
+                              cache_size=0,
+                              cache_dir=None,
+                              global_stats=False,
+                              skip_nodata=False,
+                              nodata=None,
+                              align_sections=False,
+                              prefetch=0,
+                              prefetch_mem=1024,
+                              io_mode='parallel',
+                              result_store=None,
+                              update=False,
+                              metrics_file=None,
+                              metrics_interval=10.,
+                              profile=False,
+                              profile_triggers=None,
+                              profile_sections=None,
+                              autotune=False,
+                              autotune_mem=0,
+                              approx=None,
+                              approx_factor=2,
+                              approx_report=False)
 
         # Set the features dictionary.
         self.features_dict = dict(ctr=1,
@@ -134,6 +157,8 @@ class SPParameters(object):
 
     def _crosscheck_sensor(self):
 
+        from mpglue import utils
+
         for trigger in self.triggers:
 
             if trigger.upper() in utils.SUPPORTED_VIS:
@@ -159,6 +184,13 @@ class SPParameters(object):
         Sets user-defined parameters
         """
 
+        from mpglue import utils
+
+        from .sphelpers.sputilities import set_yaml_file
+        from .sphelpers.spstorage import parse_trigger_storage
+        from .sphelpers.spapprox import parse_approx
+        from .sphelpers.spneighbors import get_tile_bands
+
         for k, v in viewitems(kwargs):
             setattr(self, k, v)
 
@@ -190,13 +222,8 @@ class SPParameters(object):
             self.band_info[trigger] = copy.copy(self.band_info['band_count'])
 
             # The total band count.
-            self.band_info['band_count'] += self.out_bands_dict[trigger] * self.n_bands
-
-        # Update the feature dictionary for feature neighbors.
-        if self.neighbors:
-
-            for key, val in viewitems(self.features_dict):
-                self.features_dict[key] *= 5
+            # The neighbor copies are added to the tile bands.
+            self.band_info['band_count'] += get_tile_bands(self, trigger) * self.n_bands
 
         self.d_name, self.f_name = os.path.split(self.input_image)
         self.f_base = os.path.splitext(self.f_name)[0]
@@ -231,12 +258,34 @@ class SPParameters(object):
 
         self.relative_path = True if not self.full_path else False
 
+        # The output storage for each trigger.
+        self.trigger_storage = parse_trigger_storage(self.trigger_storage)
+
+        self.write_storage = ','.join(['{}={}'.format(trigger, self.trigger_storage.get(trigger, self.storage))
+                                       for trigger in self.triggers])
+
+        # The approximation threshold scale for each trigger.
+        self.approx = parse_approx(self.approx, spectral_indices=self.spectral_indices)
+
+        if self.approx:
+
+            self.write_approx = ','.join(['{}>={:d} (1/{:d})'.format(trigger, self.approx[trigger], self.approx_factor)
+                                          for trigger in self.triggers if trigger in self.approx])
+
+        else:
+            self.write_approx = 'None'
+
     def update_info(self, **kwargs):
 
         for k, v in viewitems(kwargs):
             setattr(self, k, v)
 
     def run(self):
+
+        # The processing modules (and their image libraries)
+        #   are only loaded to run.
+        from . import spprocess
+
         spprocess.run(self)
         
 
@@ -301,6 +350,8 @@ def _options():
 
 def _raster_options():
 
+    from mpglue.raster_tools import DRIVER_DICT
+
     print('=========  ======')
     print('Extension  Format')
     print('=========  ======')
@@ -318,8 +369,58 @@ def _version():
     sys.exit(__version__)
 
 
+def _check_choices(parser, args):
+
+    """
+    Checks the arguments whose choices come from the image libraries
+
+    The choices are checked after parsing, so that the informational
+    options (e.g., --version) do not load the image libraries.
+    """
+
+    from mpglue import utils
+    from mpglue.raster_tools import DRIVER_DICT
+
+    from .sphelpers.spstorage import STORAGE_TYPES
+    from .sphelpers.spapprox import APPROX_FACTORS
+
+    trigger_choices = ['dmp', 'fourier', 'gabor', 'grad', 'hog', 'lac',
+                       'lbpm', 'lsr', 'mean', 'orb',
+                       'pantex', 'saliency', 'seg', 'sfs'] + [vi.lower() for vi in utils.SUPPORTED_VIS]
+
+    for arg_name, arg_values, arg_choices in [('--sensor', [args.sat_sensor], list(utils.SUPPORTED_SENSORS)),
+                                              ('--format', [args.format], list(DRIVER_DICT.values())),
+                                              ('-tr/--triggers', args.triggers, trigger_choices),
+                                              ('--storage', [args.storage], STORAGE_TYPES),
+                                              ('--approx-factor', [args.approx_factor], APPROX_FACTORS)]:
+
+        for arg_value in arg_values:
+
+            if arg_value not in arg_choices:
+
+                parser.error('argument {}: invalid choice: {!r} (choose from {})'.format(arg_name,
+                                                                                       arg_value,
+                                                                                       ', '.join(map(repr, arg_choices))))
+
+
 def main():
 
+    # The long-running job server.
+    if (len(sys.argv) > 1) and (sys.argv[1] == 'serve'):
+
+        from . import spserve
+
+        spserve.main(sys.argv[2:])
+        sys.exit()
+
+    # The multi-scene batch mode.
+    if (len(sys.argv) > 1) and (sys.argv[1] == 'batch'):
+
+        from . import spbatch
+
+        spbatch.main(sys.argv[2:])
+        sys.exit()
+
     colorama.init()
 
     parser = argparse.ArgumentParser(description=Fore.GREEN + Style.BRIGHT + 'Contextual image features'
@@ -338,18 +439,13 @@ def main():
                         help='The visible spectrum (red, green, blue) band order (Only required with -tr saliency)',
                         default='bgr')
     parser.add_argument('--sensor', dest='sat_sensor', help='The satellite sensor (--input)',
-                        default='Quickbird',
-                        choices=utils.SUPPORTED_SENSORS)
-    parser.add_argument('--format', dest='format', help='The output raster format',
-                        default='GTiff',
-                        choices=list(DRIVER_DICT.values()))
+                        default='Quickbird')
+    parser.add_argument('--format', dest='format', help='The output raster format (see --raster-options)',
+                        default='GTiff')
     parser.add_argument('--block', dest='block', help='The block size', default=2, type=int)
     parser.add_argument('--scales', dest='scales', help='The scales', default=[8], type=int, nargs='+')
-    parser.add_argument('-tr', '--triggers', dest='triggers', help='The feature triggers', default=['mean'],
-                        nargs='+', choices=['dmp', 'fourier', 'gabor', 'grad', 'hog', 'lac',
-                                            'lbpm', 'lsr', 'mean', 'orb',
-                                            'pantex', 'saliency', 'seg', 'sfs'] +
-                                           [vi.lower() for vi in utils.SUPPORTED_VIS])
+    parser.add_argument('-tr', '--triggers', dest='triggers', help='The feature triggers (see --options)', default=['mean'],
+                        nargs='+')
     parser.add_argument('-lth', '--hline-threshold', dest='hline_threshold', help='The Hough line threshold',
                         default=40, type=int)
     parser.add_argument('-mnl', '--hline-min', dest='hline_min', help='The Hough line minimum length',
@@ -377,16 +473,82 @@ def main():
                         help='Whether to use full path names in the VRT composite (otherwise uses relative paths)',
                         action='store_true')
     parser.add_argument('--stack-only', dest='stack_only', help='Whether to only stack features', action='store_true')
-    parser.add_argument('--neighbors', dest='neighbors', help='Whether to add features as neighbors',
+    parser.add_argument('--neighbors', dest='neighbors', help='Whether to add the features of the north, south, east and west neighbors',
                         action='store_true')
     parser.add_argument('--n-jobs', dest='n_jobs', help='The number of parallel jobs for sections',
                         default=-1, type=int)
     parser.add_argument('--sect-size', dest='section_size', help='The section size', default=1000, type=int)
-    parser.add_argument('--gdal-cache', dest='gdal_cache', help='The GDAL cache size (MB)', default=256, type=int)
+    parser.add_argument('--gdal-cache', dest='gdal_cache', help='The GDAL cache size (MB), shared by the parallel workers', default=256, type=int)
     parser.add_argument('--reset', dest='reset', help='Whether to reset section memory', action='store_true')
     parser.add_argument('--overwrite', dest='overwrite', help='Whether to overwrite output files', action='store_true')
-    parser.add_argument('--overviews', dest='overviews', help='Whether to build pyramid overviews for the VRT mosaic',
+    parser.add_argument('--overviews', dest='overviews', help='Whether to build pyramid overviews for the tiles and the VRT mosaic',
+                        action='store_true')
+    parser.add_argument('--storage', dest='storage', help='The output feature storage (uint8, uint16, float16 or float32)',
+                        default='float32')
+    parser.add_argument('--trigger-storage', dest='trigger_storage',
+                        help='Per-trigger output storage, given as <trigger>:<storage> (overrides --storage)',
+                        default=None, nargs='+')
+    parser.add_argument('--check-storage', dest='check_storage',
+                        help='Whether to report the maximum quantization error against float32', action='store_true')
+    parser.add_argument('--cache-size', dest='cache_size',
+                        help='The size (MB) of the prepared section cache shared across triggers (0 disables the cache)',
+                        default=0, type=int)
+    parser.add_argument('--cache-dir', dest='cache_dir',
+                        help='The section cache scratch directory (Default is the system temporary directory)',
+                        default=None)
+    parser.add_argument('--global-stats', dest='global_stats',
+                        help='Whether to rescale and equalize with global image histograms (otherwise the range is assumed from the data type and equalization is per section)',
+                        action='store_true')
+    parser.add_argument('--skip-nodata', dest='skip_nodata',
+                        help='Whether to skip no-data sections and windows (uses the input no-data mask unless --nodata is given)',
+                        action='store_true')
+    parser.add_argument('--nodata', dest='nodata', help='A user-defined input no-data value', default=None, type=float)
+    parser.add_argument('--align-sections', dest='align_sections',
+                        help='Whether to align section origins to the native input blocks (or strips)',
+                        action='store_true')
+    parser.add_argument('--prefetch', dest='prefetch',
+                        help='The number of sections each worker reads ahead while computing (0 disables prefetching)',
+                        default=0, type=int)
+    parser.add_argument('--prefetch-mem', dest='prefetch_mem',
+                        help='The memory cap (MB) of the sections queued by each worker', default=1024, type=int)
+    parser.add_argument('--io-mode', dest='io_mode',
+                        help='The section I/O mode (parallel=every worker reads and writes, single=one reader/writer with shared-memory compute workers)',
+                        default='parallel', choices=['parallel', 'single'])
+    parser.add_argument('--result-store', dest='result_store',
+                        help='A directory to store and reuse computed features for each trigger, band and parameter set',
+                        default=None)
+    parser.add_argument('--update', dest='update',
+                        help='Whether to store section input checksums and only re-process sections with changed input',
                         action='store_true')
+    parser.add_argument('--metrics-file', dest='metrics_file',
+                        help='A progress metrics file to refresh during processing (.prom for the Prometheus text format, otherwise JSON)',
+                        default=None)
+    parser.add_argument('--metrics-interval', dest='metrics_interval',
+                        help='The time (seconds) between progress metrics refreshes', default=10., type=float)
+    parser.add_argument('--profile', dest='profile',
+                        help='Whether to profile the section computation in each worker and merge the profiles',
+                        action='store_true')
+    parser.add_argument('--profile-triggers', dest='profile_triggers',
+                        help='The triggers to profile (Default is all triggers)', default=None, nargs='+')
+    parser.add_argument('--profile-sections', dest='profile_sections',
+                        help='The section counters to profile (Default is all sections)', default=None, nargs='+', type=int)
+    parser.add_argument('--autotune', dest='autotune',
+                        help='Whether to time the triggers on sample sections and pick the section size and number of processes',
+                        action='store_true')
+    parser.add_argument('--autotune-mem', dest='autotune_mem',
+                        help='The memory budget (MB) of the workers for --autotune (0 uses 75 percent of the physical memory)',
+                        default=0, type=int)
+    parser.add_argument('--approx', dest='approx',
+                        help='Per-trigger threshold scales, given as <trigger>:<scale>, at and above which scales are '
+                             'computed on a downsampled section (Default is exact scales)', default=None, nargs='+')
+    parser.add_argument('--approx-factor', dest='approx_factor', help='The downsampling factor of --approx (2 or 4)',
+                        default=2, type=int)
+    parser.add_argument('--approx-report', dest='approx_report',
+                        help='Whether to report the correlation and RMSE of --approx against exact features on sample sections',
+                        action='store_true')
+    parser.add_argument('--queue-dir', dest='queue_dir',
+                        help='A job queue directory to submit the job to, instead of running it (see spfeas serve)',
+                        default=None)
     parser.add_argument('--options', dest='options', help='Whether to show trigger options', action='store_true')
     parser.add_argument('--raster-options', dest='raster_options',
                         help='Whether to show available raster formats for writing', action='store_true')
@@ -406,45 +568,85 @@ def main():
     if args.version:
         _version()
 
+    _check_choices(parser, args)
+
+    feature_kwargs = dict(format=args.format,
+                          band_positions=args.band_positions,
+                          block=args.block,
+                          scales=args.scales,
+                          triggers=args.triggers,
+                          hline_threshold=args.hline_threshold,
+                          hline_min=args.hline_min,
+                          hline_gap=args.hline_gap,
+                          weight=args.weight,
+                          sfs_threshold=args.sfs_threshold,
+                          sfs_skip=args.sfs_skip,
+                          sfs_resample=args.sfs_resample,
+                          smooth=args.smooth,
+                          equalize=args.equalize,
+                          equalize_adapt=args.equalize_adapt,
+                          visualize=args.visualize,
+                          convert=args.convert,
+                          use_rgb=args.use_rgb,
+                          vis_order=args.vis_order,
+                          sat_sensor=args.sat_sensor,
+                          stack=args.stack,
+                          full_path=args.full_path,
+                          stack_only=args.stack_only,
+                          neighbors=args.neighbors,
+                          n_jobs=args.n_jobs,
+                          reset=args.reset,
+                          image_min=args.image_min,
+                          image_max=args.image_max,
+                          lac_r=args.lac_r,
+                          section_size=args.section_size,
+                          gdal_cache=args.gdal_cache,
+                          overwrite=args.overwrite,
+                          overviews=args.overviews,
+                          storage=args.storage,
+                          trigger_storage=args.trigger_storage,
+                          check_storage=args.check_storage,
+                          cache_size=args.cache_size,
+                          cache_dir=args.cache_dir,
+                          global_stats=args.global_stats,
+                          skip_nodata=args.skip_nodata,
+                          nodata=args.nodata,
+                          align_sections=args.align_sections,
+                          prefetch=args.prefetch,
+                          prefetch_mem=args.prefetch_mem,
+                          io_mode=args.io_mode,
+                          result_store=args.result_store,
+                          update=args.update,
+                          metrics_file=args.metrics_file,
+                          metrics_interval=args.metrics_interval,
+                          profile=args.profile,
+                          profile_triggers=args.profile_triggers,
+                          profile_sections=args.profile_sections,
+                          autotune=args.autotune,
+                          autotune_mem=args.autotune_mem,
+                          approx=args.approx,
+                          approx_factor=args.approx_factor,
+                          approx_report=args.approx_report)
+
+    # Queue the job for a running server.
+    if args.queue_dir:
+
+        from . import spserve
+
+        spserve.submit_job(args.queue_dir,
+                           args.input,
+                           args.output,
+                           **feature_kwargs)
+
+        sys.exit()
+
     logger.info('\nStart date & time --- (%s)\n' % time.asctime(time.localtime(time.time())))
 
     start_time = time.time()
 
     spatial_features(args.input,
                      args.output,
-                     format=args.format,
-                     band_positions=args.band_positions,
-                     block=args.block,
-                     scales=args.scales,
-                     triggers=args.triggers,
-                     hline_threshold=args.hline_threshold,
-                     hline_min=args.hline_min,
-                     hline_gap=args.hline_gap,
-                     weight=args.weight,
-                     sfs_threshold=args.sfs_threshold,
-                     sfs_skip=args.sfs_skip,
-                     sfs_resample=args.sfs_resample,
-                     smooth=args.smooth,
-                     equalize=args.equalize,
-                     equalize_adapt=args.equalize_adapt,
-                     visualize=args.visualize,
-                     convert=args.convert,
-                     use_rgb=args.use_rgb,
-                     vis_order=args.vis_order,
-                     sat_sensor=args.sat_sensor,
-                     stack=args.stack,
-                     full_path=args.full_path,
-                     stack_only=args.stack_only,
-                     neighbors=args.neighbors,
-                     n_jobs=args.n_jobs,
-                     reset=args.reset,
-                     image_min=args.image_min,
-                     image_max=args.image_max,
-                     lac_r=args.lac_r,
-                     section_size=args.section_size,
-                     gdal_cache=args.gdal_cache,
-                     overwrite=args.overwrite,
-                     overviews=args.overviews)
+                     **feature_kwargs)
 
     logger.info('\nEnd data & time -- (%s)\nTotal processing time -- (%.2gs)\n' %
                 (time.asctime(time.localtime(time.time())), (time.time() - start_time)))
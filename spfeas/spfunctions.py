@@ -2,24 +2,16 @@ from __future__ import division
 from builtins import int
 
 import itertools
-from joblib import Parallel, delayed
 
 from .sphelpers.gabor_filter_bank import prep_gabor
-from .sphelpers import lsr
 from .sphelpers._stats import fill_labels, fill_key_points
+from .sphelpers import _morph
 
-from mpglue.stats._rolling_stats import rolling_stats
-
+# Trigger-specific libraries (joblib and the line support
+#   regions, saliency and segmentation modules) are
+#   imported by the functions that use them.
 try:
     from skimage.exposure import rescale_intensity
-    from skimage.feature import hog as HOG
-    from skimage.feature import local_binary_pattern as LBP
-    from skimage.feature import greycomatrix, greycoprops
-    from skimage.exposure import histogram
-    from skimage.color import rgb2rgbcie
-    from skimage.segmentation import felzenszwalb
-    from skimage.measure import regionprops
-    from skimage.morphology import reconstruction
 except ImportError:
     raise ImportError('Scikits-image must be installed')
 
@@ -33,12 +25,6 @@ try:
 except ImportError:
     raise ImportError('OpenCV must be installed')
 
-try:
-    import matplotlib.pyplot as plt
-except ImportError:
-    raise ImportError('Matplotlib must be installed')
-
-
 def get_kernels():
 
     # Robert's
@@ -246,6 +232,8 @@ def feature_fourier(chBd, blk, scs, end_scale):
 
 def call_lsr(edoim_s, edmim_s, dx_s, dy_s, scs, end_scale):
 
+    from .sphelpers import lsr
+
     scale_stats = list()
     scales_half = int(end_scale / 2)
 
@@ -276,6 +264,8 @@ def feature_lsr(ch_bd, blk, scs, end_scale):
 
     edge_mag, edge_ori, deriv_x, deriv_y = grad_mag(ch_bd)
     
+    from joblib import Parallel, delayed
+
     for i in range(0, rows-(end_scale-blk), blk):
 
         out_list += list(itertools.chain.from_iterable(Parallel(n_jobs=-1,
@@ -351,6 +341,8 @@ def get_saliency_tile_mean(im, min_max=None, vis_order=None):
     layers = layers.transpose(1, 2, 0)
 
     # Perform RGB to CIE Lab color space conversion
+    from skimage.color import rgb2rgbcie
+
     layers = rgb2rgbcie(layers)
 
     # Compute Lab average values
@@ -398,6 +390,8 @@ def saliency(i_info, parameter_object, i_sect, j_sect, n_rows, n_cols):
     layers = layers.transpose(1, 2, 0)
 
     # Perform RGB to CIE Lab color space conversion
+    from skimage.color import rgb2rgbcie
+
     layers = rgb2rgbcie(layers)
 
     # Compute Lab average values
@@ -417,6 +411,9 @@ def saliency(i_info, parameter_object, i_sect, j_sect, n_rows, n_cols):
 
 def segment_image(im, parameter_object):
 
+    from skimage.segmentation import felzenszwalb
+    from skimage.measure import regionprops
+
     dims, rows, cols = im.shape
 
     image2segment = np.dstack((rescale_intensity(im[0],
@@ -480,54 +477,62 @@ def get_dmp(bd, image_min, image_max, ses=None):
                                                   image_max),
                                         out_range=(0, 255)))
 
-    section_rows, section_cols = bd.shape
-
-    dmp_counter = 0
+    bd = np.ascontiguousarray(bd)
 
-    marker = bd.copy()
-    previous = bd.copy()
-
-    # The DMP holder
-    # closings --> 1st len(ses) bands
-    # openings --> last len(ses) bands
-    dims = len(ses) * 2
+    section_rows, section_cols = bd.shape
 
-    dmp_array = np.empty((dims, section_rows, section_cols), dtype='uint8')
+    # The DMP levels
+    # openings --> 1st len(ses) levels
+    # closings --> last len(ses) levels
+    n_levels = len(ses)
+    dims = n_levels * 2
 
-    # Morphological opening
-    for se_size in ses:
+    # The mean of the gradient along the profile is a weighted
+    #   sum of the DMP levels, so it is accumulated one level
+    #   at a time rather than stacking all levels.
+    dmp_weights = np.gradient(np.eye(dims), axis=0).mean(axis=0)
 
-        se = cv2.getStructuringElement(cv2.MORPH_RECT, (se_size, se_size))
+    dmp_mean = np.zeros((section_rows, section_cols), dtype='float64')
 
-        marker = cv2.erode(marker, se, iterations=1)
+    for dmp_start, method in [(0, 'dilation'), (n_levels, 'erosion')]:
 
-        current = reconstruction(marker, bd, method='dilation', selem=se)
+        marker = bd.copy()
+        previous = bd
 
-        dmp_array[dmp_counter] = previous - current
+        for se_counter, se_size in enumerate(ses):
 
-        previous = current.copy()
+            dmp_counter = dmp_start + se_counter
 
-        dmp_counter += 1
+            se = cv2.getStructuringElement(cv2.MORPH_RECT, (se_size, se_size))
 
-    marker = bd.copy()
-    previous = bd.copy()
+            # Morphological opening
+            if method == 'dilation':
+                marker = cv2.erode(marker, se, iterations=1)
+            # Morphological closing
+            else:
+                marker = cv2.dilate(marker, se, iterations=1)
 
-    # Morphological closing
-    for se_size in ses:
+            # Only reconstruct levels that contribute
+            #   to the current or the next difference.
+            if dmp_weights[dmp_counter] == 0:
 
-        se = cv2.getStructuringElement(cv2.MORPH_RECT, (se_size, se_size))
+                if (se_counter + 1 == n_levels) or (dmp_weights[dmp_counter+1] == 0):
 
-        marker = cv2.dilate(marker, se, iterations=1)
+                    previous = None
+                    continue
 
-        current = reconstruction(marker, bd, method='erosion', selem=se)
+            current = _morph.reconstruction(marker, bd, se_size, method=method)
 
-        dmp_array[dmp_counter] = current - previous
+            if dmp_weights[dmp_counter] != 0:
 
-        previous = current.copy()
+                if method == 'dilation':
+                    dmp_mean += dmp_weights[dmp_counter] * (previous - current)
+                else:
+                    dmp_mean += dmp_weights[dmp_counter] * (current - previous)
 
-        dmp_counter += 1
+            previous = current
 
-    return np.uint8(np.gradient(dmp_array, axis=0).mean(axis=0))
+    return np.uint8(dmp_mean)
 
     # Reshape to [dims x samples].
     # X_min, X_max = rolling_stats(dmp_array.transpose(1, 2, 0).reshape(section_rows*section_cols, dims).T,
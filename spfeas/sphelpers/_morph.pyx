@@ -0,0 +1,215 @@
+# cython: profile=False
+# cython: cdivision=True
+# cython: boundscheck=False
+# cython: wraparound=False
+
+import cython
+cimport cython
+
+import numpy as np
+cimport numpy as np
+
+DTYPE_intp = np.intp
+ctypedef np.intp_t DTYPE_intp_t
+
+DTYPE_uint8 = np.uint8
+ctypedef np.uint8_t DTYPE_uint8_t
+
+
+cdef inline DTYPE_uint8_t _get_min_sample_int(DTYPE_uint8_t s1, DTYPE_uint8_t s2) nogil:
+    return s2 if s2 < s1 else s1
+
+
+cdef inline DTYPE_uint8_t _get_max_sample_int(DTYPE_uint8_t s1, DTYPE_uint8_t s2) nogil:
+    return s2 if s2 > s1 else s1
+
+
+cdef inline Py_ssize_t _get_lower(Py_ssize_t idx, int radius) nogil:
+    return idx - radius if idx - radius > 0 else 0
+
+
+cdef inline Py_ssize_t _get_upper(Py_ssize_t idx, int radius, Py_ssize_t length) nogil:
+    return idx + radius + 1 if idx + radius + 1 < length else length
+
+
+cdef void _hybrid_reconstruction(DTYPE_uint8_t[:, ::1] recon,
+                                 DTYPE_uint8_t[:, ::1] mask,
+                                 int radius,
+                                 DTYPE_intp_t[::1] fifo,
+                                 DTYPE_uint8_t[:, ::1] queued) nogil:
+
+    """
+    Grayscale reconstruction by dilation over a square footprint (in place)
+
+    Reference:
+        Vincent, L. (1993) Morphological grayscale reconstruction in image analysis:
+            applications and efficient algorithms. IEEE Transactions on Image Processing, 2(2), 176-201.
+    """
+
+    cdef:
+        Py_ssize_t i, j, ii, jj, pix
+        Py_ssize_t rows = recon.shape[0]
+        Py_ssize_t cols = recon.shape[1]
+        Py_ssize_t n_pixels = rows * cols
+        Py_ssize_t head = 0
+        Py_ssize_t tail = 0
+        Py_ssize_t n_queued = 0
+        Py_ssize_t jj_lower, jj_upper
+        DTYPE_uint8_t max_value, pixel_value
+        bint enqueue
+
+    # Forward (raster) scan over the causal half of the footprint
+    for i in range(0, rows):
+
+        for j in range(0, cols):
+
+            max_value = recon[i, j]
+
+            jj_lower = _get_lower(j, radius)
+            jj_upper = _get_upper(j, radius, cols)
+
+            for ii in range(_get_lower(i, radius), i):
+                for jj in range(jj_lower, jj_upper):
+                    max_value = _get_max_sample_int(max_value, recon[ii, jj])
+
+            for jj in range(jj_lower, j):
+                max_value = _get_max_sample_int(max_value, recon[i, jj])
+
+            recon[i, j] = _get_min_sample_int(max_value, mask[i, j])
+
+    # Backward (anti-raster) scan over the anti-causal half of the footprint
+    for i in range(rows-1, -1, -1):
+
+        for j in range(cols-1, -1, -1):
+
+            max_value = recon[i, j]
+
+            jj_lower = _get_lower(j, radius)
+            jj_upper = _get_upper(j, radius, cols)
+
+            for jj in range(j+1, jj_upper):
+                max_value = _get_max_sample_int(max_value, recon[i, jj])
+
+            for ii in range(i+1, _get_upper(i, radius, rows)):
+                for jj in range(jj_lower, jj_upper):
+                    max_value = _get_max_sample_int(max_value, recon[ii, jj])
+
+            pixel_value = _get_min_sample_int(max_value, mask[i, j])
+
+            recon[i, j] = pixel_value
+
+            # Queue the pixel if it can still
+            #   propagate to an anti-causal neighbor.
+            enqueue = False
+
+            for jj in range(j+1, jj_upper):
+
+                if (recon[i, jj] < pixel_value) and (recon[i, jj] < mask[i, jj]):
+                    enqueue = True
+                    break
+
+            if not enqueue:
+
+                for ii in range(i+1, _get_upper(i, radius, rows)):
+
+                    for jj in range(jj_lower, jj_upper):
+
+                        if (recon[ii, jj] < pixel_value) and (recon[ii, jj] < mask[ii, jj]):
+                            enqueue = True
+                            break
+
+                    if enqueue:
+                        break
+
+            if enqueue:
+
+                queued[i, j] = 1
+                fifo[tail] = i * cols + j
+                tail = (tail + 1) % n_pixels
+                n_queued += 1
+
+    # FIFO propagation. A pixel is held in the
+    #   queue at most once, so the ring buffer
+    #   never exceeds the number of pixels.
+    while n_queued > 0:
+
+        pix = fifo[head]
+        head = (head + 1) % n_pixels
+        n_queued -= 1
+
+        i = pix // cols
+        j = pix % cols
+
+        queued[i, j] = 0
+
+        pixel_value = recon[i, j]
+
+        for ii in range(_get_lower(i, radius), _get_upper(i, radius, rows)):
+
+            for jj in range(_get_lower(j, radius), _get_upper(j, radius, cols)):
+
+                if (recon[ii, jj] < pixel_value) and (recon[ii, jj] != mask[ii, jj]):
+
+                    recon[ii, jj] = _get_min_sample_int(pixel_value, mask[ii, jj])
+
+                    if queued[ii, jj] == 0:
+
+                        queued[ii, jj] = 1
+                        fifo[tail] = ii * cols + jj
+                        tail = (tail + 1) % n_pixels
+                        n_queued += 1
+
+
+def reconstruction(np.ndarray marker not None,
+                   np.ndarray mask not None,
+                   int se_size,
+                   str method='dilation'):
+
+    """
+    Grayscale morphological reconstruction with a square structuring element
+
+    Args:
+        marker (2d array): The 8-bit seed image.
+        mask (2d array): The 8-bit mask image.
+        se_size (int): The structuring element (square footprint) size.
+        method (Optional[str]): The reconstruction method. Choices are ['dilation', 'erosion'].
+
+    Returns:
+        The reconstructed image as an 8-bit 2d array
+    """
+
+    cdef:
+        DTYPE_uint8_t[:, ::1] recon
+        DTYPE_uint8_t[:, ::1] mask_
+        DTYPE_intp_t[::1] fifo = np.empty(marker.shape[0]*marker.shape[1], dtype='intp')
+        DTYPE_uint8_t[:, ::1] queued = np.zeros((marker.shape[0], marker.shape[1]), dtype='uint8')
+        int radius = se_size // 2
+
+    if method == 'dilation':
+
+        # The seed cannot exceed the mask.
+        recon_array = np.minimum(np.uint8(marker), np.uint8(mask))
+        mask_array = np.ascontiguousarray(mask, dtype='uint8')
+
+    elif method == 'erosion':
+
+        # Reconstruction by erosion is the
+        #   dual of reconstruction by dilation.
+        recon_array = np.minimum(255 - np.uint8(marker), 255 - np.uint8(mask))
+        mask_array = np.ascontiguousarray(255 - np.uint8(mask), dtype='uint8')
+
+    else:
+        raise NameError('The method should be dilation or erosion.')
+
+    recon = np.ascontiguousarray(recon_array, dtype='uint8')
+    mask_ = mask_array
+
+    if recon.shape[0] * recon.shape[1] > 0:
+
+        with nogil:
+            _hybrid_reconstruction(recon, mask_, radius, fifo, queued)
+
+    if method == 'dilation':
+        return np.asarray(recon)
+    else:
+        return 255 - np.asarray(recon)
@@ -151,6 +151,49 @@ cdef inline DTYPE_float32_t _get_line_length(DTYPE_float32_t y1, DTYPE_float32_t
     return ((y1 - x1)**2 + (y2 - x2)**2)**0.5
 
 
+cdef np.ndarray _create_output(int rows, int cols, int scales_block, int block_size, int n_dims):
+
+    """
+    Creates the [features x rows x columns] output array
+    """
+
+    cdef:
+        Py_ssize_t i, j
+        unsigned int out_rows = 0
+        unsigned int out_cols = 0
+
+    for i from 0 <= i < rows-scales_block by block_size:
+        out_rows += 1
+
+    for j from 0 <= j < cols-scales_block by block_size:
+        out_cols += 1
+
+    return np.zeros((n_dims, out_rows, out_cols), dtype='float32')
+
+
+cdef inline void _fill_output(DTYPE_float32_t[:, :, ::1] out_array, Py_ssize_t pix_ctr, DTYPE_float32_t value) nogil:
+
+    """
+    Fills the [features x rows x columns] output from the window-major feature counter
+    """
+
+    cdef:
+        Py_ssize_t n_dims = out_array.shape[0]
+        Py_ssize_t out_cols = out_array.shape[2]
+        Py_ssize_t pixel_index = pix_ctr // n_dims
+
+    out_array[pix_ctr % n_dims, pixel_index // out_cols, pixel_index % out_cols] = value
+
+
+cdef inline bint _skip_window(DTYPE_uint8_t[::1] window_mask, Py_ssize_t pix_ctr, Py_ssize_t n_dims) nogil:
+
+    """
+    Checks whether the window at the current feature counter is masked
+    """
+
+    return window_mask[pix_ctr // n_dims] == 0
+
+
 cdef unsigned int _get_output_length(int rows,
                                      int cols,
                                      int scales_block,
@@ -744,7 +787,6 @@ cdef void _convolution(DTYPE_float32_t[:, :] block2convolve,
 cdef void _feature_gabor(DTYPE_float32_t[:, :, ::1] ch_bdka,
                          int blk,
                          DTYPE_uint16_t[::1] scs,
-                         int out_len,
                          int scales_half,
                          int scales_block,
                          int n_kernels,
@@ -752,7 +794,9 @@ cdef void _feature_gabor(DTYPE_float32_t[:, :, ::1] ch_bdka,
                          int cols,
                          int scale_length,
                          int end_scale,
-                         DTYPE_float32_t[::1] out_list_):
+                         DTYPE_float32_t[::1] weight_scales,
+                         DTYPE_float32_t[:, :, ::1] out_list_,
+                         DTYPE_uint8_t[::1] window_mask_):
 
     """
     Returns at each scale at each kernel
@@ -805,6 +849,9 @@ cdef void _feature_gabor(DTYPE_float32_t[:, :, ::1] ch_bdka,
 
             dist_weights_stack[scale_kernel, :rs, :cs] = _create_weights(dist_weights, rs, cs)
 
+            if weight_scales[ki] != 1:
+                np.asarray(dist_weights_stack[scale_kernel])[...] *= weight_scales[ki]
+
             scale_kernel += 1
 
     with nogil:
@@ -813,6 +860,10 @@ cdef void _feature_gabor(DTYPE_float32_t[:, :, ::1] ch_bdka,
 
             for j from 0 <= j < cols-scales_block by blk:
 
+                if _skip_window(window_mask_, pix_ctr, out_list_.shape[0]):
+                    pix_ctr += out_list_.shape[0]
+                    continue
+
                 scale_kernel = 0
 
                 for ki in range(0, scale_length):
@@ -845,37 +896,52 @@ cdef void _feature_gabor(DTYPE_float32_t[:, :, ::1] ch_bdka,
 
                         for pi in range(0, 2):
 
-                            out_list_[pix_ctr] = in_zs[pi]
+                            _fill_output(out_list_, pix_ctr, in_zs[pi])
                             pix_ctr += 1
 
                         scale_kernel += 1
 
 
-def feature_gabor(DTYPE_float32_t[:, :, ::1] chbd, int blk, list scs, int end_scale, int n_kernels=8):
+def feature_gabor(DTYPE_float32_t[:, :, ::1] chbd, int blk, list scs, int end_scale, int n_kernels=8, DTYPE_uint8_t[::1] window_mask=None,
+                  weight_scale=1.):
+
+    """
+    Computes the weighted mean and variance of each Gabor kernel response at each scale
+
+    Args:
+        chbd (3d array): The <scales*kernels x rows x columns> kernel responses, ordered by scale.
+        blk (int)
+        scs (list)
+        end_scale (int)
+        n_kernels (Optional[int])
+        window_mask (Optional[1d array])
+        weight_scale (Optional[float or list]): The distance weight factor, or one factor per scale,
+            so that downsampled windows keep full resolution distance weights.
+    """
 
     cdef:
-        Py_ssize_t i, j, ki, kl
         int scales_half = <int>(end_scale / 2.)
         int scales_block = end_scale - blk
         int rows = chbd.shape[1]
         int cols = chbd.shape[2]
         DTYPE_uint16_t[::1] scales_array = np.array(scs, dtype='uint16')
         int scale_length = scales_array.shape[0]
-        DTYPE_float32_t[::1] out_list
-        unsigned int out_len = 0
+        DTYPE_float32_t[:, :, ::1] out_list
+        DTYPE_float32_t[::1] weight_scales = np.float32(weight_scale).reshape(-1) * np.ones(scale_length, dtype='float32')
 
-    for i from 0 <= i < rows-scales_block by blk:
-        for j from 0 <= j < cols-scales_block by blk:
-            for ki in range(0, scale_length):
-                for kl in range(0, n_kernels):
-                    out_len += 2
+    assert chbd.shape[0] == scale_length*n_kernels, 'The kernel responses do not match the scales.'
 
-    out_list = np.zeros(out_len, dtype='float32')
+    out_list = _create_output(rows, cols, scales_block, blk, scale_length*n_kernels*2)
+
+    if window_mask is None:
+        window_mask = np.ones(out_list.shape[1]*out_list.shape[2], dtype='uint8')
+
+    # The kernels index the mask without bounds checking.
+    assert window_mask.shape[0] == out_list.shape[1]*out_list.shape[2], 'The window mask does not match the output windows.'
 
     _feature_gabor(chbd,
                    blk,
                    scales_array,
-                   out_len,
                    scales_half,
                    scales_block,
                    n_kernels,
@@ -883,9 +949,11 @@ def feature_gabor(DTYPE_float32_t[:, :, ::1] chbd, int blk, list scs, int end_sc
                    cols,
                    scale_length,
                    end_scale,
-                   out_list)
+                   weight_scales,
+                   out_list,
+                   window_mask)
 
-    return np.float32(out_list)
+    return np.asarray(out_list)
 
 
 # Histogram of Oriented Gradients
@@ -909,11 +977,11 @@ cdef void _feature_hog(DTYPE_float32_t[:, ::1] chbd,
                        int end_scale,
                        int scales_half,
                        int scales_block,
-                       int out_len,
                        int rows,
                        int cols,
                        int scale_length,
-                       DTYPE_float32_t[::1] out_list_):
+                       DTYPE_float32_t[:, :, ::1] out_list_,
+                       DTYPE_uint8_t[::1] window_mask_):
 
     """
     Computes the Histogram of Oriented Gradients
@@ -939,6 +1007,10 @@ cdef void _feature_hog(DTYPE_float32_t[:, ::1] chbd,
 
         for j from 0 <= j < cols-scales_block by blk:
 
+            if _skip_window(window_mask_, pix_ctr, out_list_.shape[0]):
+                pix_ctr += out_list_.shape[0]
+                continue
+
             for ki in range(0, scale_length):
 
                 k = scs[ki]
@@ -963,7 +1035,7 @@ cdef void _feature_hog(DTYPE_float32_t[:, ::1] chbd,
 
                     for sti in range(0, 5):
 
-                        out_list_[pix_ctr] = sts_[sti]
+                        _fill_output(out_list_, pix_ctr, sts_[sti])
 
                         pix_ctr += 1
 
@@ -971,7 +1043,7 @@ cdef void _feature_hog(DTYPE_float32_t[:, ::1] chbd,
                     pix_ctr += 5
 
 
-def feature_hog(DTYPE_float32_t[:, ::1] chbd, int blk, list scs, int end_scale):
+def feature_hog(DTYPE_float32_t[:, ::1] chbd, int blk, list scs, int end_scale, DTYPE_uint8_t[::1] window_mask=None):
 
     cdef:
         Py_ssize_t i, j, ki
@@ -981,8 +1053,13 @@ def feature_hog(DTYPE_float32_t[:, ::1] chbd, int blk, list scs, int end_scale):
         int cols = chbd.shape[1]
         DTYPE_uint16_t[:] scales_array = np.array(scs, dtype='uint16')
         int scale_length = scales_array.shape[0]
-        unsigned int out_len = _get_output_length(rows, cols, scales_block, blk, scale_length, 5)
-        DTYPE_float32_t[::1] out_list = np.zeros(out_len, dtype='float32')
+        DTYPE_float32_t[:, :, ::1] out_list = _create_output(rows, cols, scales_block, blk, scale_length*5)
+
+    if window_mask is None:
+        window_mask = np.ones(out_list.shape[1]*out_list.shape[2], dtype='uint8')
+
+    # The kernels index the mask without bounds checking.
+    assert window_mask.shape[0] == out_list.shape[1]*out_list.shape[2], 'The window mask does not match the output windows.'
 
     _feature_hog(chbd,
                  blk,
@@ -990,13 +1067,13 @@ def feature_hog(DTYPE_float32_t[:, ::1] chbd, int blk, list scs, int end_scale):
                  end_scale,
                  scales_half,
                  scales_block,
-                 out_len,
                  rows,
                  cols,
                  scale_length,
-                 out_list)
+                 out_list,
+                 window_mask)
 
-    return np.float32(out_list)
+    return np.asarray(out_list)
 
 
 cdef void _add_dmps(DTYPE_float32_t[:, ::1] ch_bd_array,
@@ -1018,11 +1095,11 @@ cdef void _feature_dmp(DTYPE_float32_t[:, ::1] chbd,
                        int end_scale,
                        int scales_half,
                        int scales_block,
-                       int out_len,
                        int rows,
                        int cols,
                        int scale_length,
-                       DTYPE_float32_t[::1] out_list_):
+                       DTYPE_float32_t[:, :, ::1] out_list_,
+                       DTYPE_uint8_t[::1] window_mask_):
 
     cdef:
         Py_ssize_t i, j, ki, sti, block_rows, block_cols
@@ -1058,6 +1135,10 @@ cdef void _feature_dmp(DTYPE_float32_t[:, ::1] chbd,
 
             for j from 0 <= j < cols-scales_block by blk:
 
+                if _skip_window(window_mask_, pix_ctr, out_list_.shape[0]):
+                    pix_ctr += out_list_.shape[0]
+                    continue
+
                 for ki in range(0, scale_length):
 
                     k = scs[ki]
@@ -1087,12 +1168,12 @@ cdef void _feature_dmp(DTYPE_float32_t[:, ::1] chbd,
                     # Fill the output.
                     for sti in range(0, 2):
 
-                        out_list_[pix_ctr] = in_zs[sti]
+                        _fill_output(out_list_, pix_ctr, in_zs[sti])
 
                         pix_ctr += 1
 
 
-def feature_dmp(DTYPE_float32_t[:, ::1] chbd, int blk, list scs, int end_scale):
+def feature_dmp(DTYPE_float32_t[:, ::1] chbd, int blk, list scs, int end_scale, DTYPE_uint8_t[::1] window_mask=None):
 
     cdef:
         int scales_half = <int>(end_scale / 2.0)
@@ -1101,8 +1182,13 @@ def feature_dmp(DTYPE_float32_t[:, ::1] chbd, int blk, list scs, int end_scale):
         int cols = chbd.shape[1]
         DTYPE_uint16_t[::1] scales_array = np.array(scs, dtype='uint16')
         int scale_length = scales_array.shape[0]
-        unsigned int out_len = _get_output_length(rows, cols, scales_block, blk, scale_length, 2)
-        DTYPE_float32_t[::1] out_list = np.zeros(out_len, dtype='float32')
+        DTYPE_float32_t[:, :, ::1] out_list = _create_output(rows, cols, scales_block, blk, scale_length*2)
+
+    if window_mask is None:
+        window_mask = np.ones(out_list.shape[1]*out_list.shape[2], dtype='uint8')
+
+    # The kernels index the mask without bounds checking.
+    assert window_mask.shape[0] == out_list.shape[1]*out_list.shape[2], 'The window mask does not match the output windows.'
 
     _feature_dmp(chbd,
                  blk,
@@ -1110,13 +1196,13 @@ def feature_dmp(DTYPE_float32_t[:, ::1] chbd, int blk, list scs, int end_scale):
                  end_scale,
                  scales_half,
                  scales_block,
-                 out_len,
                  rows,
                  cols,
                  scale_length,
-                 out_list)
+                 out_list,
+                 window_mask)
 
-    return np.float32(out_list)
+    return np.asarray(out_list)
 
 
 cdef void _extract_values(DTYPE_uint8_t[:, :] block,
@@ -1396,13 +1482,13 @@ cdef void _feature_sfs(DTYPE_uint8_t[:, ::1] ch_bd,
                        DTYPE_float32_t thresh_hom,
                        int scales_half,
                        int scales_block,
-                       int out_len,
                        int rows,
                        int cols,
                        int skip_factor,
                        DTYPE_uint16_t[:, ::1] rcc_,
                        DTYPE_float32_t[::1] hist_,
-                       DTYPE_float32_t[::1] out_list_):
+                       DTYPE_float32_t[:, :, ::1] out_list_,
+                       DTYPE_uint8_t[::1] window_mask_):
 
     cdef:
         Py_ssize_t i, j, ki, k_half, st_
@@ -1420,6 +1506,10 @@ cdef void _feature_sfs(DTYPE_uint8_t[:, ::1] ch_bd,
 
                 for j from 0 <= j < cols-scales_block by block_size:
 
+                    if _skip_window(window_mask_, pix_ctr, out_list_.shape[0]):
+                        pix_ctr += out_list_.shape[0]
+                        continue
+
                     for ki in range(0, n_scales):
 
                         k = scales_array[ki]
@@ -1435,7 +1525,7 @@ cdef void _feature_sfs(DTYPE_uint8_t[:, ::1] ch_bd,
 
                         for st_ in range(0, 6):
 
-                            out_list_[pix_ctr] = sts_[st_]
+                            _fill_output(out_list_, pix_ctr, sts_[st_])
 
                             pix_ctr += 1
 
@@ -1460,7 +1550,7 @@ cdef void _feature_sfs(DTYPE_uint8_t[:, ::1] ch_bd,
 
                         for st_ in range(0, 6):
 
-                            out_list_[pix_ctr] = sts_[st_]
+                            _fill_output(out_list_, pix_ctr, sts_[st_])
 
                             pix_ctr += 1
 
@@ -1470,7 +1560,8 @@ def feature_sfs(DTYPE_uint8_t[:, ::1] chbd,
                 list scales,
                 unsigned int end_scale,
                 DTYPE_float32_t thresh_hom,
-                unsigned int skip_factor=4):
+                unsigned int skip_factor=4,
+                DTYPE_uint8_t[::1] window_mask=None):
 
     cdef:
         Py_ssize_t i, j, ki, k
@@ -1482,10 +1573,15 @@ def feature_sfs(DTYPE_uint8_t[:, ::1] chbd,
         int scale_length = scales_array.shape[0]
         DTYPE_uint16_t[:, ::1] rcc = np.zeros((4, end_scale), dtype='uint16')
         DTYPE_float32_t[::1] histogram = np.zeros(end_scale, dtype='float32')
-        DTYPE_float32_t[::1] out_list
-        unsigned int out_len = _get_output_length(rows, cols, scales_block, block_size, scale_length, 6)
+        DTYPE_float32_t[:, :, ::1] out_list
+
+    out_list = _create_output(rows, cols, scales_block, block_size, scale_length*6)
+
+    if window_mask is None:
+        window_mask = np.ones(out_list.shape[1]*out_list.shape[2], dtype='uint8')
 
-    out_list = np.zeros(out_len, dtype='float32')
+    # The kernels index the mask without bounds checking.
+    assert window_mask.shape[0] == out_list.shape[1]*out_list.shape[2], 'The window mask does not match the output windows.'
 
     _feature_sfs(chbd,
                  block_size,
@@ -1494,15 +1590,15 @@ def feature_sfs(DTYPE_uint8_t[:, ::1] chbd,
                  thresh_hom,
                  scales_half,
                  scales_block,
-                 out_len,
                  rows,
                  cols,
                  skip_factor,
                  rcc,
                  histogram,
-                 out_list)
+                 out_list,
+                 window_mask)
 
-    return np.float32(out_list)
+    return np.asarray(out_list)
 
 
 # cdef list _feature_surf(np.ndarray[DTYPE_uint8_t, ndim=2] surf_arr, k_pts, int j, int i, int k, list scs):
@@ -1643,12 +1739,12 @@ cdef void _feature_orb(DTYPE_uint8_t[:, ::1] ch_bd,
                        int scales_half,
                        int scales_block,
                        int scale_length,
-                       int out_len,
                        int rows,
                        int cols,
                        int scales_length,
                        int end_scale,
-                       DTYPE_float32_t[::1] out_list_):
+                       DTYPE_float32_t[:, :, ::1] out_list_,
+                       DTYPE_uint8_t[::1] window_mask_):
 
     cdef:
         Py_ssize_t i, j, ki, st
@@ -1669,6 +1765,10 @@ cdef void _feature_orb(DTYPE_uint8_t[:, ::1] ch_bd,
 
             for j from 0 <= j < cols-scales_block by blk:
 
+                if _skip_window(window_mask_, pix_ctr, out_list_.shape[0]):
+                    pix_ctr += out_list_.shape[0]
+                    continue
+
                 for ki in range(0, scale_length):
 
                     k = scales_array[ki]
@@ -1690,7 +1790,7 @@ cdef void _feature_orb(DTYPE_uint8_t[:, ::1] ch_bd,
 
                         for st in range(0, 5):
 
-                            out_list_[pix_ctr] = sts_[st]
+                            _fill_output(out_list_, pix_ctr, sts_[st])
 
                             pix_ctr += 1
 
@@ -1701,7 +1801,8 @@ cdef void _feature_orb(DTYPE_uint8_t[:, ::1] ch_bd,
 def feature_orb(DTYPE_uint8_t[:, ::1] chbd,
                 int blk,
                 list scs,
-                int end_scale):
+                int end_scale,
+                DTYPE_uint8_t[::1] window_mask=None):
 
     cdef:
         Py_ssize_t i, j, ki
@@ -1711,8 +1812,13 @@ def feature_orb(DTYPE_uint8_t[:, ::1] chbd,
         int cols = chbd.shape[1]
         DTYPE_uint16_t[::1] scales_array = np.array(scs, dtype='uint16')
         int scale_length = scales_array.shape[0]
-        unsigned int out_len = _get_output_length(rows, cols, scales_block, blk, scale_length, 5)
-        DTYPE_float32_t[::1] out_list = np.zeros(out_len, dtype='float32')
+        DTYPE_float32_t[:, :, ::1] out_list = _create_output(rows, cols, scales_block, blk, scale_length*5)
+
+    if window_mask is None:
+        window_mask = np.ones(out_list.shape[1]*out_list.shape[2], dtype='uint8')
+
+    # The kernels index the mask without bounds checking.
+    assert window_mask.shape[0] == out_list.shape[1]*out_list.shape[2], 'The window mask does not match the output windows.'
 
     _feature_orb(chbd,
                  blk,
@@ -1720,14 +1826,14 @@ def feature_orb(DTYPE_uint8_t[:, ::1] chbd,
                  scales_half,
                  scales_block,
                  scale_length,
-                 out_len,
                  rows,
                  cols,
                  scale_length,
                  end_scale,
-                 out_list)
+                 out_list,
+                 window_mask)
 
-    return np.float32(out_list)
+    return np.asarray(out_list)
 
 
 cdef DTYPE_uint8_t[:, :, :] _set_lbp(DTYPE_uint8_t[:, ::1] chbd,
@@ -1835,11 +1941,11 @@ cdef void _feature_lbpm(DTYPE_uint8_t[:, ::1] chBd,
                         int end_scale,
                         int scales_half,
                         int scales_block,
-                        int out_len,
                         int rows,
                         int cols,
                         int scale_length,
-                        DTYPE_float32_t[::1] out_list_):
+                        DTYPE_float32_t[:, :, ::1] out_list_,
+                        DTYPE_uint8_t[::1] window_mask_):
 
     """
     At each scale, returns:
@@ -1868,6 +1974,10 @@ cdef void _feature_lbpm(DTYPE_uint8_t[:, ::1] chBd,
 
         for j from 0 <= j < cols-scales_block by blk:
 
+            if _skip_window(window_mask_, pix_ctr, out_list_.shape[0]):
+                pix_ctr += out_list_.shape[0]
+                continue
+
             for ki in range(0, scale_length):
 
                 k = scs[ki]
@@ -1889,12 +1999,12 @@ cdef void _feature_lbpm(DTYPE_uint8_t[:, ::1] chBd,
 
                 for sti in range(0, 5):
 
-                    out_list_[pix_ctr] = sts_[sti]
+                    _fill_output(out_list_, pix_ctr, sts_[sti])
 
                     pix_ctr += 1
 
 
-def feature_lbpm(np.ndarray[DTYPE_uint8_t, ndim=2] chbd, int blk, list scs, int end_scale):
+def feature_lbpm(np.ndarray[DTYPE_uint8_t, ndim=2] chbd, int blk, list scs, int end_scale, DTYPE_uint8_t[::1] window_mask=None):
 
     cdef:
         Py_ssize_t i, j, ki
@@ -1904,8 +2014,13 @@ def feature_lbpm(np.ndarray[DTYPE_uint8_t, ndim=2] chbd, int blk, list scs, int
         int cols = chbd.shape[1]
         DTYPE_uint16_t[:] scales_array = np.array(scs, dtype='uint16')
         int scale_length = scales_array.shape[0]
-        unsigned int out_len = _get_output_length(rows, cols, scales_block, blk, scale_length, 5)
-        DTYPE_float32_t[::1] out_list = np.zeros(out_len, dtype='float32')
+        DTYPE_float32_t[:, :, ::1] out_list = _create_output(rows, cols, scales_block, blk, scale_length*5)
+
+    if window_mask is None:
+        window_mask = np.ones(out_list.shape[1]*out_list.shape[2], dtype='uint8')
+
+    # The kernels index the mask without bounds checking.
+    assert window_mask.shape[0] == out_list.shape[1]*out_list.shape[2], 'The window mask does not match the output windows.'
 
     _feature_lbpm(chbd,
                   blk,
@@ -1913,13 +2028,13 @@ def feature_lbpm(np.ndarray[DTYPE_uint8_t, ndim=2] chbd, int blk, list scs, int
                   end_scale,
                   scales_half,
                   scales_block,
-                  out_len,
                   rows,
                   cols,
                   scale_length,
-                  out_list)
+                  out_list,
+                  window_mask)
 
-    return np.float32(out_list)
+    return np.asarray(out_list)
 
 
 cdef inline DTYPE_float32_t _get_distance(tuple line):
@@ -2337,13 +2452,13 @@ cdef void _feature_pantex(DTYPE_uint8_t[:, ::1] chBd,
                           DTYPE_uint16_t[::1] scs,
                           int scales_half,
                           int scales_block,
-                          int out_len,
                           bint weighted,
                           int rows,
                           int cols,
                           int scale_length,
                           int levels,
-                          DTYPE_float32_t[::1] out_list_):
+                          DTYPE_float32_t[:, :, ::1] out_list_,
+                          DTYPE_uint8_t[::1] window_mask_):
 
     """
     Calculates the Anisotropic Built-up Presence Index (PanTex)
@@ -2402,6 +2517,10 @@ cdef void _feature_pantex(DTYPE_uint8_t[:, ::1] chBd,
 
                 for j from 0 <= j < cols-scales_block by blk:
 
+                    if _skip_window(window_mask_, pix_ctr, out_list_.shape[0]):
+                        pix_ctr += out_list_.shape[0]
+                        continue
+
                     for ki in range(0, scale_length):
 
                         k = scs[ki]
@@ -2444,7 +2563,7 @@ cdef void _feature_pantex(DTYPE_uint8_t[:, ::1] chBd,
                         _get_weighted_mean_var_byte(ch_bd, kernel_weight, block_rows, block_cols, in_zs)
 
                         if not npy_isnan(con_min) and not npy_isinf(con_min):
-                            out_list_[pix_ctr] = con_min * in_zs[0]
+                            _fill_output(out_list_, pix_ctr, con_min * in_zs[0])
 
                         pix_ctr += 1
 
@@ -2456,6 +2575,10 @@ cdef void _feature_pantex(DTYPE_uint8_t[:, ::1] chBd,
 
                 for j from 0 <= j < cols-scales_block by blk:
 
+                    if _skip_window(window_mask_, pix_ctr, out_list_.shape[0]):
+                        pix_ctr += out_list_.shape[0]
+                        continue
+
                     for ki in range(0, scale_length):
 
                         k = scs[ki]
@@ -2489,12 +2612,12 @@ cdef void _feature_pantex(DTYPE_uint8_t[:, ::1] chBd,
                             con_min = _glcm_contrast(glcm_mat, dists, disp_vect, levels, contrast_weights)
 
                         if not npy_isnan(con_min) and not npy_isinf(con_min):
-                            out_list_[pix_ctr] = con_min
+                            _fill_output(out_list_, pix_ctr, con_min)
 
                         pix_ctr += 1
 
 
-def feature_pantex(DTYPE_uint8_t[:, ::1] chbd, int blk, list scs, int end_scale, bint weighted, int levels=32):
+def feature_pantex(DTYPE_uint8_t[:, ::1] chbd, int blk, list scs, int end_scale, bint weighted, int levels=32, DTYPE_uint8_t[::1] window_mask=None):
 
     cdef:
         Py_ssize_t i, j, ki
@@ -2504,23 +2627,66 @@ def feature_pantex(DTYPE_uint8_t[:, ::1] chbd, int blk, list scs, int end_scale,
         int cols = chbd.shape[1]
         DTYPE_uint16_t[::1] scales_array = np.array(scs, dtype='uint16')
         int scale_length = scales_array.shape[0]
-        unsigned int out_len = _get_output_length(rows, cols, scales_block, blk, scale_length, 1)
-        DTYPE_float32_t[::1] out_list = np.zeros(out_len, dtype='float32')
+        DTYPE_float32_t[:, :, ::1] out_list = _create_output(rows, cols, scales_block, blk, scale_length)
+
+    if window_mask is None:
+        window_mask = np.ones(out_list.shape[1]*out_list.shape[2], dtype='uint8')
+
+    # The kernels index the mask without bounds checking.
+    assert window_mask.shape[0] == out_list.shape[1]*out_list.shape[2], 'The window mask does not match the output windows.'
 
     _feature_pantex(chbd,
                     blk,
                     scales_array,
                     scales_half,
                     scales_block,
-                    out_len,
                     weighted,
                     rows,
                     cols,
                     scale_length,
                     levels,
-                    out_list)
+                    out_list,
+                    window_mask)
+
+    return np.asarray(out_list)
+
+
+cdef void _get_weighted_mean_var_stack(DTYPE_float32_t[:, :, ::1] ch_stack,
+                                       Py_ssize_t ci,
+                                       Py_ssize_t r_start,
+                                       Py_ssize_t c_start,
+                                       DTYPE_float32_t[:, ::1] weights,
+                                       int rs,
+                                       int cs,
+                                       DTYPE_float32_t[::1] out_values_) nogil:
+
+    """
+    Computes the weighted mean and variance of one channel window, indexed in place
+    """
 
-    return np.float32(out_list)
+    cdef:
+        Py_ssize_t bi, bj
+        DTYPE_float32_t n_samps = float(rs*cs)
+        DTYPE_float32_t block_sum = 0.
+        DTYPE_float32_t block_var = 0.
+        DTYPE_float32_t dv, mu
+
+    for bi in range(0, rs):
+        for bj in range(0, cs):
+
+            dv = ch_stack[ci, r_start+bi, c_start+bj] / weights[bi, bj]
+
+            if not npy_isnan(dv) and not npy_isinf(dv):
+                block_sum += dv
+
+    mu = block_sum / n_samps
+
+    for bi in range(0, rs):
+        for bj in range(0, cs):
+            block_var += pow2(float(ch_stack[ci, r_start+bi, c_start+bj]) - mu)
+
+    out_values_[0] = mu
+    out_values_[1] = block_var / n_samps
 
 
 cdef DTYPE_float32_t[:, ::1] _create_weights(DTYPE_float32_t[:, ::1] dist_weights, int rs, int cs) nogil:
@@ -2537,7 +2703,7 @@ cdef DTYPE_float32_t[:, ::1] _create_weights(DTYPE_float32_t[:, ::1] dist_weight
     return dist_weights
 
 
-cdef void feature_mean_float32(DTYPE_float32_t[:, ::1] ch_bd,
+cdef void feature_mean_float32(DTYPE_float32_t[:, :, ::1] ch_stack,
                                unsigned int blk,
                                DTYPE_uint16_t[::1] scs,
                                unsigned int scales_half,
@@ -2545,70 +2711,108 @@ cdef void feature_mean_float32(DTYPE_float32_t[:, ::1] ch_bd,
                                unsigned int scale_length,
                                DTYPE_float32_t[:, :, ::1] dist_weights_stack,
                                DTYPE_float32_t[::1] in_zs,
-                               DTYPE_float32_t[::1] out_list_):
+                               DTYPE_float32_t[:, :, ::1] out_list_,
+                               DTYPE_uint8_t[::1] window_mask_):
+
+    """
+    Computes the weighted mean and variance of every channel in one pass
+
+    The window bounds and distance weights of each scale are shared by
+    all channels, and the statistics are written to band
+    (channel * scales + scale) * 2 of the output.
+    """
 
     cdef:
-        Py_ssize_t i, j, ki, pix_ctr, pi
+        Py_ssize_t i, j, ki, ci, out_i, out_j, out_band
         DTYPE_uint16_t k
-        unsigned int k_half, r_size, c_size
-        unsigned int rows = ch_bd.shape[0]
-        unsigned int cols = ch_bd.shape[1]
-        DTYPE_float32_t[:, ::1] block_chunk, dw
+        unsigned int k_half, rc_start, r_size, c_size
+        unsigned int n_channels = ch_stack.shape[0]
+        unsigned int rows = ch_stack.shape[1]
+        unsigned int cols = ch_stack.shape[2]
+        unsigned int out_cols = out_list_.shape[2]
+        DTYPE_float32_t[:, ::1] dw
 
-    pix_ctr = 0
+    out_i = 0
 
     with nogil:
 
         for i from 0 <= i < rows-scales_block by blk:
 
+            out_j = 0
+
             for j from 0 <= j < cols-scales_block by blk:
 
+                if window_mask_[out_i*out_cols+out_j] == 0:
+
+                    out_j += 1
+                    continue
+
                 for ki in range(0, scale_length):
 
                     k = scs[ki]
 
                     k_half = <int>(k / 2.)
 
-                    #rc_start = scales_half - k_half
-                    #rc_end = scales_half - k_half + k
+                    rc_start = scales_half - k_half
 
-                    #r_size = (i + rc_end) - (i + rc_start) if (i + rc_end) - (i + rc_start) <= rows else rows - (i + rc_start)
-                    #c_size = (j + rc_end) - (j + rc_start) if (j + rc_end) - (j + rc_start) <= cols else cols - (j + rc_start)
+                    # Windows at the section edge are clipped.
+                    r_size = k if i+rc_start+k <= rows else rows - (i+rc_start)
+                    c_size = k if j+rc_start+k <= cols else cols - (j+rc_start)
 
-                    block_chunk = ch_bd[i+scales_half-k_half:i+scales_half-k_half+k,
-                                        j+scales_half-k_half:j+scales_half-k_half+k]
+                    dw = dist_weights_stack[ki, :r_size, :c_size]
 
-                    r_size = block_chunk.shape[0]
-                    c_size = block_chunk.shape[1]
+                    for ci in range(0, n_channels):
 
-                    dw = dist_weights_stack[ki, :r_size, :c_size]
+                        _get_weighted_mean_var_stack(ch_stack, ci, i+rc_start, j+rc_start, dw, r_size, c_size, in_zs)
 
-                    _get_weighted_mean_var(block_chunk, dw, r_size, c_size, in_zs)
+                        out_band = (ci*scale_length + ki) * 2
 
-                    for pi in range(0, 2):
+                        out_list_[out_band, out_i, out_j] = in_zs[0]
+                        out_list_[out_band+1, out_i, out_j] = in_zs[1]
 
-                        out_list_[pix_ctr] = in_zs[pi]
+                out_j += 1
 
-                        pix_ctr += 1
+            out_i += 1
 
 
-def feature_mean(DTYPE_float32_t[:, ::1] ch_bd, int blk, list scs, int end_scale):
+def feature_mean(np.ndarray ch_bd, int blk, list scs, int end_scale, DTYPE_uint8_t[::1] window_mask=None,
+                 weight_scale=1.):
+
+    """
+    Computes the weighted mean and variance at each scale
+
+    Args:
+        ch_bd (2d or 3d array): A section, or a <channels x rows x columns> stack.
+        blk (int)
+        scs (list)
+        end_scale (int)
+        window_mask (Optional[1d array])
+        weight_scale (Optional[float or list]): The distance weight factor, or one factor per scale,
+            so that downsampled windows keep full resolution distance weights.
+
+    Returns:
+        A <channels*scales*2 x rows x columns> array, ordered by channel, scale and statistic
+    """
 
     cdef:
-        Py_ssize_t i, j, ki
+        Py_ssize_t ki
+        DTYPE_float32_t[:, :, ::1] ch_stack = np.ascontiguousarray(ch_bd.reshape(-1, ch_bd.shape[ch_bd.ndim-2], ch_bd.shape[ch_bd.ndim-1]),
+                                                                   dtype='float32')
+        unsigned int n_channels = ch_stack.shape[0]
         unsigned int scales_half = <int>(end_scale / 2.)
         unsigned int scales_block = end_scale - blk
-        unsigned int rows = ch_bd.shape[0]
-        unsigned int cols = ch_bd.shape[1]
+        unsigned int rows = ch_stack.shape[1]
+        unsigned int cols = ch_stack.shape[2]
         DTYPE_uint16_t[::1] scales_array = np.array(scs, dtype='uint16')
         unsigned int scale_length = scales_array.shape[0]
         unsigned int k, k_half, rc_start, rc_end, rc
         DTYPE_float32_t[:, :, ::1] dist_weights_stack = np.zeros((scale_length, end_scale*2, end_scale*2), dtype='float32')
         DTYPE_float32_t[:, ::1] dist_weights
         DTYPE_float32_t[::1] in_zs = np.zeros(2, dtype='float32')
-        unsigned int out_len = _get_output_length(rows, cols, scales_block, blk, scale_length, 2)
-        DTYPE_float32_t[::1] out_list = np.zeros(out_len, dtype='float32')
+        DTYPE_float32_t[:, :, ::1] out_list = _create_output(rows, cols, scales_block, blk, n_channels*scale_length*2)
+        np.ndarray weight_scales = np.float32(weight_scale).reshape(-1, 1, 1)
 
+    # The weights of each scale are created once for all channels.
     for ki in range(0, scale_length):
 
         k = scales_array[ki]
@@ -2623,7 +2827,16 @@ def feature_mean(DTYPE_float32_t[:, ::1] ch_bd, int blk, list scs, int end_scale
 
         dist_weights_stack[ki, :rc, :rc] = _create_weights(dist_weights, rc, rc)
 
-    feature_mean_float32(ch_bd,
+    if np.any(weight_scales != 1):
+        np.asarray(dist_weights_stack)[...] *= weight_scales
+
+    if window_mask is None:
+        window_mask = np.ones(out_list.shape[1]*out_list.shape[2], dtype='uint8')
+
+    # The kernels index the mask without bounds checking.
+    assert window_mask.shape[0] == out_list.shape[1]*out_list.shape[2], 'The window mask does not match the output windows.'
+
+    feature_mean_float32(ch_stack,
                          blk,
                          scales_array,
                          scales_half,
@@ -2631,9 +2844,10 @@ def feature_mean(DTYPE_float32_t[:, ::1] ch_bd, int blk, list scs, int end_scale
                          scale_length,
                          dist_weights_stack,
                          in_zs,
-                         out_list)
+                         out_list,
+                         window_mask)
 
-    return np.float32(out_list)
+    return np.asarray(out_list)
 
 
 # def feaCtrFloat64(np.ndarray[DTYPE_float64_t, ndim=2] chBd, int blk, list scs, int rows, int cols):
@@ -2806,10 +3020,10 @@ cdef void _feature_lacunarity(DTYPE_uint8_t[:, ::1] chunk_block,
                               int rows,
                               int cols,
                               int r,
-                              int out_len,
                               int scale_length,
                               DTYPE_float32_t[::1] zs,
-                              DTYPE_float32_t[::1] out_list_):
+                              DTYPE_float32_t[:, :, ::1] out_list_,
+                              DTYPE_uint8_t[::1] window_mask_):
 
     cdef:
         Py_ssize_t i, j, ki, cr, cc
@@ -2823,6 +3037,10 @@ cdef void _feature_lacunarity(DTYPE_uint8_t[:, ::1] chunk_block,
 
             for j from 0 <= j < cols-scales_block by blk:
 
+                if _skip_window(window_mask_, pixel_counter, out_list_.shape[0]):
+                    pixel_counter += out_list_.shape[0]
+                    continue
+
                 for ki in range(0, scale_length):
 
                     k = scales[ki]
@@ -2835,14 +3053,14 @@ cdef void _feature_lacunarity(DTYPE_uint8_t[:, ::1] chunk_block,
                     cc = ch_bd.shape[1]
 
                     if _get_max(ch_bd, cr, cc) == 0:
-                        out_list_[pixel_counter] = 0
+                        _fill_output(out_list_, pixel_counter, 0)
                     else:
-                        out_list_[pixel_counter] = _lacunarity(ch_bd, r, zs)
+                        _fill_output(out_list_, pixel_counter, _lacunarity(ch_bd, r, zs))
 
                     pixel_counter += 1
 
 
-def feature_lacunarity(DTYPE_uint8_t[:, ::1] chunk_block, int blk, list scales, int end_scale, int r=2):
+def feature_lacunarity(DTYPE_uint8_t[:, ::1] chunk_block, int blk, list scales, int end_scale, int r=2, DTYPE_uint8_t[::1] window_mask=None):
 
     cdef:
         Py_ssize_t i, j, ki
@@ -2853,8 +3071,13 @@ def feature_lacunarity(DTYPE_uint8_t[:, ::1] chunk_block, int blk, list scales,
         DTYPE_uint16_t[::1] scale_array = np.array(scales, dtype='uint16')
         int scale_length = scale_array.shape[0]
         DTYPE_float32_t[::1] zs = np.zeros((end_scale*2)*(end_scale*2), dtype='float32')
-        unsigned int out_len = _get_output_length(rows, cols, scales_block, blk, scale_length, 1)
-        DTYPE_float32_t[::1] out_list = np.zeros(out_len, dtype='float32')
+        DTYPE_float32_t[:, :, ::1] out_list = _create_output(rows, cols, scales_block, blk, scale_length)
+
+    if window_mask is None:
+        window_mask = np.ones(out_list.shape[1]*out_list.shape[2], dtype='uint8')
+
+    # The kernels index the mask without bounds checking.
+    assert window_mask.shape[0] == out_list.shape[1]*out_list.shape[2], 'The window mask does not match the output windows.'
 
     _feature_lacunarity(chunk_block,
                         blk,
@@ -2864,12 +3087,12 @@ def feature_lacunarity(DTYPE_uint8_t[:, ::1] chunk_block, int blk, list scales,
                         rows,
                         cols,
                         r,
-                        out_len,
                         scale_length,
                         zs,
-                        out_list)
+                        out_list,
+                        window_mask)
 
-    return np.float32(out_list)
+    return np.asarray(out_list)
 
 
 # cdef azimuthal_avg(image, center=None):
@@ -36,11 +36,6 @@ try:
 except ImportError:
     raise ImportError('OpenCV must be installed')
 
-try:
-    import matplotlib.pyplot as plt
-except ImportError:
-    raise ImportError('Matplotlib must be installed')
-
 
 def get_edge_pixels(ori_img, mag_img, mag_thresh):
 
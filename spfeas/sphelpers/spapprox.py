@@ -0,0 +1,270 @@
+from __future__ import division
+from future.utils import viewitems
+
+from ..errors import logger
+
+import numpy as np
+
+
+# The triggers whose kernels can be evaluated on a downsampled section.
+#   Key point, line and structural (sfs) features count or measure in
+#   pixels, and the Python kernels (fourier, lsr) and lbp keep their
+#   own layouts, so these triggers are always computed exactly.
+APPROX_TRIGGERS = ['dmp', 'gabor', 'grad', 'hog', 'lac', 'lbpm', 'mean', 'pantex', 'saliency', 'seg']
+
+# The supported downsampling factors.
+APPROX_FACTORS = [2, 4]
+
+
+def parse_approx(approx, spectral_indices=None):
+
+    """
+    Parses per-trigger approximation thresholds
+
+    Args:
+        approx (list or dict): A list of 'trigger:scale' strings or a dictionary.
+        spectral_indices (Optional[list]): The spectral index triggers, which are also supported.
+
+    Returns:
+        Dictionary of {trigger: threshold scale}
+    """
+
+    if not approx:
+        return dict()
+
+    if isinstance(approx, dict):
+        approx_items = list(viewitems(approx))
+    else:
+
+        approx_items = list()
+
+        for trigger_str in approx:
+
+            if ':' not in trigger_str:
+
+                logger.error('The approximation, {}, should be given as <trigger>:<scale>.'.format(trigger_str))
+                raise ValueError
+
+            approx_items.append(tuple(trigger_str.split(':')))
+
+    supported_triggers = APPROX_TRIGGERS + (list(spectral_indices) if spectral_indices else list())
+
+    approx_dict = dict()
+
+    for trigger, threshold in approx_items:
+
+        trigger = trigger.lower()
+
+        if trigger not in supported_triggers:
+
+            logger.error('The trigger, {}, does not support approximation.'.format(trigger))
+            raise ValueError
+
+        try:
+            threshold = int(threshold)
+        except ValueError:
+
+            logger.error('The approximation scale, {}, for {} should be an integer.'.format(threshold, trigger))
+            raise
+
+        approx_dict[trigger] = threshold
+
+    return approx_dict
+
+
+def get_approx_scales(parameter_object):
+
+    """
+    Splits the scales of the current trigger into exact and approximated scales
+
+    A scale is approximated if it is at least the trigger threshold
+    and it still covers a (downsampled) block after downsampling.
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        The exact scales, the approximated scales
+    """
+
+    threshold = parameter_object.approx.get(parameter_object.trigger) if parameter_object.approx else None
+
+    if threshold is None:
+        return list(parameter_object.scales), list()
+
+    factor = parameter_object.approx_factor
+    block_ds = max(1, int(parameter_object.block / factor))
+
+    exact_scales = list()
+    approx_scales = list()
+
+    for scale in parameter_object.scales:
+
+        if (scale >= threshold) and (int(scale / factor) >= block_ds):
+            approx_scales.append(scale)
+        else:
+            exact_scales.append(scale)
+
+    return exact_scales, approx_scales
+
+
+def downsample_section(section_array, factor):
+
+    """
+    Downsamples a section by area averaging
+
+    Args:
+        section_array (2d or 3d array): The section, with layers on the first axis.
+        factor (int): The downsampling factor.
+
+    Returns:
+        The downsampled section, with the input data type
+    """
+
+    import cv2
+
+    rows, cols = section_array.shape[-2:]
+
+    out_size = (max(1, int(cols / factor)), max(1, int(rows / factor)))
+
+    if section_array.ndim == 2:
+        return np.ascontiguousarray(cv2.resize(section_array, out_size, interpolation=cv2.INTER_AREA))
+
+    return np.ascontiguousarray([cv2.resize(np.ascontiguousarray(layer), out_size, interpolation=cv2.INTER_AREA)
+                                 for layer in section_array], dtype=section_array.dtype)
+
+
+def _get_mean_weight(window_size):
+
+    """
+    Gets the mean inverse distance weight of a mean (or Gabor) kernel window
+
+    The kernels weight each pixel by its inverse distance to the
+    window center, and the center pixel (at distance 0) is skipped.
+    """
+
+    window_range = np.arange(window_size, dtype='float64')
+
+    distances = np.hypot(window_range[:, np.newaxis] - window_size / 2.,
+                         window_range[np.newaxis, :] - window_size / 2.)
+
+    return float(np.sum(1. / distances[distances > 0]) / distances.size)
+
+
+def get_mean_weight_scales(scales, scales_ds):
+
+    """
+    Gets the distance weight factor of each downsampled mean (or Gabor) kernel scale
+
+    The mean and Gabor kernel features are inverse distance weighted window means,
+    which depend on the window pixel size. Each factor matches the mean
+    weight of the downsampled window to that of the full resolution
+    window, so a uniform section gives the exact features.
+
+    Args:
+        scales (list): The full resolution scales.
+        scales_ds (list): The downsampled scales.
+
+    Returns:
+        A list of weight factors, one for each scale
+    """
+
+    return [_get_mean_weight(scale_ds) / _get_mean_weight(scale) for scale, scale_ds in zip(scales, scales_ds)]
+
+
+def get_grid_index(out_size, block, end_scale, out_size_ds, block_ds, end_scale_ds, factor):
+
+    """
+    Gets the nearest downsampled window of each output window
+
+    The window of output cell i is centered at i * block + end_scale / 2
+    (in pixel edge coordinates), which is i * block / factor + end_scale / (2 * factor)
+    on the downsampled grid.
+
+    Args:
+        out_size (int): The number of output rows (or columns).
+        block (int)
+        end_scale (int)
+        out_size_ds (int): The number of downsampled output rows (or columns).
+        block_ds (int)
+        end_scale_ds (int)
+        factor (int)
+
+    Returns:
+        The downsampled output index of each output cell
+    """
+
+    centers = (np.arange(out_size) * block + int(end_scale / 2)) / factor
+
+    grid_index = np.round((centers - int(end_scale_ds / 2)) / block_ds).astype('int64')
+
+    return np.clip(grid_index, 0, out_size_ds - 1)
+
+
+def map_to_grid(features_ds, out_rows, out_cols, block, end_scale, block_ds, end_scale_ds, factor):
+
+    """
+    Maps features computed on a downsampled section onto the output grid
+
+    Args:
+        features_ds (3d array): The <features x rows x columns> downsampled features.
+        out_rows (int): The output rows.
+        out_cols (int): The output columns.
+        block (int)
+        end_scale (int)
+        block_ds (int)
+        end_scale_ds (int)
+        factor (int)
+
+    Returns:
+        The <features x out_rows x out_cols> features
+    """
+
+    row_index = get_grid_index(out_rows, block, end_scale, features_ds.shape[1], block_ds, end_scale_ds, factor)
+    col_index = get_grid_index(out_cols, block, end_scale, features_ds.shape[2], block_ds, end_scale_ds, factor)
+
+    return features_ds[:, row_index[:, np.newaxis], col_index[np.newaxis, :]]
+
+
+def get_band_scales(n_bands, scales):
+
+    """
+    Gets the scale of each output band, as the kernels order bands by scale
+
+    Args:
+        n_bands (int): The number of output bands of the trigger.
+        scales (list)
+
+    Returns:
+        A list of (scale, feature index) pairs
+    """
+
+    n_features = int(n_bands / len(scales))
+
+    return [(scales[int(band_index / n_features)], band_index % n_features) for band_index in range(0, n_bands)]
+
+
+def compare_features(exact_values, approx_values):
+
+    """
+    Compares approximated with exact features
+
+    Args:
+        exact_values (1d array)
+        approx_values (1d array)
+
+    Returns:
+        The correlation, the root mean squared error, the standard deviation of the exact features
+    """
+
+    exact_values = np.float64(exact_values)
+    approx_values = np.float64(approx_values)
+
+    if (exact_values.size < 2) or (exact_values.std() == 0) or (approx_values.std() == 0):
+        correlation = np.nan
+    else:
+        correlation = float(np.corrcoef(exact_values, approx_values)[0, 1])
+
+    rmse = float(np.sqrt(np.mean((exact_values - approx_values) ** 2))) if exact_values.size > 0 else np.nan
+
+    return correlation, rmse, float(exact_values.std()) if exact_values.size > 0 else np.nan
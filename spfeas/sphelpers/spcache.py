@@ -0,0 +1,177 @@
+from __future__ import division
+
+import os
+import shutil
+import hashlib
+import tempfile
+
+from ..errors import logger
+
+import numpy as np
+
+
+class SectionCache(object):
+
+    """
+    A class to cache prepared sections on disk
+
+    Sections are stored as memory-mapped .npy files in a scratch
+    directory shared by all workers of a run. The least recently
+    used sections are removed when the cache exceeds its size budget.
+
+    Args:
+        cache_dir (str): The scratch directory.
+        cache_size (int): The cache size budget (MB).
+    """
+
+    def __init__(self, cache_dir, cache_size):
+
+        self.cache_dir = cache_dir
+        self.cache_bytes = int(cache_size * 1024 * 1024)
+
+        if not os.path.isdir(self.cache_dir):
+
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError:
+                pass
+
+    @staticmethod
+    def get_key(*key_items):
+
+        """Gets the cache key of a section"""
+
+        return hashlib.md5(repr(key_items).encode('utf-8')).hexdigest()
+
+    def _get_file(self, key):
+        return os.path.join(self.cache_dir, '{}.npy'.format(key))
+
+    def get(self, key):
+
+        """
+        Loads a cached section
+
+        Args:
+            key (str)
+
+        Returns:
+            The section array, or None if the section is not cached
+        """
+
+        cache_file = self._get_file(key)
+
+        if not os.path.isfile(cache_file):
+            return None
+
+        try:
+
+            # Copy-on-write keeps the array writable
+            #   without modifying the cached file.
+            cached_array = np.load(cache_file, mmap_mode='c')
+
+        except (IOError, OSError, ValueError):
+            return None
+
+        # Mark the section as recently used.
+        try:
+            os.utime(cache_file, None)
+        except OSError:
+            pass
+
+        return cached_array
+
+    def put(self, key, array2cache):
+
+        """
+        Stores a section
+
+        Args:
+            key (str)
+            array2cache (ndarray)
+        """
+
+        if array2cache.nbytes > self.cache_bytes:
+            return
+
+        cache_file = self._get_file(key)
+
+        if os.path.isfile(cache_file):
+            return
+
+        self._evict(array2cache.nbytes)
+
+        # Write to a temporary file first so other
+        #   workers never load a partial file.
+        temp_file = os.path.join(self.cache_dir, '{}_{:d}.tmp'.format(key, os.getpid()))
+
+        try:
+
+            with open(temp_file, 'wb') as cf:
+                np.save(cf, np.ascontiguousarray(array2cache))
+
+            os.rename(temp_file, cache_file)
+
+        except (IOError, OSError):
+
+            logger.warning('  Could not write to the section cache.')
+
+            if os.path.isfile(temp_file):
+                os.remove(temp_file)
+
+    def _evict(self, n_bytes):
+
+        """Removes the least recently used sections until `n_bytes` fit in the budget"""
+
+        cache_files = list()
+
+        for cache_name in os.listdir(self.cache_dir):
+
+            if not cache_name.endswith('.npy'):
+                continue
+
+            cache_file = os.path.join(self.cache_dir, cache_name)
+
+            try:
+                cache_stat = os.stat(cache_file)
+            except OSError:
+                continue
+
+            cache_files.append((cache_stat.st_mtime, cache_stat.st_size, cache_file))
+
+        cache_total = sum([cf[1] for cf in cache_files])
+
+        for __, cache_file_size, cache_file in sorted(cache_files):
+
+            if cache_total + n_bytes <= self.cache_bytes:
+                break
+
+            try:
+                os.remove(cache_file)
+            except OSError:
+                pass
+
+            cache_total -= cache_file_size
+
+    def clear(self):
+
+        """Removes the cache directory"""
+
+        if os.path.isdir(self.cache_dir):
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def get_cache_dir(parameter_object):
+
+    """
+    Gets the section cache directory of a run
+
+    Args:
+        parameter_object (class)
+    """
+
+    if parameter_object.cache_dir:
+        cache_root = parameter_object.cache_dir
+    else:
+        cache_root = tempfile.gettempdir()
+
+    return os.path.join(cache_root, 'spfeas_cache_{}_{:d}'.format(parameter_object.f_base, os.getpid()))
@@ -0,0 +1,209 @@
+from __future__ import division
+
+import copy
+
+from ..errors import logger
+
+from mpglue import raster_tools
+
+import numpy as np
+
+# GDAL
+try:
+    from osgeo import gdal
+except:
+
+    logger.error('GDAL must be installed')
+    raise ImportError
+
+
+# The processing time (seconds per valid input
+#   megapixel) used before any section is timed.
+DEFAULT_RATE = 1.
+
+# The decimated probe size (pixels per side).
+PROBE_SIZE = 32
+
+
+def get_cost_features(image_info, parameter_object):
+
+    """
+    Gets the cost features of every section
+
+    The features are the number of valid input pixels (in megapixels)
+    and a texture probe. The probe is the standard deviation of a small
+    decimated read of the section, scaled to 0-1 by the largest probe.
+    GDAL serves the decimated reads from the input overviews, so without
+    overviews the probe is skipped and sections are costed by area only.
+
+    Args:
+        image_info (`ropen` object)
+        parameter_object (class)
+
+    Returns:
+        A list of (valid megapixels, probe) pairs, one for each section
+    """
+
+    ds = gdal.Open(parameter_object.input_image, gdal.GA_ReadOnly)
+    band = ds.GetRasterBand(1)
+
+    use_probe = band.GetOverviewCount() > 0
+
+    if use_probe:
+
+        logger.info('  Probing the section texture from the overviews ...')
+
+        nodata = band.GetNoDataValue()
+
+    else:
+        logger.info('  The input has no overviews, so sections are costed by area only.')
+
+    section_pixels = list()
+    section_probes = list()
+
+    for section_counter, section_pair in enumerate(parameter_object.section_idx_pairs):
+
+        i_sect, j_sect = section_pair
+
+        n_rows = raster_tools.n_rows_cols(i_sect,
+                                          parameter_object.sect_row_size,
+                                          image_info.rows)
+
+        n_cols = raster_tools.n_rows_cols(j_sect,
+                                          parameter_object.sect_col_size,
+                                          image_info.cols)
+
+        valid_pixels = n_rows * n_cols / 1000000.
+
+        if parameter_object.skip_nodata:
+            valid_pixels *= parameter_object.section_coverage[section_counter]
+
+        section_pixels.append(valid_pixels)
+
+        if not use_probe or (valid_pixels == 0):
+
+            section_probes.append(0.)
+            continue
+
+        probe_array = np.float32(band.ReadAsArray(j_sect,
+                                                  i_sect,
+                                                  n_cols,
+                                                  n_rows,
+                                                  buf_xsize=min(PROBE_SIZE, n_cols),
+                                                  buf_ysize=min(PROBE_SIZE, n_rows)))
+
+        if nodata is not None:
+            probe_array = probe_array[probe_array != nodata]
+
+        section_probes.append(float(probe_array.std()) if probe_array.size > 0 else 0.)
+
+    band = None
+    ds = None
+
+    max_probe = max(section_probes) if section_probes else 0.
+
+    if max_probe > 0:
+        section_probes = [section_probe / max_probe for section_probe in section_probes]
+
+    return list(zip(section_pixels, section_probes))
+
+
+class CostModel(object):
+
+    """
+    A per-trigger model of the section processing time
+
+    The compute time of a section is modeled as
+
+        seconds = a * megapixels + b * megapixels * probe
+
+    where the coefficients a and b of each trigger are fit by least squares
+    to the timed sections. The model is stored as the running sums of the fit.
+
+    Args:
+        model_dict (Optional[dict]): A model from `to_dict`.
+    """
+
+    def __init__(self, model_dict=None):
+
+        # The sums of x1*x1, x1*x2, x2*x2, x1*y, x2*y and the sample count, by trigger.
+        self.model_dict = copy.deepcopy(model_dict) if isinstance(model_dict, dict) else dict()
+
+    def get_coefficients(self, trigger):
+
+        """
+        Gets the model coefficients of a trigger
+
+        Args:
+            trigger (str)
+
+        Returns:
+            The area coefficient, the texture coefficient
+        """
+
+        if trigger not in self.model_dict:
+            return DEFAULT_RATE, 0.
+
+        s11, s12, s22, s1y, s2y, n_samples = self.model_dict[trigger]
+
+        if s11 <= 0:
+            return DEFAULT_RATE, 0.
+
+        det = s11 * s22 - s12 * s12
+
+        if (n_samples >= 3) and (det > 1e-9 * s11 * s22):
+
+            area_coeff = (s1y * s22 - s2y * s12) / det
+            texture_coeff = (s2y * s11 - s1y * s12) / det
+
+            if (area_coeff > 0) and (texture_coeff >= 0):
+                return area_coeff, texture_coeff
+
+        # Fall back to an area rate.
+        return s1y / s11, 0.
+
+    def estimate(self, trigger, megapixels, probe):
+
+        """
+        Estimates the compute time (seconds) of a section
+
+        Args:
+            trigger (str)
+            megapixels (float): The valid input megapixels.
+            probe (float): The texture probe.
+        """
+
+        area_coeff, texture_coeff = self.get_coefficients(trigger)
+
+        return megapixels * (area_coeff + texture_coeff * probe)
+
+    def update(self, trigger, megapixels, probe, seconds):
+
+        """
+        Adds a timed section to the model
+
+        Args:
+            trigger (str)
+            megapixels (float): The valid input megapixels.
+            probe (float): The texture probe.
+            seconds (float): The measured compute time.
+        """
+
+        if megapixels <= 0:
+            return
+
+        x1 = float(megapixels)
+        x2 = float(megapixels * probe)
+        y = float(seconds)
+
+        s11, s12, s22, s1y, s2y, n_samples = self.model_dict.get(trigger, [0.] * 5 + [0])
+
+        self.model_dict[trigger] = [s11 + x1 * x1,
+                                    s12 + x1 * x2,
+                                    s22 + x2 * x2,
+                                    s1y + x1 * y,
+                                    s2y + x2 * y,
+                                    n_samples + 1]
+
+    def to_dict(self):
+        return copy.deepcopy(self.model_dict)
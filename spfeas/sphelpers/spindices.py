@@ -0,0 +1,124 @@
+from __future__ import division
+
+import itertools
+
+from ..errors import logger
+
+from mpglue import utils, VegIndicesEquations
+
+import numpy as np
+
+
+def get_fused_triggers(parameter_object):
+
+    """
+    Gets the spectral index triggers that are processed together with the current trigger
+
+    Spectral indices with the same approximation setting share one section
+    task, which is dispatched with the first of them. The band union is
+    read once and every index is computed from it.
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        The fused triggers, in trigger order, or None if the trigger is not fused
+    """
+
+    if parameter_object.trigger not in parameter_object.spectral_indices:
+        return None
+
+    approx = parameter_object.approx if parameter_object.approx else dict()
+
+    fused_triggers = [trigger for trigger in parameter_object.triggers
+                      if (trigger in parameter_object.spectral_indices) and
+                      (approx.get(trigger) == approx.get(parameter_object.trigger))]
+
+    return fused_triggers if len(fused_triggers) > 1 else None
+
+
+def get_section_triggers(parameter_object):
+
+    """
+    Gets the triggers whose features are computed by one section task
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        A list of triggers
+    """
+
+    fused_triggers = getattr(parameter_object, 'fused_triggers', None)
+
+    return list(fused_triggers) if fused_triggers else [parameter_object.trigger]
+
+
+def read_indices(image_info, parameter_object, index_triggers, i_sect, j_sect, n_rows, n_cols):
+
+    """
+    Reads the union of the index bands once and computes each spectral index
+
+    Args:
+        image_info (`ropen` object)
+        parameter_object (class)
+        index_triggers (list): The spectral index triggers.
+        i_sect (int)
+        j_sect (int)
+        n_rows (int)
+        n_cols (int)
+
+    Returns:
+        The <indices x rows x columns> float32 array
+    """
+
+    index_bands = dict()
+
+    for trigger in index_triggers:
+
+        # Check if the sensor supports the spectral index
+        utils.sensor_wavelength_check(parameter_object.sat_sensor,
+                                      utils.VI_WAVELENGTHS[trigger.upper()])
+
+        # Get the band positions needed
+        #   to process the spectral index.
+        index_bands[trigger] = list(utils.get_index_bands(trigger.upper(),
+                                                          parameter_object.sat_sensor))
+
+    union_bands = sorted(set(itertools.chain.from_iterable(index_bands.values())))
+
+    if len(index_triggers) > 1:
+
+        logger.info('  Computing {} from bands {} ...'.format(', '.join(index_triggers),
+                                                              ','.join(map(str, union_bands))))
+
+    sect_union = image_info.read(bands2open=union_bands,
+                                 i=i_sect,
+                                 j=j_sect,
+                                 rows=n_rows,
+                                 cols=n_cols,
+                                 d_type='float32')
+
+    if sect_union.ndim == 2:
+        sect_union = sect_union[np.newaxis]
+
+    sect_union[sect_union >= parameter_object.image_max] = parameter_object.image_max
+    sect_union /= parameter_object.image_max
+
+    band_layers = dict([(band_position, layer_index) for layer_index, band_position in enumerate(union_bands)])
+
+    index_stack = np.empty((len(index_triggers), sect_union.shape[1], sect_union.shape[2]), dtype='float32')
+
+    for trigger_counter, trigger in enumerate(index_triggers):
+
+        index_layers = [band_layers[band_position] for band_position in index_bands[trigger]]
+
+        # The equations take the bands in the index order.
+        if len(index_layers) == 1:
+            vie = VegIndicesEquations(sect_union[index_layers[0]], chunk_size=-1)
+        else:
+            vie = VegIndicesEquations(sect_union[index_layers], chunk_size=-1)
+
+        index_stack[trigger_counter] = vie.compute(trigger.upper(), out_type=1)
+
+    return index_stack
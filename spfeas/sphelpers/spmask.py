@@ -0,0 +1,273 @@
+from __future__ import division
+
+from ..errors import logger
+from . import sputilities
+
+from mpglue import raster_tools
+
+import numpy as np
+
+# GDAL
+try:
+    from osgeo import gdal
+except:
+
+    logger.error('GDAL must be installed')
+    raise ImportError
+
+
+def get_mask_bands(parameter_object):
+
+    """
+    Gets the band positions used to build the valid data mask
+
+    Args:
+        parameter_object (class)
+    """
+
+    mask_bands = list(parameter_object.band_positions)
+
+    if parameter_object.use_rgb:
+        mask_bands += [1, 2, 3]
+
+    return sorted(set(mask_bands))
+
+
+def _get_block_any(valid_pixels, blk, out_rows, out_cols):
+
+    """Reduces a pixel mask to the output cells that hold any valid pixel"""
+
+    footprint = valid_pixels[:out_rows*blk, :out_cols*blk]
+
+    window_valid = np.zeros((out_rows*blk, out_cols*blk), dtype='bool')
+    window_valid[:footprint.shape[0], :footprint.shape[1]] = footprint
+
+    return window_valid.reshape(out_rows, blk, out_cols, blk).any(axis=3).any(axis=1)
+
+
+def _is_empty(band, x_offset, y_offset, x_size, y_size, nodata):
+
+    """
+    Checks if a window of a sparse input has no blocks written
+
+    Empty blocks read as the band no-data value (or zero), so the
+    window is no-data without reading it.
+    """
+
+    try:
+        coverage_flags = band.GetDataCoverageStatus(x_offset, y_offset, x_size, y_size)[0]
+    except AttributeError:
+
+        # GDAL < 2.2
+        return False
+
+    if coverage_flags != gdal.GDAL_DATA_COVERAGE_STATUS_EMPTY:
+        return False
+
+    band_nodata = band.GetNoDataValue()
+
+    if nodata is None:
+        return (band_nodata is not None) and bool(band.GetMaskFlags() & gdal.GMF_NODATA)
+
+    return nodata == (0 if band_nodata is None else band_nodata)
+
+
+def _read_block_valid(band, x_offset, y_offset, x_size, y_size, blk, out_rows, out_cols, nodata):
+
+    """
+    Reads the output cells of a window that hold valid data
+
+    Whole blocks are read from the GDAL mask band with average resampling,
+    one value per output cell, so GDAL serves the read from the mask
+    overviews where they exist. An average above zero means the block
+    holds a valid pixel. The partial blocks on the window edge, and a
+    user no-data value, are read at full resolution.
+    """
+
+    if _is_empty(band, x_offset, y_offset, x_size, y_size, nodata):
+        return np.zeros((out_rows, out_cols), dtype='bool')
+
+    if nodata is not None:
+
+        return _get_block_any(band.ReadAsArray(x_offset, y_offset, x_size, y_size) != nodata,
+                              blk,
+                              out_rows,
+                              out_cols)
+
+    mask_band = band.GetMaskBand()
+
+    full_rows = min(out_rows, int(y_size / blk))
+    full_cols = min(out_cols, int(x_size / blk))
+
+    window_valid = np.zeros((out_rows, out_cols), dtype='bool')
+
+    if (full_rows > 0) and (full_cols > 0):
+
+        block_mean = mask_band.ReadAsArray(x_offset,
+                                           y_offset,
+                                           full_cols*blk,
+                                           full_rows*blk,
+                                           buf_xsize=full_cols,
+                                           buf_ysize=full_rows,
+                                           buf_type=gdal.GDT_Float32,
+                                           resample_alg=gdal.GRIORA_Average)
+
+        window_valid[:full_rows, :full_cols] = block_mean > 0
+
+    # The partial blocks on the bottom and right edges
+    if (full_rows < out_rows) and (y_size > full_rows*blk):
+
+        edge_valid = mask_band.ReadAsArray(x_offset, y_offset+full_rows*blk, x_size, y_size-full_rows*blk) > 0
+
+        window_valid[full_rows:] |= _get_block_any(edge_valid, blk, out_rows-full_rows, out_cols)
+
+    if (full_cols < out_cols) and (x_size > full_cols*blk):
+
+        edge_valid = mask_band.ReadAsArray(x_offset+full_cols*blk, y_offset, x_size-full_cols*blk, y_size) > 0
+
+        window_valid[:, full_cols:] |= _get_block_any(edge_valid, blk, out_rows, out_cols-full_cols)
+
+    return window_valid
+
+
+def get_window_mask(parameter_object, i_sect, j_sect, n_rows, n_cols, mask_bands=None):
+
+    """
+    Gets the mask of feature windows that hold valid data
+
+    An output window is valid if any pixel of its center block (the output
+    cell footprint) holds data in any of the mask bands. Without a user
+    no-data value, the GDAL mask band (the no-data value, alpha band or
+    dataset mask) of the input is used.
+
+    Args:
+        parameter_object (class)
+        i_sect (int)
+        j_sect (int)
+        n_rows (int)
+        n_cols (int)
+        mask_bands (Optional[list]): The bands used to build the mask.
+
+    Returns:
+        The window mask as a 2d uint8 array [output rows x output columns],
+            or None if every window is valid
+    """
+
+    if not mask_bands:
+        mask_bands = get_mask_bands(parameter_object)
+
+    nodata = parameter_object.nodata
+
+    blk = parameter_object.block
+    scale_block_diff = parameter_object.scales[-1] - blk
+    block_offset = sputilities.get_block_offset(parameter_object)
+
+    out_rows = len(range(0, n_rows-scale_block_diff, blk))
+    out_cols = len(range(0, n_cols-scale_block_diff, blk))
+
+    # The output cell footprints
+    x_offset = j_sect + block_offset
+    y_offset = i_sect + block_offset
+    x_size = max(0, min(n_cols-block_offset, out_cols*blk))
+    y_size = max(0, min(n_rows-block_offset, out_rows*blk))
+
+    ds = gdal.Open(parameter_object.input_image, gdal.GA_ReadOnly)
+
+    window_valid = np.zeros((out_rows, out_cols), dtype='bool')
+
+    for band_position in mask_bands:
+
+        band = ds.GetRasterBand(band_position)
+
+        mask_flags = band.GetMaskFlags()
+
+        if (nodata is None) and (mask_flags & gdal.GMF_ALL_VALID):
+
+            band = None
+            ds = None
+
+            return None
+
+        if (x_size > 0) and (y_size > 0):
+
+            window_valid |= _read_block_valid(band,
+                                              x_offset,
+                                              y_offset,
+                                              x_size,
+                                              y_size,
+                                              blk,
+                                              out_rows,
+                                              out_cols,
+                                              nodata)
+
+        band = None
+
+        # One mask is shared by all bands.
+        if (nodata is None) and (mask_flags & gdal.GMF_PER_DATASET):
+            break
+
+    ds = None
+
+    return np.uint8(window_valid)
+
+
+def get_section_coverage(image_info, parameter_object):
+
+    """
+    Scans the valid data mask of every section before processing
+
+    The window masks of partially covered sections are kept, so the
+    mask is read once per section rather than once per trigger and band.
+
+    Args:
+        image_info (`ropen` object)
+        parameter_object (class)
+
+    Returns:
+        A list of the valid window fraction for each section,
+            a list of the window mask (or None) for each section
+    """
+
+    logger.info('  Scanning the no-data mask ...')
+
+    mask_bands = get_mask_bands(parameter_object)
+
+    section_coverage = list()
+    section_masks = list()
+
+    for i_sect, j_sect in parameter_object.section_idx_pairs:
+
+        n_rows = raster_tools.n_rows_cols(i_sect,
+                                          parameter_object.sect_row_size,
+                                          image_info.rows)
+
+        n_cols = raster_tools.n_rows_cols(j_sect,
+                                          parameter_object.sect_col_size,
+                                          image_info.cols)
+
+        window_mask = get_window_mask(parameter_object,
+                                      i_sect,
+                                      j_sect,
+                                      n_rows,
+                                      n_cols,
+                                      mask_bands=mask_bands)
+
+        if not isinstance(window_mask, np.ndarray):
+
+            # The input has no mask, so there
+            #   is nothing left to scan.
+            return [1.] * len(parameter_object.section_idx_pairs), [None] * len(parameter_object.section_idx_pairs)
+
+        if window_mask.size == 0:
+            section_coverage.append(0.)
+        else:
+            section_coverage.append(float(window_mask.mean()))
+
+        section_masks.append(window_mask if 0 < section_coverage[-1] < 1 else None)
+
+    n_empty = len([sc for sc in section_coverage if sc == 0])
+
+    logger.info('  {:,d} of {:,d} sections are entirely no-data.'.format(n_empty,
+                                                                        len(section_coverage)))
+
+    return section_coverage, section_masks
@@ -0,0 +1,285 @@
+from __future__ import division
+
+from ..errors import logger
+from . import spstorage
+
+import numpy as np
+
+# GDAL
+try:
+    from osgeo import gdal
+except:
+
+    logger.error('GDAL must be installed')
+    raise ImportError
+
+
+# The neighbor copies, as (name, row step, column step), in band order.
+#   The copy of a direction holds the features of the adjacent output cell.
+NEIGHBOR_DIRECTIONS = [('north', -1, 0),
+                       ('south', 1, 0),
+                       ('east', 0, 1),
+                       ('west', 0, -1)]
+
+# The center features plus one copy per direction.
+N_COPIES = len(NEIGHBOR_DIRECTIONS) + 1
+
+
+def get_tile_bands(parameter_object, trigger):
+
+    """
+    Gets the number of tile bands of a trigger
+
+    The kernels compute `out_bands_dict[trigger]` features, which
+    are followed by the neighbor copies if `neighbors` is set.
+
+    Args:
+        parameter_object (class)
+        trigger (str)
+
+    Returns:
+        The band count of one band position
+    """
+
+    if parameter_object.neighbors:
+        return parameter_object.out_bands_dict[trigger] * N_COPIES
+
+    return parameter_object.out_bands_dict[trigger]
+
+
+def _get_shift_slices(size, step):
+
+    """
+    Gets the (destination, source) slices of a one-cell shift along an axis
+
+    Returns:
+        The destination slice, the source slice, the border index (or None)
+    """
+
+    if step < 0:
+        return slice(1, size), slice(0, size-1), 0
+    elif step > 0:
+        return slice(0, size-1), slice(1, size), size-1
+    else:
+        return slice(0, size), slice(0, size), None
+
+
+def add_neighbors(features):
+
+    """
+    Adds the neighbor copies to the features of a section
+
+    Each copy is a shifted copy of the section, so no kernel is re-run.
+    Cells on the section border repeat their own features until
+    `exchange_halos` fills them from the adjacent tiles.
+
+    Args:
+        features (3d array): The <features x rows x columns> section features.
+
+    Returns:
+        The <features * 5 x rows x columns> array, ordered as the
+            features, then the north, south, east and west copies
+    """
+
+    n_features, out_rows, out_cols = features.shape
+
+    neighbor_features = np.empty((n_features*N_COPIES, out_rows, out_cols), dtype=features.dtype)
+
+    neighbor_features[:n_features] = features
+
+    for direction_counter, (direction, row_step, col_step) in enumerate(NEIGHBOR_DIRECTIONS):
+
+        neighbor_copy = neighbor_features[n_features*(direction_counter+1):n_features*(direction_counter+2)]
+
+        dst_rows, src_rows, border_row = _get_shift_slices(out_rows, row_step)
+        dst_cols, src_cols, border_col = _get_shift_slices(out_cols, col_step)
+
+        neighbor_copy[:, dst_rows, dst_cols] = features[:, src_rows, src_cols]
+
+        # Repeat the border cells.
+        if border_row is not None:
+            neighbor_copy[:, border_row] = features[:, border_row]
+
+        if border_col is not None:
+            neighbor_copy[:, :, border_col] = features[:, :, border_col]
+
+    return neighbor_features
+
+
+def _read_values(band, x_offset, y_offset, x_size, y_size):
+
+    """Reads a band window as float64 features"""
+
+    band_scale = band.GetScale()
+    band_offset = band.GetOffset()
+
+    band_array = np.float64(band.ReadAsArray(x_offset, y_offset, x_size, y_size))
+
+    return band_array * (1. if band_scale is None else band_scale) + (0. if band_offset is None else band_offset)
+
+
+def _write_values(band, band_values, x_offset, y_offset, levels):
+
+    """Writes features to a band window in the band storage"""
+
+    if levels:
+
+        band_scale = band.GetScale()
+        band_offset = band.GetOffset()
+
+        band_scale = 1. if band_scale is None else band_scale
+        band_offset = 0. if band_offset is None else band_offset
+
+        # Every tile shares the band range.
+        band_values = np.clip(np.round((band_values - band_offset) / band_scale), 0, levels)
+
+    band.WriteArray(band_values, x_offset, y_offset)
+
+
+def _get_halo_window(tile, halo_tile, row_step, col_step, block):
+
+    """
+    Gets the border window of a tile and the matching window of the adjacent tile
+
+    Args:
+        tile (dict): The tile `image`, `i_sect`, `j_sect`, `rows` and `cols`.
+        halo_tile (dict): The adjacent tile.
+        row_step (int)
+        col_step (int)
+        block (int)
+
+    Returns:
+        The tile window and the adjacent tile window, as (x offset, y offset, x size, y size),
+            or None if the output cells do not line up
+    """
+
+    row_diff = tile['i_sect'] - halo_tile['i_sect']
+    col_diff = tile['j_sect'] - halo_tile['j_sect']
+
+    if (row_diff % block != 0) or (col_diff % block != 0):
+        return None
+
+    if row_step != 0:
+
+        tile_row = 0 if row_step < 0 else tile['rows'] - 1
+
+        # The adjacent cell row in the adjacent tile.
+        halo_row = int(row_diff / block) + tile_row + row_step
+
+        n_cols = min(tile['cols'], halo_tile['cols'])
+
+        if (halo_row < 0) or (halo_row >= halo_tile['rows']) or (col_diff != 0):
+            return None
+
+        return (0, tile_row, n_cols, 1), (0, halo_row, n_cols, 1)
+
+    tile_col = 0 if col_step < 0 else tile['cols'] - 1
+
+    halo_col = int(col_diff / block) + tile_col + col_step
+
+    n_rows = min(tile['rows'], halo_tile['rows'])
+
+    if (halo_col < 0) or (halo_col >= halo_tile['cols']) or (row_diff != 0):
+        return None
+
+    return (tile_col, 0, 1, n_rows), (halo_col, 0, 1, n_rows)
+
+
+def exchange_halos(parameter_object, trigger, start_band, tile_list):
+
+    """
+    Fills the border cells of the neighbor copies from the adjacent tiles
+
+    Sections are processed independently, so the neighbors of the border
+    cells are in the adjacent tiles. One row (or column) of the center
+    features is read from each adjacent tile and written to the border
+    of the matching copy.
+
+    Args:
+        parameter_object (class)
+        trigger (str)
+        start_band (int): The first tile band of the trigger and band position.
+        tile_list (list): The tile `image`, `i_sect` and `j_sect` of each section counter, or None
+            for sections without a tile.
+    """
+
+    n_features = parameter_object.out_bands_dict[trigger]
+
+    levels = spstorage.get_storage_levels(spstorage.get_trigger_storage(parameter_object, trigger),
+                                          spstorage.get_tile_storage(parameter_object))
+
+    # Get the output dimensions of each tile.
+    for tile in tile_list:
+
+        if tile:
+
+            ds = gdal.Open(tile['image'], gdal.GA_ReadOnly)
+
+            tile.update(rows=ds.RasterYSize,
+                        cols=ds.RasterXSize)
+
+            ds = None
+
+    n_exchanged = 0
+
+    for tile_index, tile in enumerate(tile_list):
+
+        if not tile:
+            continue
+
+        row_index, col_index = divmod(tile_index, parameter_object.n_col_sects)
+
+        ds = None
+        patched_bands = list()
+
+        for direction_counter, (direction, row_step, col_step) in enumerate(NEIGHBOR_DIRECTIONS):
+
+            halo_row_index = row_index + row_step
+            halo_col_index = col_index + col_step
+
+            if (halo_row_index < 0) or (halo_row_index >= parameter_object.n_row_sects) or \
+                    (halo_col_index < 0) or (halo_col_index >= parameter_object.n_col_sects):
+
+                continue
+
+            halo_tile = tile_list[halo_row_index*parameter_object.n_col_sects+halo_col_index]
+
+            if not halo_tile:
+                continue
+
+            halo_windows = _get_halo_window(tile, halo_tile, row_step, col_step, parameter_object.block)
+
+            if not halo_windows:
+                continue
+
+            tile_window, halo_window = halo_windows
+
+            if ds is None:
+                ds = gdal.Open(tile['image'], gdal.GA_Update)
+
+            halo_ds = gdal.Open(halo_tile['image'], gdal.GA_ReadOnly)
+
+            for feature_index in range(0, n_features):
+
+                copy_band = start_band + n_features*(direction_counter+1) + feature_index
+
+                halo_values = _read_values(halo_ds.GetRasterBand(start_band+feature_index), *halo_window)
+
+                _write_values(ds.GetRasterBand(copy_band),
+                              halo_values,
+                              tile_window[0],
+                              tile_window[1],
+                              levels)
+
+                patched_bands.append(copy_band)
+
+            halo_ds = None
+
+            n_exchanged += 1
+
+        ds = None
+
+        if parameter_object.overviews and patched_bands:
+            spstorage.update_overviews(tile['image'], patched_bands)
+
+    logger.info('  Exchanged {:,d} {} neighbor borders ...'.format(n_exchanged, trigger))
@@ -0,0 +1,221 @@
+from __future__ import division
+from future.utils import viewitems
+
+import os
+import shutil
+import pstats
+import cProfile
+
+from ..errors import logger
+
+
+# Call paths below this time (seconds) are not expanded.
+MIN_PATH_TIME = 1e-6
+
+# The deepest collapsed stack.
+MAX_STACK_DEPTH = 64
+
+
+def get_profile_dir(parameter_object):
+
+    """Gets the directory of the per-section profiles"""
+
+    return os.path.join(parameter_object.output_dir, '{}_profiles'.format(parameter_object.f_base))
+
+
+def get_profile_files(parameter_object):
+
+    """
+    Gets the combined profile files, next to the log
+
+    Returns:
+        The pstats file, the collapsed stack file
+    """
+
+    profile_base = os.path.join(parameter_object.output_dir, '{}_profile'.format(parameter_object.f_base))
+
+    return '{}.prof'.format(profile_base), '{}_collapsed.txt'.format(profile_base)
+
+
+def setup_profiles(parameter_object):
+
+    """
+    Clears the per-section profiles of an earlier run
+
+    Args:
+        parameter_object (class)
+    """
+
+    profile_dir = get_profile_dir(parameter_object)
+
+    if os.path.isdir(profile_dir):
+        shutil.rmtree(profile_dir)
+
+    os.makedirs(profile_dir)
+
+
+def is_profiled(parameter_object):
+
+    """
+    Checks whether the current trigger and section are profiled
+
+    Args:
+        parameter_object (class)
+    """
+
+    if not parameter_object.profile:
+        return False
+
+    if parameter_object.profile_triggers and (parameter_object.trigger not in parameter_object.profile_triggers):
+        return False
+
+    if parameter_object.profile_sections and \
+            (parameter_object.section_counter not in parameter_object.profile_sections):
+
+        return False
+
+    return True
+
+
+def profile_call(parameter_object, func2profile, *args):
+
+    """
+    Calls a function under the deterministic profiler and saves the profile
+
+    Args:
+        parameter_object (class)
+        func2profile (function)
+        args (tuple): The function arguments.
+
+    Returns:
+        The function result
+    """
+
+    profiler = cProfile.Profile()
+
+    result = profiler.runcall(func2profile, *args)
+
+    profile_file = os.path.join(get_profile_dir(parameter_object),
+                                '{}_BD{}_TL{:06d}_{:d}.prof'.format(parameter_object.trigger,
+                                                                     parameter_object.band_position,
+                                                                     parameter_object.section_counter,
+                                                                     os.getpid()))
+
+    profiler.dump_stats(profile_file)
+
+    return result
+
+
+def _get_label(func):
+
+    file_name, line_number, func_name = func
+
+    if line_number == 0:
+        return func_name
+
+    return '{} ({}:{:d})'.format(func_name, os.path.basename(file_name), line_number)
+
+
+def get_collapsed_stacks(profile_stats):
+
+    """
+    Gets flame graph stacks from profile statistics
+
+    The deterministic profiler only records caller-callee pairs, so the
+    time of each function is split across its call paths in proportion
+    to the time spent in it from each caller.
+
+    Args:
+        profile_stats (`pstats.Stats` object)
+
+    Returns:
+        A dictionary of self times (seconds), keyed by the ;-joined call stack
+    """
+
+    callees = dict()
+
+    for func, func_stats in viewitems(profile_stats.stats):
+
+        for caller, caller_stats in viewitems(func_stats[4]):
+            callees.setdefault(caller, list()).append((func, caller_stats[3]))
+
+    collapsed_stacks = dict()
+
+    def _walk(func, stack, path_time):
+
+        func_self_time, func_total_time = profile_stats.stats[func][2:4]
+
+        path_share = path_time / func_total_time if func_total_time > 0 else 0.
+
+        stack = stack + [_get_label(func)]
+
+        stack_key = ';'.join(stack)
+        collapsed_stacks[stack_key] = collapsed_stacks.get(stack_key, 0.) + func_self_time * path_share
+
+        if len(stack) >= MAX_STACK_DEPTH:
+            return
+
+        for callee, callee_time in callees.get(func, list()):
+
+            # Recursive calls are folded into the caller.
+            if _get_label(callee) in stack:
+                continue
+
+            if callee_time * path_share < MIN_PATH_TIME:
+                continue
+
+            _walk(callee, stack, callee_time * path_share)
+
+    for func, func_stats in viewitems(profile_stats.stats):
+
+        if not func_stats[4]:
+            _walk(func, list(), func_stats[3])
+
+    return collapsed_stacks
+
+
+def merge_profiles(parameter_object):
+
+    """
+    Merges the per-section profiles of all workers
+
+    A combined pstats file and a collapsed stack file (one
+    `stack microseconds` line per call stack, the input format
+    of flamegraph.pl and speedscope) are written next to the log.
+
+    Args:
+        parameter_object (class)
+    """
+
+    profile_dir = get_profile_dir(parameter_object)
+
+    if not os.path.isdir(profile_dir):
+        return
+
+    profile_list = [os.path.join(profile_dir, profile_name)
+                    for profile_name in sorted(os.listdir(profile_dir))
+                    if profile_name.endswith('.prof')]
+
+    if not profile_list:
+
+        logger.warning('  No sections were profiled.')
+        return
+
+    stats_file, collapsed_file = get_profile_files(parameter_object)
+
+    profile_stats = pstats.Stats(*profile_list)
+
+    profile_stats.dump_stats(stats_file)
+
+    collapsed_stacks = get_collapsed_stacks(profile_stats)
+
+    with open(collapsed_file, 'w') as cf:
+
+        for stack_key, stack_time in sorted(viewitems(collapsed_stacks)):
+
+            stack_microseconds = int(round(stack_time * 1000000))
+
+            if stack_microseconds > 0:
+                cf.write('{} {:d}\n'.format(stack_key, stack_microseconds))
+
+    logger.info('  Merged {:,d} section profiles into {} and {}'.format(len(profile_list), stats_file, collapsed_file))
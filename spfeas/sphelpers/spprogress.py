@@ -0,0 +1,201 @@
+from __future__ import division
+from future.utils import viewitems
+
+import os
+import time
+import json
+import datetime
+
+from ..errors import logger
+
+
+class ProgressMonitor(object):
+
+    """
+    A class to aggregate section completions into progress metrics
+
+    Completions are reported by the dispatching process as workers return
+    them. The metrics are logged and, if `metrics_file` is given, written
+    every `refresh_interval` seconds. Files ending in .prom are written in
+    the Prometheus text format (for a node exporter textfile collector),
+    and other files are written as JSON.
+
+    Args:
+        n_workers (int): The number of parallel workers.
+        metrics_file (Optional[str]): The metrics file to refresh.
+        refresh_interval (Optional[float]): The time (seconds) between refreshes.
+        label (Optional[str]): The run label, such as the input image.
+    """
+
+    def __init__(self, n_workers, metrics_file=None, refresh_interval=10., label=None):
+
+        self.n_workers = max(1, n_workers)
+        self.metrics_file = metrics_file
+        self.refresh_interval = refresh_interval
+        self.label = label
+
+        self.start_time = time.time()
+        self.last_refresh = self.start_time
+
+        self.n_total = 0
+        self.n_done = 0
+        self.n_corrupt = 0
+
+        # The estimated compute seconds of the
+        #   queued and the finished sections.
+        self.remaining_cost = 0.
+        self.finished_cost = 0.
+
+        # The measured worker compute seconds.
+        self.busy_seconds = 0.
+
+        self.trigger_pixels = dict()
+
+    def add_sections(self, section_costs):
+
+        """
+        Adds queued sections
+
+        Args:
+            section_costs (list): The estimated compute seconds of each section.
+        """
+
+        self.n_total += len(section_costs)
+        self.remaining_cost += sum(section_costs)
+
+    def update(self, trigger, section_result, estimated_seconds):
+
+        """
+        Records a finished section
+
+        Args:
+            trigger (str)
+            section_result (`SectionResult`)
+            estimated_seconds (float)
+        """
+
+        self.n_done += 1
+
+        if section_result.is_corrupt:
+            self.n_corrupt += 1
+
+        self.remaining_cost = max(0., self.remaining_cost - estimated_seconds)
+        self.finished_cost += estimated_seconds
+
+        if section_result.seconds is not None:
+            self.busy_seconds += section_result.seconds
+
+        self.trigger_pixels[trigger] = self.trigger_pixels.get(trigger, 0) + section_result.out_pixels
+
+        if time.time() - self.last_refresh >= self.refresh_interval:
+            self.refresh()
+
+    def get_metrics(self):
+
+        """
+        Gets the current metrics
+
+        Returns:
+            The metrics as a dictionary
+        """
+
+        elapsed = max(time.time() - self.start_time, 1e-6)
+
+        # The remaining estimated cost is converted to time
+        #   at the rate the finished estimated cost was processed.
+        if self.finished_cost > 0:
+            eta_seconds = self.remaining_cost * elapsed / self.finished_cost
+        elif self.n_total > self.n_done:
+            eta_seconds = self.remaining_cost / self.n_workers
+        else:
+            eta_seconds = 0.
+
+        return dict(label=self.label,
+                    updated=datetime.datetime.now().isoformat(),
+                    elapsed_seconds=round(elapsed, 2),
+                    sections_total=self.n_total,
+                    sections_done=self.n_done,
+                    sections_corrupt=self.n_corrupt,
+                    sections_per_second=round(self.n_done / elapsed, 4),
+                    output_pixels_per_second=dict([(trigger, round(n_pixels / elapsed, 2))
+                                                   for trigger, n_pixels in viewitems(self.trigger_pixels)]),
+                    worker_utilization=round(min(1., self.busy_seconds / (elapsed * self.n_workers)), 4),
+                    remaining_estimated_seconds=round(self.remaining_cost, 2),
+                    eta_seconds=round(eta_seconds, 2))
+
+    def refresh(self):
+
+        """Logs the progress and rewrites the metrics file"""
+
+        self.last_refresh = time.time()
+
+        metrics = self.get_metrics()
+
+        logger.info('  Progress: {:,d} of {:,d} sections, {:.2f} sections/s, {:.0%} worker utilization, ETA {}'.format(metrics['sections_done'],
+                                                                                                                   metrics['sections_total'],
+                                                                                                                   metrics['sections_per_second'],
+                                                                                                                   metrics['worker_utilization'],
+                                                                                                                   datetime.timedelta(seconds=int(metrics['eta_seconds']))))
+
+        if self.metrics_file:
+            self._write_metrics(metrics)
+
+    def _write_metrics(self, metrics):
+
+        if self.metrics_file.endswith('.prom'):
+            metrics_text = _format_prometheus(metrics)
+        else:
+            metrics_text = json.dumps(metrics, indent=2, sort_keys=True)
+
+        # Write to a temporary file first so a
+        #   scraper never reads a partial file.
+        temp_file = '{}.{:d}.tmp'.format(self.metrics_file, os.getpid())
+
+        try:
+
+            with open(temp_file, 'w') as mf:
+                mf.write(metrics_text)
+
+            os.rename(temp_file, self.metrics_file)
+
+        except (IOError, OSError):
+            logger.warning('  Could not write the metrics file, {}.'.format(self.metrics_file))
+
+
+def _format_prometheus(metrics):
+
+    """Formats metrics in the Prometheus text format"""
+
+    if metrics['label']:
+        label_value = metrics['label'].replace('\\', '\\\\').replace('"', '\\"')
+    else:
+        label_value = None
+
+    label = '{{label="{}"}}'.format(label_value) if label_value else ''
+
+    metric_lines = list()
+
+    for metric_name in ['elapsed_seconds',
+                        'sections_total',
+                        'sections_done',
+                        'sections_corrupt',
+                        'sections_per_second',
+                        'worker_utilization',
+                        'remaining_estimated_seconds',
+                        'eta_seconds']:
+
+        metric_lines.append('# TYPE spfeas_{} gauge'.format(metric_name))
+        metric_lines.append('spfeas_{}{} {}'.format(metric_name, label, metrics[metric_name]))
+
+    metric_lines.append('# TYPE spfeas_output_pixels_per_second gauge')
+
+    for trigger, pixel_rate in sorted(viewitems(metrics['output_pixels_per_second'])):
+
+        if label_value:
+            trigger_label = '{{label="{}",trigger="{}"}}'.format(label_value, trigger)
+        else:
+            trigger_label = '{{trigger="{}"}}'.format(trigger)
+
+        metric_lines.append('spfeas_output_pixels_per_second{} {}'.format(trigger_label, pixel_rate))
+
+    return '\n'.join(metric_lines) + '\n'
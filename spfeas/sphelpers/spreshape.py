@@ -6,6 +6,7 @@ Date Created: 7/2/2013
 from __future__ import division
 
 from ..errors import logger
+from .spindices import get_section_triggers
 
 try:
     import numpy as np
@@ -18,27 +19,41 @@ def reshape_feature_list(features2reshape, out_rows, out_cols, parameter_object)
     """
     Reshapes a feature statistic list
 
+    The compiled kernels write directly into a C-contiguous
+    <features x rows x columns> array, which is returned without a copy.
+    Window-major feature lists (from the Python kernels) are
+    reshaped with a single copy.
+
     Args:
-        features2reshape (1d array)
+        features2reshape (1d or 3d array)
         out_rows (int)
         out_cols (int)
         parameter_object (class object)
     """
 
-    logger.info('  Reshaping features ...')
+    # The number of dimensions for the current
+    #   feature (or the fused spectral indices).
+    out_dims = sum([parameter_object.out_bands_dict[trigger] for trigger in get_section_triggers(parameter_object)])
 
-    # The number of dimensions
-    #   for the current feature.
-    out_dims = parameter_object.out_bands_dict[parameter_object.trigger]
+    if isinstance(features2reshape, np.ndarray) and (features2reshape.ndim == 3):
 
-    # The output section array.
-    out_sect_array = np.empty((out_dims, out_rows, out_cols), dtype='float32')
+        if features2reshape.shape != (out_dims, out_rows, out_cols):
 
-    # Reshape each feature vector.
-    for bd2wr in range(0, out_dims):
-        out_sect_array[bd2wr, :, :] = np.asarray(features2reshape[bd2wr::out_dims]).reshape(out_rows, out_cols)
+            logger.error('  The feature array shape, {}, does not match the section shape, {}.'.format(features2reshape.shape,
+                                                                                                     (out_dims,
+                                                                                                      out_rows,
+                                                                                                      out_cols)))
+            raise ValueError
 
-    return out_sect_array
+        return np.ascontiguousarray(features2reshape, dtype='float32')
+
+    logger.info('  Reshaping features ...')
+
+    # The window-major list is [rows x columns x features].
+    return np.ascontiguousarray(np.asarray(features2reshape,
+                                           dtype='float32').reshape(out_rows,
+                                                                    out_cols,
+                                                                    out_dims).transpose(2, 0, 1))
 
 
 def chunks2section(trigger, tk, o_r, o_c, l_rows, l_cols, out_rows, out_cols, parameter_object):
@@ -133,43 +148,6 @@ def chunks2section(trigger, tk, o_r, o_c, l_rows, l_cols, out_rows, out_cols, pa
 
         i_sect_idx += rw
 
-    # get feature neighbors
-    # this adds the four direct neighbors to the same feature vector
-    if parameter_object.neighbors:
-
-        # create the new output array
-        # the dimensions are multiplied x5 (1 for each direct neighbor plus the center)
-        out_sect_arr_temp = np.empty((out_dims*5, out_rows, out_cols), dtype='float32')
-
-        out_dim_ctr = 0
-        for dim in range(0, out_dims):
-
-            curr_dim = out_sect_arr[dim]
-
-            # the first feature is the original feature
-            out_sect_arr_temp[out_dim_ctr] = curr_dim
-
-            # pad by one pixel on each edge
-            curr_dim = np.pad(curr_dim, ((1, 1), (1, 1)), 'edge')
-
-            ## get the neighbors
-            # top neighbor
-            out_sect_arr_temp[out_dim_ctr+1] = np.roll(curr_dim, 1, axis=0)[1:out_rows+1, 1:out_cols+1]
-
-            # left neighbor
-            out_sect_arr_temp[out_dim_ctr+2] = np.roll(curr_dim, 1, axis=1)[1:out_rows+1, 1:out_cols+1]
-
-            # right neighbor
-            out_sect_arr_temp[out_dim_ctr+3] = np.roll(curr_dim, -1, axis=1)[1:out_rows+1, 1:out_cols+1]
-
-            # bottom neighbor
-            out_sect_arr_temp[out_dim_ctr+4] = np.roll(curr_dim, -1, axis=0)[1:out_rows+1, 1:out_cols+1]
-
-            out_dim_ctr += 5
-
-        out_sect_arr = np.copy(out_sect_arr_temp)
-        del out_sect_arr_temp
-
     out_sect_arr[np.isnan(out_sect_arr) | np.isinf(out_sect_arr)] = 0.
 
     return out_sect_arr
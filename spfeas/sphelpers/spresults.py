@@ -0,0 +1,536 @@
+from __future__ import division
+
+import os
+import shutil
+import hashlib
+
+from ..errors import logger
+from . import sputilities
+from . import spneighbors
+
+from mpglue import raster_tools
+
+import numpy as np
+
+# GDAL
+try:
+    from osgeo import gdal
+except:
+
+    logger.error('GDAL must be installed')
+    raise ImportError
+
+
+# The parameters, other than the block and scales,
+#   that change the features of each trigger.
+TRIGGER_PARAMS = dict(hough=['hline_threshold', 'hline_min', 'hline_gap'],
+                      lac=['lac_r'],
+                      pantex=['weight'],
+                      saliency=['vis_order'],
+                      sfs=['sfs_threshold', 'sfs_skip'])
+
+# The parameters that change the input of every trigger.
+SHARED_PARAMS = ['use_rgb',
+                 'sat_sensor',
+                 'image_min',
+                 'image_max',
+                 'equalize',
+                 'equalize_adapt',
+                 'smooth',
+                 'global_stats',
+                 'skip_nodata',
+                 'nodata',
+                 'neighbors']
+
+
+def get_trigger_params(parameter_object, trigger):
+
+    """
+    Gets the parameters that change the features of a trigger
+
+    Args:
+        parameter_object (class)
+        trigger (str)
+
+    Returns:
+        A sorted list of (name, value) pairs
+    """
+
+    param_names = SHARED_PARAMS + TRIGGER_PARAMS.get(trigger, list())
+
+    trigger_params = [(param_name, getattr(parameter_object, param_name, None)) for param_name in param_names]
+
+    # Approximated scales are stored apart from exact scales.
+    approx = getattr(parameter_object, 'approx', None)
+
+    if approx and (trigger in approx):
+        trigger_params.append(('approx', (approx[trigger], parameter_object.approx_factor)))
+
+    return sorted(trigger_params)
+
+
+class ResultStore(object):
+
+    """
+    A class to store computed section features
+
+    Features are stored as float32 .npy files, one file per section
+    checksum (the input pixels of the section), trigger, band, block, scales
+    and trigger parameter set, so that a run with a new trigger list only
+    computes the missing pieces.
+
+    Args:
+        store_dir (str): The store directory.
+    """
+
+    def __init__(self, store_dir):
+
+        self.store_dir = store_dir
+
+    def get_key(self, parameter_object, section_hash, i_sect, j_sect, n_rows, n_cols):
+
+        """
+        Gets the store key of a section for the current trigger and band
+
+        The key holds the content checksum of the section, so a stored
+        section is only reused while its input pixels are unchanged.
+
+        Args:
+            parameter_object (class)
+            section_hash (str): The section checksum from `hash_section`.
+            i_sect (int)
+            j_sect (int)
+            n_rows (int)
+            n_cols (int)
+
+        Returns:
+            The store key as a relative file name
+        """
+
+        band_key = 'rgb' if parameter_object.use_rgb else parameter_object.band_position
+
+        key_items = (section_hash,
+                     parameter_object.trigger,
+                     band_key,
+                     parameter_object.block,
+                     list(parameter_object.scales),
+                     get_trigger_params(parameter_object, parameter_object.trigger),
+                     i_sect,
+                     j_sect,
+                     n_rows,
+                     n_cols)
+
+        section_key = hashlib.md5(repr(key_items).encode('utf-8')).hexdigest()
+
+        return os.path.join('{}_BD{}'.format(parameter_object.trigger, band_key),
+                            '{}.npy'.format(section_key))
+
+    def get(self, key):
+
+        """
+        Loads stored features
+
+        Args:
+            key (str)
+
+        Returns:
+            The features as a 3d array, or None if the section is not stored
+        """
+
+        store_file = os.path.join(self.store_dir, key)
+
+        if not os.path.isfile(store_file):
+            return None
+
+        try:
+            return np.load(store_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def put(self, key, features):
+
+        """
+        Stores features
+
+        Args:
+            key (str)
+            features (3d array)
+        """
+
+        store_file = os.path.join(self.store_dir, key)
+
+        if os.path.isfile(store_file):
+            return
+
+        store_sub_dir = os.path.dirname(store_file)
+
+        if not os.path.isdir(store_sub_dir):
+
+            try:
+                os.makedirs(store_sub_dir)
+            except OSError:
+                pass
+
+        # Write to a temporary file first so other
+        #   workers never load a partial file.
+        temp_file = '{}_{:d}.tmp'.format(store_file, os.getpid())
+
+        try:
+
+            with open(temp_file, 'wb') as sf:
+                np.save(sf, np.ascontiguousarray(features, dtype='float32'))
+
+            os.rename(temp_file, store_file)
+
+        except (IOError, OSError):
+
+            logger.warning('  Could not write to the result store.')
+
+            if os.path.isfile(temp_file):
+                os.remove(temp_file)
+
+
+def hash_section(image_info, i_sect, j_sect, n_rows, n_cols):
+
+    """
+    Gets the content checksum of a section window
+
+    The window includes the section overlap (the halo), so
+    any change that reaches a section's features changes its checksum.
+
+    Args:
+        image_info (`ropen` object)
+        i_sect (int)
+        j_sect (int)
+        n_rows (int)
+        n_cols (int)
+
+    Returns:
+        The checksum as a hex string
+    """
+
+    section_hash = hashlib.md5()
+
+    for band_position in range(1, image_info.bands+1):
+
+        band_array = image_info.read(bands2open=band_position,
+                                     i=i_sect,
+                                     j=j_sect,
+                                     rows=n_rows,
+                                     cols=n_cols)
+
+        section_hash.update(np.ascontiguousarray(band_array).tobytes())
+
+    return section_hash.hexdigest()
+
+
+def get_section_hashes(image_info, parameter_object):
+
+    """
+    Gets the content checksum of every section
+
+    Args:
+        image_info (`ropen` object)
+        parameter_object (class)
+
+    Returns:
+        A dictionary of checksums, keyed by the tile name
+    """
+
+    logger.info('  Hashing the input sections ...')
+
+    section_hashes = dict()
+
+    for section_counter, section_pair in enumerate(parameter_object.section_idx_pairs):
+
+        i_sect, j_sect = section_pair
+
+        n_rows = raster_tools.n_rows_cols(i_sect,
+                                          parameter_object.sect_row_size,
+                                          image_info.rows)
+
+        n_cols = raster_tools.n_rows_cols(j_sect,
+                                          parameter_object.sect_col_size,
+                                          image_info.cols)
+
+        section_hashes['TL{:06}'.format(section_counter+1)] = hash_section(image_info,
+                                                                           i_sect,
+                                                                           j_sect,
+                                                                           n_rows,
+                                                                           n_cols)
+
+    return section_hashes
+
+
+def get_changed_sections(status_dict, section_hashes, n_sects):
+
+    """
+    Compares the section checksums with those of the last run
+
+    The checksums are stored in the status dictionary, along with the
+    changed sections, which are kept until the update finishes.
+
+    Args:
+        status_dict (dict): The status dictionary, updated in place.
+        section_hashes (dict): The checksums from `get_section_hashes`.
+        n_sects (int): The number of sections.
+
+    Returns:
+        A list of the changed section counters, or None if the
+            previous checksums are unknown (every section is processed)
+    """
+
+    previous_hashes = status_dict.get('SECTION_HASHES', None)
+
+    status_dict['SECTION_HASHES'] = section_hashes
+
+    if not isinstance(previous_hashes, dict):
+        return None
+
+    changed_sections = [sect_counter for sect_counter in range(1, n_sects+1)
+                        if previous_hashes.get('TL{:06}'.format(sect_counter), None) !=
+                        section_hashes['TL{:06}'.format(sect_counter)]]
+
+    # Keep the changed sections of an unfinished update.
+    changed_sections = sorted(set(changed_sections).union(status_dict.get('UPDATE_SECTIONS', list())))
+
+    status_dict['UPDATE_SECTIONS'] = changed_sections
+
+    if changed_sections:
+        status_dict['ALL_FINISHED'] = 'no'
+
+    return changed_sections
+
+
+def get_band_layout(parameter_object):
+
+    """
+    Gets the band layout of the output tiles
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        A dictionary of the triggers, band positions, block and scales, and
+            the first band (0-based), the bands of each band position and the
+            features of each trigger
+    """
+
+    return dict(triggers=list(parameter_object.triggers),
+                band_positions=list(parameter_object.band_positions),
+                block=parameter_object.block,
+                scales=list(parameter_object.scales),
+                bands=dict([(trigger, dict(start=int(parameter_object.band_info[trigger]),
+                                           tile_bands=int(spneighbors.get_tile_bands(parameter_object, trigger)),
+                                           features=int(parameter_object.out_bands_dict[trigger])))
+                            for trigger in parameter_object.triggers]))
+
+
+def archive_tiles(parameter_object, status_dict):
+
+    """
+    Moves the finished tiles of a previous section size to a legacy directory
+
+    Unfinished tiles are removed. The footprint of each finished tile, in
+    input pixels, is recorded in the status dictionary under `LEGACY_TILES`,
+    and the band layout of the tiles (`BAND_LAYOUT`) under `LEGACY_LAYOUTS`.
+
+    Args:
+        parameter_object (class)
+        status_dict (dict): The status dictionary, updated in place.
+    """
+
+    legacy_name = 'legacy_SS{:d}'.format(int(status_dict['SECTION_SIZE']))
+    legacy_dir = os.path.join(parameter_object.feas_dir, legacy_name)
+
+    # Tiles without a recorded layout cannot be read back.
+    band_layout = status_dict.get('BAND_LAYOUT', None)
+
+    if band_layout:
+        status_dict.setdefault('LEGACY_LAYOUTS', dict())[legacy_name] = band_layout
+    else:
+        logger.warning('  The band layout of the finished tiles was not recorded, so they will not be reused.')
+
+    if not os.path.isdir(legacy_dir):
+        os.makedirs(legacy_dir)
+
+    tile_files = dict([(os.path.splitext(tile_name)[0], os.path.join(parameter_object.feas_dir, tile_name))
+                       for tile_name in os.listdir(parameter_object.feas_dir)
+                       if os.path.isfile(os.path.join(parameter_object.feas_dir, tile_name))])
+
+    ds = gdal.Open(parameter_object.input_image, gdal.GA_ReadOnly)
+    input_transform = ds.GetGeoTransform()
+    ds = None
+
+    legacy_tiles = status_dict.get('LEGACY_TILES', list())
+
+    for tile_base in [status_key for status_key in list(status_dict) if '__TL' in status_key]:
+
+        tile_status = status_dict.pop(tile_base)
+
+        if tile_base not in tile_files:
+            continue
+
+        if not isinstance(tile_status, dict) or not tile_status or \
+                [vs for vs in tile_status.values() if vs != 'complete']:
+
+            os.remove(tile_files[tile_base])
+            continue
+
+        legacy_tile = os.path.join(legacy_dir, os.path.basename(tile_files[tile_base]))
+
+        shutil.move(tile_files[tile_base], legacy_tile)
+
+        ds = gdal.Open(legacy_tile, gdal.GA_ReadOnly)
+
+        tile_transform = ds.GetGeoTransform()
+
+        legacy_tiles.append(dict(tile=legacy_tile,
+                                 layout=legacy_name if band_layout else None,
+                                 row=int(round((input_transform[3] - tile_transform[3]) / abs(input_transform[5]))),
+                                 col=int(round((tile_transform[0] - input_transform[0]) / abs(input_transform[1]))),
+                                 rows=ds.RasterYSize,
+                                 cols=ds.RasterXSize))
+
+        ds = None
+
+    logger.info('  {:,d} finished tiles were moved to {}.'.format(len(legacy_tiles), legacy_dir))
+
+    status_dict['LEGACY_TILES'] = legacy_tiles
+    status_dict['SECTION_SIZE'] = parameter_object.section_size
+    status_dict['BAND_LAYOUT'] = get_band_layout(parameter_object)
+
+
+def get_legacy_start_band(parameter_object, band_layout):
+
+    """
+    Gets the first band of the current trigger and band position in a legacy tile
+
+    Args:
+        parameter_object (class)
+        band_layout (dict): The band layout of the legacy tile, from `get_band_layout`.
+
+    Returns:
+        The first band (1-based), or None if the tile does not hold the features
+    """
+
+    if not band_layout:
+        return None
+
+    # The output grid and the features must be unchanged.
+    if (band_layout['block'] != parameter_object.block) or (list(band_layout['scales']) != list(parameter_object.scales)):
+        return None
+
+    trigger_layout = band_layout['bands'].get(parameter_object.trigger, None)
+
+    if not trigger_layout or (trigger_layout['features'] != parameter_object.out_bands_dict[parameter_object.trigger]):
+        return None
+
+    if parameter_object.band_position not in band_layout['band_positions']:
+        return None
+
+    position_index = band_layout['band_positions'].index(parameter_object.band_position)
+
+    return trigger_layout['start'] + position_index * trigger_layout['tile_bands'] + 1
+
+
+def read_legacy_features(parameter_object, i_sect, j_sect, n_rows, n_cols):
+
+    """
+    Reads the features of a section from the tiles of a previous section size
+
+    The bands are found from the band layout of each legacy tile, so that
+    tiles are only read if they hold the current trigger and band position.
+
+    Args:
+        parameter_object (class)
+        i_sect (int)
+        j_sect (int)
+        n_rows (int)
+        n_cols (int)
+
+    Returns:
+        The features as a 3d array, or None if the
+            legacy tiles do not cover the entire section
+    """
+
+    if not parameter_object.legacy_tiles:
+        return None
+
+    blk = parameter_object.block
+    scale_block_diff = parameter_object.scales[-1] - blk
+    block_offset = sputilities.get_block_offset(parameter_object)
+
+    # The section output footprint, in input pixels.
+    row_origin = i_sect + block_offset
+    col_origin = j_sect + block_offset
+
+    out_rows = len(range(0, n_rows-scale_block_diff, blk))
+    out_cols = len(range(0, n_cols-scale_block_diff, blk))
+
+    covered = np.zeros((out_rows, out_cols), dtype='bool')
+
+    tile_windows = list()
+
+    legacy_layouts = getattr(parameter_object, 'legacy_layouts', None) or dict()
+
+    for legacy_tile in parameter_object.legacy_tiles:
+
+        start_band = get_legacy_start_band(parameter_object, legacy_layouts.get(legacy_tile.get('layout', None), None))
+
+        if start_band is None:
+            continue
+
+        row_diff = legacy_tile['row'] - row_origin
+        col_diff = legacy_tile['col'] - col_origin
+
+        # The output cells must line up.
+        if (row_diff % blk != 0) or (col_diff % blk != 0):
+            continue
+
+        row_offset = row_diff // blk
+        col_offset = col_diff // blk
+
+        row_start = max(0, row_offset)
+        row_end = min(out_rows, row_offset + legacy_tile['rows'])
+        col_start = max(0, col_offset)
+        col_end = min(out_cols, col_offset + legacy_tile['cols'])
+
+        if (row_start >= row_end) or (col_start >= col_end):
+            continue
+
+        covered[row_start:row_end, col_start:col_end] = True
+
+        tile_windows.append((legacy_tile['tile'], start_band, row_offset, col_offset, row_start, row_end, col_start, col_end))
+
+    if not covered.all():
+        return None
+
+    n_bands = parameter_object.out_bands_dict[parameter_object.trigger]
+
+    features = np.zeros((n_bands, out_rows, out_cols), dtype='float32')
+
+    for legacy_tile, start_band, row_offset, col_offset, row_start, row_end, col_start, col_end in tile_windows:
+
+        ds = gdal.Open(legacy_tile, gdal.GA_ReadOnly)
+
+        for band_index in range(0, n_bands):
+
+            band = ds.GetRasterBand(start_band + band_index)
+
+            band_array = band.ReadAsArray(col_start - col_offset,
+                                          row_start - row_offset,
+                                          col_end - col_start,
+                                          row_end - row_start)
+
+            band_scale = band.GetScale()
+            band_offset = band.GetOffset()
+
+            features[band_index, row_start:row_end, col_start:col_end] = \
+                band_array * (1. if band_scale is None else band_scale) + (0. if band_offset is None else band_offset)
+
+            band = None
+
+        ds = None
+
+    return features
@@ -0,0 +1,170 @@
+from __future__ import division
+
+import multiprocessing as multi
+
+from ..errors import logger
+from .spindices import get_section_triggers
+
+import numpy as np
+
+
+class SectionRing(object):
+
+    """
+    A ring of shared-memory buffers to hand sections between processes
+
+    Each slot holds one input section and its output features. The
+    buffers are created before the worker pool and inherited by the
+    workers, so arrays are never pickled between processes.
+
+    Args:
+        n_slots (int): The number of slots.
+        input_bytes (int): The size of each input buffer (bytes).
+        output_bytes (int): The size of each output buffer (bytes).
+    """
+
+    def __init__(self, n_slots, input_bytes, output_bytes):
+
+        self.n_slots = n_slots
+        self.input_bytes = input_bytes
+        self.output_bytes = output_bytes
+
+        self.input_buffers = [multi.RawArray('b', input_bytes) for si in range(0, n_slots)]
+        self.output_buffers = [multi.RawArray('b', output_bytes) for si in range(0, n_slots)]
+
+        # Only used by the process that owns the ring.
+        self.free_slots = list(range(0, n_slots))
+
+    @staticmethod
+    def _put(buffer2fill, buffer_bytes, array2put):
+
+        array2put = np.ascontiguousarray(array2put)
+
+        if array2put.nbytes > buffer_bytes:
+
+            logger.error('  The array ({:,d} bytes) does not fit in the shared buffer ({:,d} bytes).'.format(array2put.nbytes,
+                                                                                                         buffer_bytes))
+            raise ValueError
+
+        buffer_array = np.frombuffer(buffer2fill, dtype=array2put.dtype, count=array2put.size)
+        buffer_array[:] = array2put.ravel()
+
+        return array2put.shape, array2put.dtype.str
+
+    @staticmethod
+    def _get(buffer2read, array_shape, array_dtype):
+
+        n_samples = int(np.prod(array_shape))
+
+        return np.frombuffer(buffer2read, dtype=array_dtype, count=n_samples).reshape(array_shape)
+
+    def put_input(self, slot, array2put):
+
+        """
+        Copies an input section into a slot
+
+        Args:
+            slot (int)
+            array2put (ndarray)
+
+        Returns:
+            The array shape, the array data type
+        """
+
+        # Double precision sections are stored in single precision.
+        if (array2put.nbytes > self.input_bytes) and (array2put.dtype == 'float64'):
+            array2put = np.float32(array2put)
+
+        return self._put(self.input_buffers[slot], self.input_bytes, array2put)
+
+    def get_input(self, slot, array_shape, array_dtype):
+
+        """
+        Gets a zero-copy view of an input section
+
+        Args:
+            slot (int)
+            array_shape (tuple)
+            array_dtype (str)
+        """
+
+        return self._get(self.input_buffers[slot], array_shape, array_dtype)
+
+    def put_output(self, slot, array2put):
+
+        """
+        Copies output features into a slot
+
+        Args:
+            slot (int)
+            array2put (ndarray)
+
+        Returns:
+            The array shape, the array data type
+        """
+
+        return self._put(self.output_buffers[slot], self.output_bytes, array2put)
+
+    def get_output(self, slot, array_shape, array_dtype):
+
+        """
+        Gets a zero-copy view of output features
+
+        Args:
+            slot (int)
+            array_shape (tuple)
+            array_dtype (str)
+        """
+
+        return self._get(self.output_buffers[slot], array_shape, array_dtype)
+
+
+def get_section_bytes(parameter_object):
+
+    """
+    Estimates the input and output sizes of one section of the current trigger
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        The input bytes, the output bytes
+    """
+
+    section_triggers = get_section_triggers(parameter_object)
+
+    if parameter_object.use_rgb or (parameter_object.trigger in parameter_object.spectral_indices + ['saliency', 'seg']):
+        n_read_bands = max(3, len(section_triggers))
+    else:
+        n_read_bands = 1
+
+    # Sections are read as at most 32-bit samples.
+    input_bytes = parameter_object.sect_row_size * parameter_object.sect_col_size * n_read_bands * 4
+
+    # Fused spectral indices are output together.
+    output_bytes = int(np.ceil(parameter_object.sect_row_size / parameter_object.block)) * \
+                   int(np.ceil(parameter_object.sect_col_size / parameter_object.block)) * \
+                   sum([parameter_object.out_bands_dict[trigger] for trigger in section_triggers]) * 4
+
+    return input_bytes, output_bytes
+
+
+def get_ring_size(parameter_object):
+
+    """
+    Gets the shared buffer sizes of the current trigger
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        The number of slots, the input bytes, the output bytes
+    """
+
+    input_bytes, output_bytes = get_section_bytes(parameter_object)
+
+    # Two slots per worker let the reader stay one section ahead.
+    n_slots = max(1, min(parameter_object.n_jobs * 2,
+                         int(parameter_object.prefetch_mem * 1024 * 1024 / (input_bytes + output_bytes))))
+
+    return n_slots, input_bytes, output_bytes
@@ -0,0 +1,461 @@
+from __future__ import division
+from future.utils import viewitems
+
+from ..errors import logger
+
+import numpy as np
+
+# GDAL
+try:
+    from osgeo import gdal
+except:
+
+    logger.error('GDAL must be installed')
+    raise ImportError
+
+
+# The supported output storage types, ordered
+#   from the smallest to the largest.
+STORAGE_TYPES = ['uint8', 'uint16', 'float16', 'float32']
+
+# The number of quantization levels for integer storage.
+STORAGE_LEVELS = dict(uint8=255, uint16=65535)
+
+# The fraction of the sampled feature range that is added below and
+#   above it, so that sections outside of the samples are not clipped.
+STORAGE_MARGIN = 0.1
+
+# The size (pixels) of the windows that the integer storage range is sampled
+#   from, and their (row, column) positions as fractions of the image extent.
+SAMPLE_SIZE = 256
+SAMPLE_FRACTIONS = [(row_fraction, col_fraction)
+                    for row_fraction in [0.2, 0.5, 0.8]
+                    for col_fraction in [0.2, 0.5, 0.8]]
+
+# The tile (and VRT mosaic) overview levels.
+OVERVIEW_LEVELS = [2, 4, 8, 16]
+
+
+def parse_trigger_storage(trigger_storage):
+
+    """
+    Parses per-trigger storage options
+
+    Args:
+        trigger_storage (list or dict): A list of 'trigger:storage' strings or a dictionary.
+
+    Returns:
+        Dictionary of {trigger: storage}
+    """
+
+    if not trigger_storage:
+        return dict()
+
+    if isinstance(trigger_storage, dict):
+        storage_dict = dict(trigger_storage)
+    else:
+
+        storage_dict = dict()
+
+        for trigger_str in trigger_storage:
+
+            if ':' not in trigger_str:
+
+                logger.error('The trigger storage, {}, should be given as <trigger>:<storage>.'.format(trigger_str))
+                raise ValueError
+
+            trigger, storage = trigger_str.split(':')
+
+            storage_dict[trigger.lower()] = storage.lower()
+
+    for trigger, storage in viewitems(storage_dict):
+
+        if storage not in STORAGE_TYPES:
+
+            logger.error('The storage, {}, for {} is not supported.'.format(storage, trigger))
+            raise ValueError
+
+    return storage_dict
+
+
+def get_trigger_storage(parameter_object, trigger):
+
+    """
+    Gets the requested storage for one trigger
+
+    Args:
+        parameter_object (class)
+        trigger (str)
+    """
+
+    return parameter_object.trigger_storage.get(trigger, parameter_object.storage)
+
+
+def get_tile_storage(parameter_object):
+
+    """
+    Gets the storage of the output tiles
+
+    Because every trigger is written to the same tile, the tile
+    storage must hold the widest storage of all triggers.
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        The tile storage as a string
+    """
+
+    storages = [get_trigger_storage(parameter_object, trigger) for trigger in parameter_object.triggers]
+
+    tile_storage = storages[0]
+
+    for storage in storages[1:]:
+
+        if storage == tile_storage:
+            continue
+
+        # Mixed integer types fit in the larger integer.
+        if (storage in STORAGE_LEVELS) and (tile_storage in STORAGE_LEVELS):
+            tile_storage = max(storage, tile_storage, key=STORAGE_TYPES.index)
+
+        # 8-bit integers are exact in half precision.
+        elif set([storage, tile_storage]) == set(['uint8', 'float16']):
+            tile_storage = 'float16'
+
+        else:
+            tile_storage = 'float32'
+
+    return tile_storage
+
+
+def get_raster_storage(tile_storage):
+
+    """
+    Gets the raster data type and creation options of a tile storage
+
+    Half precision is written as float32 arrays to a 32-bit float
+    raster with 16 bits per sample, which GDAL packs as half floats.
+
+    Args:
+        tile_storage (str)
+
+    Returns:
+        Data type as a string, creation options as a dictionary
+    """
+
+    if tile_storage == 'float16':
+        return 'float32', dict(nbits='16')
+    else:
+        return tile_storage, dict()
+
+
+def get_storage_levels(trigger_storage, tile_storage):
+
+    """
+    Gets the number of quantization levels of a trigger
+
+    Integer tiles can hold an integer trigger at its own precision.
+
+    Args:
+        trigger_storage (str): The storage requested for the trigger.
+        tile_storage (str): The storage of the output tile.
+
+    Returns:
+        The number of levels, or None for float tiles
+    """
+
+    if tile_storage not in STORAGE_LEVELS:
+        return None
+
+    if trigger_storage in STORAGE_LEVELS:
+        return STORAGE_LEVELS[trigger_storage]
+
+    return STORAGE_LEVELS[tile_storage]
+
+
+def get_band_scales(features, levels, valid_mask=None):
+
+    """
+    Gets the scales and offsets that map each band onto the quantization levels
+
+    NaN, infinite and masked values are ignored.
+
+    Args:
+        features (3d array): The <features x rows x columns> features.
+        levels (int)
+        valid_mask (Optional[2d array]): The valid cells, shaped [rows x columns].
+
+    Returns:
+        The band scales, the band offsets
+    """
+
+    n_bands = features.shape[0]
+
+    scales = np.ones(n_bands, dtype='float64')
+    offsets = np.zeros(n_bands, dtype='float64')
+
+    for bd in range(0, n_bands):
+
+        band_values = features[bd]
+
+        if isinstance(valid_mask, np.ndarray):
+            band_values = band_values[valid_mask]
+
+        band_values = band_values[np.isfinite(band_values)]
+
+        if band_values.size == 0:
+            continue
+
+        band_min = float(band_values.min())
+        band_max = float(band_values.max())
+
+        if band_max > band_min:
+            scales[bd] = (band_max - band_min) / levels
+
+        offsets[bd] = band_min
+
+    return scales, offsets
+
+
+def merge_band_scales(band_scales, levels, margin=0.):
+
+    """
+    Merges the band scales and offsets of several samples into one range per band
+
+    Args:
+        band_scales (list): A list of (scales, offsets) pairs.
+        levels (int)
+        margin (Optional[float]): The fraction of the band range added below and above it.
+
+    Returns:
+        The band scales, the band offsets
+    """
+
+    band_mins = np.min([offsets for scales, offsets in band_scales], axis=0)
+    band_maxs = np.max([offsets + scales * levels for scales, offsets in band_scales], axis=0)
+
+    band_margins = (band_maxs - band_mins) * margin
+
+    band_mins = band_mins - band_margins
+    band_maxs = band_maxs + band_margins
+
+    scales = np.where(band_maxs > band_mins, (band_maxs - band_mins) / levels, 1.)
+
+    return scales, band_mins
+
+
+def quantize_section(section_array, trigger_storage, tile_storage, scales=None, offsets=None, valid_mask=None):
+
+    """
+    Quantizes a feature section to the output storage
+
+    Integer storage should be given the band `scales` and `offsets` shared by
+    every tile of the image, so that one integer means the same feature value
+    in every tile. Values outside of the band range are clipped (with a warning),
+    and NaN is stored as the band offset. Half precision sections are rounded
+    to half precision and returned as float32 (see `get_raster_storage`).
+
+    Args:
+        section_array (3d array): The float32 features, shaped [features x rows x columns].
+        trigger_storage (str): The storage requested for the trigger.
+        tile_storage (str): The storage of the output tile.
+        scales (Optional[1d array]): The band scales. If not given, they are taken from the section.
+        offsets (Optional[1d array]): The band offsets.
+        valid_mask (Optional[2d array]): The valid cells of the section, used if the scales are not given.
+
+    Returns:
+        The stored array, the band scales, the band offsets
+    """
+
+    n_bands = section_array.shape[0]
+
+    if tile_storage == 'float32':
+        return section_array, np.ones(n_bands, dtype='float64'), np.zeros(n_bands, dtype='float64')
+
+    if tile_storage == 'float16':
+
+        return np.float32(np.float16(section_array)), \
+               np.ones(n_bands, dtype='float64'), \
+               np.zeros(n_bands, dtype='float64')
+
+    levels = get_storage_levels(trigger_storage, tile_storage)
+
+    if scales is None:
+        scales, offsets = get_band_scales(section_array, levels, valid_mask=valid_mask)
+    else:
+
+        scales = np.float64(scales)
+        offsets = np.float64(offsets)
+
+    stored_array = np.empty(section_array.shape, dtype=tile_storage)
+
+    n_clipped = 0
+    clipped_bands = list()
+
+    for bd in range(0, n_bands):
+
+        band_codes = np.round((section_array[bd] - offsets[bd]) / scales[bd])
+
+        band_codes = np.where(np.isfinite(band_codes), band_codes, 0)
+
+        band_clipped = int(np.count_nonzero((band_codes < 0) | (band_codes > levels)))
+
+        if band_clipped > 0:
+
+            n_clipped += band_clipped
+            clipped_bands.append(bd + 1)
+
+        stored_array[bd] = np.clip(band_codes, 0, levels)
+
+    if n_clipped > 0:
+
+        logger.warning('  {:,d} feature values of band(s) {} are outside of the {} storage range and were clipped.'.format(n_clipped,
+                                                                                                                          ','.join(map(str, clipped_bands)),
+                                                                                                                          tile_storage))
+
+    return stored_array, scales, offsets
+
+
+def dequantize_section(stored_array, scales, offsets):
+
+    """
+    Converts a stored section back to float32
+
+    Args:
+        stored_array (3d array)
+        scales (1d array)
+        offsets (1d array)
+    """
+
+    return np.float32(stored_array * scales[:, np.newaxis, np.newaxis] + offsets[:, np.newaxis, np.newaxis])
+
+
+def quantization_error(section_array, stored_array, scales, offsets):
+
+    """
+    Gets the maximum absolute error of the stored section against float32
+
+    NaN and infinite features are not counted.
+
+    Args:
+        section_array (3d array)
+        stored_array (3d array)
+        scales (1d array)
+        offsets (1d array)
+    """
+
+    section_error = np.abs(dequantize_section(stored_array, scales, offsets) - section_array)
+
+    section_error = section_error[np.isfinite(section_error)]
+
+    if section_error.size == 0:
+        return 0.
+
+    return float(section_error.max())
+
+
+def get_shared_scales(parameter_object, trigger, n_bands):
+
+    """
+    Gets the band scales and offsets of a trigger that are shared by every tile
+
+    Args:
+        parameter_object (class)
+        trigger (str)
+        n_bands (int): The number of tile bands. The feature scales
+            are repeated over the neighbor copies.
+
+    Returns:
+        The band scales and offsets, or None, None if the trigger has no shared range
+    """
+
+    storage_scales = getattr(parameter_object, 'storage_scales', None)
+
+    scale_key = '{TR}-{BD}'.format(TR=trigger, BD=parameter_object.band_position)
+
+    if not storage_scales or (scale_key not in storage_scales):
+        return None, None
+
+    scales = np.float64(storage_scales[scale_key]['scales'])
+    offsets = np.float64(storage_scales[scale_key]['offsets'])
+
+    n_copies = int(n_bands / len(scales))
+
+    return np.tile(scales, n_copies), np.tile(offsets, n_copies)
+
+
+def set_band_scales(out_img, start_band, scales, offsets):
+
+    """
+    Records the band scales and offsets in the raster metadata
+
+    Args:
+        out_img (str)
+        start_band (int): The first band position to update.
+        scales (1d array)
+        offsets (1d array)
+    """
+
+    if np.allclose(scales, 1) and np.allclose(offsets, 0):
+        return
+
+    ds = gdal.Open(out_img, gdal.GA_Update)
+
+    for bi in range(0, len(scales)):
+
+        band = ds.GetRasterBand(start_band + bi)
+
+        band.SetScale(float(scales[bi]))
+        band.SetOffset(float(offsets[bi]))
+
+        band = None
+
+    ds = None
+
+
+def has_overviews(out_img):
+
+    """Checks whether a tile has overviews"""
+
+    ds = gdal.Open(out_img, gdal.GA_ReadOnly)
+
+    overview_count = ds.GetRasterBand(1).GetOverviewCount()
+
+    ds = None
+
+    return overview_count > 0
+
+
+def update_overviews(out_img, band_list):
+
+    """
+    Updates the overviews of the written bands of a tile
+
+    The overview levels are allocated for every band the first time, and only
+    the written bands are averaged, so bands written by later triggers do not
+    recompute the others. Integer bands are averaged in the stored values,
+    which is the same as averaging the features because the band scale
+    and offset are linear.
+
+    Args:
+        out_img (str)
+        band_list (list): The band positions to update.
+    """
+
+    ds = gdal.Open(out_img, gdal.GA_Update)
+
+    if ds.GetRasterBand(1).GetOverviewCount() == 0:
+        ds.BuildOverviews('NONE', OVERVIEW_LEVELS)
+
+    for band_position in band_list:
+
+        band = ds.GetRasterBand(band_position)
+
+        gdal.RegenerateOverviews(band,
+                                 [band.GetOverview(oi) for oi in range(0, band.GetOverviewCount())],
+                                 'AVERAGE')
+
+        band = None
+
+    ds = None
@@ -0,0 +1,289 @@
+from __future__ import division
+
+import os
+import re
+import hashlib
+import multiprocessing as multi
+
+from ..errors import logger
+from .spresults import get_trigger_params
+
+import numpy as np
+
+
+# The candidate section sizes (pixels).
+CANDIDATE_SIZES = [250, 500, 1000, 2000, 4000]
+
+# The representative windows, as (row, column) fractions of the free image
+#   extent. The first window also measures memory and warms up the triggers.
+WINDOW_FRACTIONS = [(0.5, 0.5), (0.25, 0.25), (0.75, 0.75)]
+
+# The fixed cost (seconds) of a section task (opening, dispatch and writing).
+TASK_OVERHEAD = 0.05
+
+# The memory (MB) of an idle worker process.
+WORKER_BASE_MEM = 200
+
+# Untracked (e.g., OpenCV) allocations are covered by this factor.
+MEM_FACTOR = 1.5
+
+_RECORD_PATTERN = re.compile(r'^Autotune \[(\w+)\]: section_size=(\d+) n_jobs=(\d+)')
+
+
+def get_memory_budget(parameter_object):
+
+    """
+    Gets the memory budget (MB) of the workers
+
+    Returns:
+        The budget, or None if it is unknown
+    """
+
+    if parameter_object.autotune_mem > 0:
+        return parameter_object.autotune_mem
+
+    try:
+        total_mem = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024. * 1024.)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+    return int(total_mem * 0.75)
+
+
+def get_tune_key(parameter_object, n_image_rows, n_image_cols):
+
+    """
+    Gets the key of the parameters that change the tuning decision
+
+    Args:
+        parameter_object (class)
+        n_image_rows (int)
+        n_image_cols (int)
+
+    Returns:
+        The key as a hex string
+    """
+
+    key_items = (os.path.abspath(parameter_object.input_image),
+                 n_image_rows,
+                 n_image_cols,
+                 list(parameter_object.triggers),
+                 list(parameter_object.band_positions),
+                 parameter_object.use_rgb,
+                 parameter_object.block,
+                 list(parameter_object.scales),
+                 [get_trigger_params(parameter_object, trigger) for trigger in parameter_object.triggers],
+                 parameter_object.n_jobs,
+                 get_memory_budget(parameter_object))
+
+    return hashlib.md5(repr(key_items).encode('utf-8')).hexdigest()
+
+
+def read_tune_record(log_txt, tune_key):
+
+    """
+    Reads the latest tuning decision of a key from the log
+
+    Args:
+        log_txt (str): The log file.
+        tune_key (str)
+
+    Returns:
+        The section size and the number of workers, or None
+    """
+
+    if not os.path.isfile(log_txt):
+        return None
+
+    tune_record = None
+
+    with open(log_txt, 'r') as log_txt_rd:
+
+        for log_line in log_txt_rd:
+
+            record_match = _RECORD_PATTERN.match(log_line)
+
+            if record_match and (record_match.group(1) == tune_key):
+                tune_record = int(record_match.group(2)), int(record_match.group(3))
+
+    return tune_record
+
+
+def write_tune_record(log_txt, tune_key, section_size, n_jobs, predicted_seconds):
+
+    """Appends a tuning decision to the log"""
+
+    with open(log_txt, 'a') as log_txt_wr:
+
+        log_txt_wr.write('Autotune [{}]: section_size={:d} n_jobs={:d} predicted_seconds={:.1f}\n'.format(tune_key,
+                                                                                                          section_size,
+                                                                                                          n_jobs,
+                                                                                                          predicted_seconds))
+
+
+def get_candidate_sizes(parameter_object, n_image_rows, n_image_cols):
+
+    """
+    Gets the candidate section sizes
+
+    Sizes must hold at least two largest scale windows, and
+    sizes beyond the first that covers the image are dropped.
+    """
+
+    min_size = parameter_object.scales[-1] * 2
+    max_size = max(n_image_rows, n_image_cols)
+
+    candidate_sizes = list()
+
+    for section_size in sorted(set(CANDIDATE_SIZES + [parameter_object.section_size])):
+
+        if section_size < min_size:
+            continue
+
+        candidate_sizes.append(section_size)
+
+        if section_size >= max_size:
+            break
+
+    return candidate_sizes if candidate_sizes else [max(min_size, min(max_size, parameter_object.section_size))]
+
+
+def get_candidate_jobs(max_jobs):
+
+    """
+    Gets the candidate process counts
+
+    Each process gets CPUs / processes GDAL decoding threads.
+    """
+
+    candidate_jobs = set([max_jobs])
+
+    n_jobs = 1
+
+    while n_jobs < max_jobs:
+
+        candidate_jobs.add(n_jobs)
+        n_jobs *= 2
+
+    return sorted(candidate_jobs)
+
+
+def get_section_count(parameter_object, n_image_rows, n_image_cols, section_size):
+
+    """Gets the number of sections of a section size, as in `get_n_sects`"""
+
+    scale_block_diff = parameter_object.scales[-1] - parameter_object.block
+
+    sect_row_size = min(section_size, n_image_rows)
+    sect_col_size = min(section_size, n_image_cols)
+
+    return len(range(0, n_image_rows, sect_row_size-scale_block_diff)) * \
+           len(range(0, n_image_cols, sect_col_size-scale_block_diff))
+
+
+def get_worker_mem(peak_mem):
+
+    """Gets the memory (MB) of a worker from the peak memory (MB) of one section"""
+
+    return WORKER_BASE_MEM + peak_mem * MEM_FACTOR
+
+
+def get_concurrent_jobs(peak_mem, max_jobs, memory_budget):
+
+    """
+    Gets the largest candidate process count whose workers fit in the memory budget
+
+    Args:
+        peak_mem (float): The peak memory (MB) of one section.
+        max_jobs (int): The largest process count.
+        memory_budget (int): The memory budget (MB), or None.
+    """
+
+    worker_mem = get_worker_mem(peak_mem)
+
+    fit_jobs = [n_jobs for n_jobs in get_candidate_jobs(max_jobs)
+                if not memory_budget or (n_jobs * worker_mem <= memory_budget)]
+
+    return fit_jobs[-1] if fit_jobs else 1
+
+
+def get_section_seconds(size_timing, n_jobs):
+
+    """
+    Gets the time of one section when a number of processes run at once
+
+    Sections are timed with one process (and all GDAL threads) and with
+    `concurrent_jobs` processes at once (each with its share of the GDAL
+    threads). The time of the process counts in between is interpolated.
+
+    Args:
+        size_timing (dict): The timing of a section size (see `select_configuration`).
+        n_jobs (int)
+    """
+
+    if size_timing['concurrent_jobs'] <= 1:
+        return size_timing['seconds']
+
+    job_share = (min(n_jobs, size_timing['concurrent_jobs']) - 1) / (size_timing['concurrent_jobs'] - 1)
+
+    return size_timing['seconds'] + (size_timing['concurrent_seconds'] - size_timing['seconds']) * job_share
+
+
+def select_configuration(size_timings, max_jobs, memory_budget):
+
+    """
+    Selects the configuration with the shortest predicted run time
+
+    The run time of a configuration is the number of section rounds
+    (sections / processes) times the section time with that many
+    processes. Configurations whose workers exceed the memory budget
+    are excluded.
+
+    Args:
+        size_timings (list): A list of dictionaries with the `section_size`,
+            `n_sections`, `seconds` (per section with one process), `concurrent_jobs`,
+            `concurrent_seconds` (per section with `concurrent_jobs` processes at once)
+            and `peak_mem` (MB per section).
+        max_jobs (int): The largest process count.
+        memory_budget (int): The memory budget (MB), or None.
+
+    Returns:
+        The section size, the number of processes, the predicted run time (seconds)
+    """
+
+    best_config = None
+
+    logger.info('  Predicted run times:')
+
+    for size_timing in size_timings:
+
+        worker_mem = get_worker_mem(size_timing['peak_mem'])
+
+        for n_jobs in get_candidate_jobs(max_jobs):
+
+            if memory_budget and (n_jobs * worker_mem > memory_budget):
+                continue
+
+            predicted_seconds = int(np.ceil(size_timing['n_sections'] / n_jobs)) * \
+                                (get_section_seconds(size_timing, n_jobs) + TASK_OVERHEAD)
+
+            logger.info('    section size {:d}, {:d} processes x {:d} GDAL threads: {:.1f} seconds'.format(size_timing['section_size'],
+                                                                                                       n_jobs,
+                                                                                                       max(1, int(multi.cpu_count() / n_jobs)),
+                                                                                                       predicted_seconds))
+
+            # Ties go to fewer processes.
+            if (best_config is None) or (predicted_seconds < best_config[2]):
+                best_config = (size_timing['section_size'], n_jobs, predicted_seconds)
+
+    if best_config is None:
+
+        logger.warning('  No configuration fits the memory budget, so the smallest section size is used with one process.')
+
+        size_timing = size_timings[0]
+
+        best_config = (size_timing['section_size'],
+                       1,
+                       size_timing['n_sections'] * (size_timing['seconds'] + TASK_OVERHEAD))
+
+    return best_config
@@ -8,8 +8,10 @@ import os
 import copy
 import time
 import itertools
+import multiprocessing as multi
 
 from ..errors import logger
+from .spstorage import get_tile_storage, get_raster_storage
 
 from mpglue import raster_tools, vrt_builder
 from mpglue import utils
@@ -75,7 +77,9 @@ def write_log(parameter_object):
                              'SFS stopping threshold: {:d}\n'.format(parameter_object.sfs_threshold),
                              '{} compute features as neighbors\n'.format(parameter_object.write_neighbors),
                              '{} perform histogram equalization\n'.format(parameter_object.write_equalize),
-                             '{} perform adaptive histogram equalization\n'.format(parameter_object.write_equalize_adapt)]
+                             '{} perform adaptive histogram equalization\n'.format(parameter_object.write_equalize_adapt),
+                             'Output storage: {}\n'.format(parameter_object.write_storage),
+                             'Approximated scales: {}\n'.format(parameter_object.write_approx)]
 
     with open(parameter_object.log_txt, 'w') as log_txt_wr:
         log_txt_wr.writelines(lines2write)
@@ -413,57 +417,291 @@ def get_luminosity(im_block):
     return im_block.mean(axis=0)
 
 
-def get_layer_min_max(i_info, layers=[1, 2, 3], rgb=False, block_size=2048):
+def _get_histogram_ranges(image_name, layers, image_storage):
 
-    min_max = []
+    """
+    Gets the histogram bins and range of each layer
 
-    if rgb:
+    Args:
+        image_name (str)
+        layers (list)
+        image_storage (str)
+
+    Returns:
+        List of (bins, (range minimum, range maximum)) tuples
+    """
+
+    if image_storage.lower() == 'byte':
+        return [(256, (0., 256.))] * len(layers)
+    elif image_storage.lower() == 'uint16':
+        return [(65536, (0., 65536.))] * len(layers)
+
+    ds = gdal.Open(image_name)
+
+    hist_ranges = list()
+
+    for lb in layers:
+
+        band_min, band_max = ds.GetRasterBand(lb).ComputeRasterMinMax(True)
+
+        if band_max <= band_min:
+            band_max = band_min + 1.
+
+        hist_ranges.append((4096, (band_min, band_max)))
+
+    ds = None
+
+    return hist_ranges
+
+
+def _block_histograms(block_args):
+
+    """
+    Gets the partial histograms of one image block
+
+    Args:
+        block_args (tuple): The image name, the layers, the RGB layers,
+            the block window, and the histogram bins and ranges.
+
+    Returns:
+        List of 1d histograms (one for each layer, plus one for the RGB average)
+    """
+
+    image_name, layers, rgb_layers, i, j, n_rows, n_cols, hist_ranges = block_args
+
+    read_layers = sorted(set(layers + rgb_layers))
+
+    with raster_tools.ropen(image_name) as i_info:
+
+        block = i_info.read(bands2open=read_layers,
+                            i=i,
+                            j=j,
+                            rows=n_rows,
+                            cols=n_cols,
+                            d_type='float32')
+
+    del i_info
+
+    if block.ndim == 2:
+        block = block[np.newaxis]
+
+    hists = list()
+
+    for li, lb in enumerate(layers):
+
+        hists.append(np.histogram(block[read_layers.index(lb)],
+                                  bins=hist_ranges[li][0],
+                                  range=hist_ranges[li][1])[0])
+
+    if rgb_layers:
+
+        luminosity = get_luminosity(block[[read_layers.index(lb) for lb in rgb_layers]])
+
+        hists.append(np.histogram(luminosity,
+                                  bins=hist_ranges[-1][0],
+                                  range=hist_ranges[-1][1])[0])
+
+    return hists
+
+
+def get_image_histograms(image_name, layers, rgb_layers=None, n_jobs=1, block_size=2048):
+
+    """
+    Gets global layer histograms in a single streaming pass
+
+    Each block is read once for all layers, and the partial block
+    histograms are summed as they are returned by the workers.
+
+    Args:
+        image_name (str)
+        layers (list): The layers to get histograms for.
+        rgb_layers (Optional[list]): The visible layers to get the average histogram for.
+        n_jobs (Optional[int]): The number of parallel processes.
+        block_size (Optional[int]): The block read size.
+
+    Returns:
+        Dictionary of {layer: (histogram, bin edges)}, with the RGB average stored under 'rgb'
+    """
+
+    if not rgb_layers:
+        rgb_layers = list()
+
+    with raster_tools.ropen(image_name) as i_info:
+
+        image_rows = i_info.rows
+        image_cols = i_info.cols
+        image_storage = i_info.storage
+
+    del i_info
+
+    hist_ranges = _get_histogram_ranges(image_name, layers + rgb_layers[:1], image_storage)
+
+    block_args = list()
+
+    for i in range(0, image_rows, block_size):
+
+        n_rows = raster_tools.n_rows_cols(i, block_size, image_rows)
+
+        for j in range(0, image_cols, block_size):
+
+            n_cols = raster_tools.n_rows_cols(j, block_size, image_cols)
+
+            block_args.append((image_name, layers, rgb_layers, i, j, n_rows, n_cols, hist_ranges))
+
+    hists = None
+
+    pool = multi.Pool(processes=max(1, min(n_jobs, len(block_args))))
+
+    for block_hists in pool.imap_unordered(_block_histograms, block_args):
+
+        if hists is None:
+            hists = block_hists
+        else:
+            hists = [np.add(hist, block_hist) for hist, block_hist in zip(hists, block_hists)]
+
+    pool.close()
+    pool.join()
+    pool = None
+
+    hist_dict = dict()
+
+    for li, lb in enumerate(layers + ['rgb'] if rgb_layers else layers):
+
+        edges = np.linspace(hist_ranges[li][1][0],
+                            hist_ranges[li][1][1],
+                            hist_ranges[li][0]+1)
+
+        hist_dict[lb] = (hists[li], edges)
+
+    return hist_dict
+
+
+def get_histogram_min_max(hist, edges, lower=1, upper=99):
+
+    """
+    Gets the percentile minimum and maximum from a histogram
+
+    Args:
+        hist (1d array)
+        edges (1d array)
+        lower (Optional[float]): The lower percentile.
+        upper (Optional[float]): The upper percentile.
+    """
+
+    cdf = np.cumsum(hist, dtype='float64')
+
+    if cdf[-1] == 0:
+        return edges[0], edges[-1]
+
+    cdf /= cdf[-1]
+
+    layer_min = edges[np.searchsorted(cdf, lower / 100.)]
+    layer_max = edges[min(np.searchsorted(cdf, upper / 100.) + 1, len(edges) - 1)]
+
+    return float(layer_min), float(layer_max)
+
+
+def get_equalize_lut(hist, edges, image_min, image_max, out_d_range):
+
+    """
+    Gets a global histogram equalization look-up table for 8-bit sections
+
+    Args:
+        hist (1d array): The global layer histogram.
+        edges (1d array): The histogram bin edges.
+        image_min (float): The 8-bit rescaling minimum.
+        image_max (float): The 8-bit rescaling maximum.
+        out_d_range (tuple): The 8-bit rescaling output range.
+
+    Returns:
+        A 256-length uint8 array that maps 8-bit section values to equalized values
+    """
 
-        layer_min = 999999.
-        layer_max = -999999.
+    bin_centers = (edges[:-1] + edges[1:]) / 2.
 
-        for i in range(0, i_info.rows, block_size):
-            n_rows = raster_tools.n_rows_cols(i, block_size, i_info.rows)
+    # Rescale the bin centers the same way as the sections.
+    bin_scaled = np.clip((bin_centers - image_min) / float(image_max - image_min), 0, 1)
+    bin_scaled = np.uint8(bin_scaled * (out_d_range[1] - out_d_range[0]) + out_d_range[0])
 
-            for j in range(0, i_info.cols, block_size):
-                n_cols = raster_tools.n_rows_cols(j, block_size, i_info.cols)
+    hist8 = np.bincount(bin_scaled, weights=hist, minlength=256)
 
-                sect = i_info.read(bands2open=layers,
-                                   i=i, j=j,
-                                   rows=n_rows, cols=n_cols,
-                                   d_type='float32')
+    cdf = np.cumsum(hist8)
 
-                sect = get_luminosity(sect)
+    if cdf[-1] == 0:
+        return np.arange(0, 256, dtype='uint8')
 
-                layer_min = min(layer_min, np.percentile(sect, 1))
-                layer_max = max(layer_max, np.percentile(sect, 99))
+    return np.uint8(np.round(cdf / cdf[-1] * 255.))
 
-        min_max.append((layer_min, layer_max))
+
+def get_layer_min_max(i_info, layers=[1, 2, 3], rgb=False, block_size=2048, n_jobs=1):
+
+    """
+    Gets the 1st and 99th percentile of each layer (or of the RGB average)
+
+    Args:
+        i_info (`ropen` object)
+        layers (Optional[list])
+        rgb (Optional[bool])
+        block_size (Optional[int])
+        n_jobs (Optional[int])
+    """
+
+    if rgb:
+
+        hist_dict = get_image_histograms(i_info.file_name,
+                                         list(),
+                                         rgb_layers=layers,
+                                         n_jobs=n_jobs,
+                                         block_size=block_size)
+
+        return [get_histogram_min_max(*hist_dict['rgb'])]
 
     else:
 
-        for lb in layers:
+        hist_dict = get_image_histograms(i_info.file_name,
+                                         layers,
+                                         n_jobs=n_jobs,
+                                         block_size=block_size)
 
-            layer_min = 999999.
-            layer_max = -999999.
+        return [get_histogram_min_max(*hist_dict[lb]) for lb in layers]
 
-            for i in range(0, i_info.rows, block_size):
-                n_rows = raster_tools.n_rows_cols(i, block_size, i_info.rows)
 
-                for j in range(0, i_info.cols, block_size):
-                    n_cols = raster_tools.n_rows_cols(j, block_size, i_info.cols)
+def get_global_stats(parameter_object):
 
-                    sect = i_info.read(bands2open=lb,
-                                       i=i, j=j,
-                                       rows=n_rows, cols=n_cols,
-                                       d_type='float32')
+    """
+    Gets the global image histograms used for rescaling and equalization
 
-                    layer_min = min(layer_min, np.percentile(sect, 1))
-                    layer_max = max(layer_max, np.percentile(sect, 99))
+    Args:
+        parameter_object (class)
+    """
+
+    logger.info('  Getting global image statistics ...')
 
-            min_max.append((layer_min, layer_max))
+    if parameter_object.use_rgb:
+
+        utils.sensor_wavelength_check(parameter_object.sat_sensor, ['blue', 'green', 'red'])
 
-    return min_max
+        layers = list()
+
+        rgb_layers = [utils.SENSOR_BAND_DICT[parameter_object.sat_sensor]['blue'],
+                      utils.SENSOR_BAND_DICT[parameter_object.sat_sensor]['green'],
+                      utils.SENSOR_BAND_DICT[parameter_object.sat_sensor]['red']]
+
+    else:
+
+        layers = [int(bp) for bp in parameter_object.band_positions]
+        rgb_layers = list()
+
+    image_hists = get_image_histograms(parameter_object.input_image,
+                                       layers,
+                                       rgb_layers=rgb_layers,
+                                       n_jobs=parameter_object.n_jobs)
+
+    parameter_object.update_info(image_hists=image_hists,
+                                 image_min_user=parameter_object.image_min,
+                                 image_max_user=parameter_object.image_max)
+
+    return parameter_object
 
 
 def convert_rgb2gray(i_info, i_sect, j_sect, n_rows, n_cols, the_sensor, stats=False):
@@ -635,6 +873,84 @@ def create_outputs(parameter_object, new_feas_list, image_info):
     return parameter_object
 
 
+def set_gdal_cache(gdal_cache, n_jobs=1):
+
+    """
+    Sets the GDAL cache and I/O options of one process
+
+    The cache budget is split over the parallel workers. A quarter of
+    each worker's share goes to the VSI read-ahead cache and the rest
+    to the raster block cache. Compressed blocks are decoded with the
+    CPUs left over by the workers.
+
+    Args:
+        gdal_cache (int): The total GDAL cache budget (MB).
+        n_jobs (Optional[int]): The number of parallel workers.
+    """
+
+    n_jobs = max(1, n_jobs)
+
+    worker_cache = int(gdal_cache * 1024 * 1024 / n_jobs)
+
+    vsi_cache = int(worker_cache / 4)
+
+    gdal.SetCacheMax(worker_cache - vsi_cache)
+
+    gdal.SetConfigOption('VSI_CACHE', 'TRUE')
+    gdal.SetConfigOption('VSI_CACHE_SIZE', '{:d}'.format(vsi_cache))
+    gdal.SetConfigOption('GDAL_NUM_THREADS', '{:d}'.format(max(1, int(multi.cpu_count() / n_jobs))))
+
+
+def get_block_size(image_name, band_position=1):
+
+    """
+    Gets the native block (or strip) size of an image band
+
+    Args:
+        image_name (str)
+        band_position (Optional[int])
+
+    Returns:
+        Block rows, block columns
+    """
+
+    ds = gdal.Open(image_name, gdal.GA_ReadOnly)
+
+    band = ds.GetRasterBand(band_position)
+
+    block_cols, block_rows = band.GetBlockSize()
+
+    band = None
+    ds = None
+
+    return block_rows, block_cols
+
+
+def _align_section_size(section_size, native_size, image_size, scale_block_diff):
+
+    """
+    Aligns the section step (the section size minus the overlap) to the native block size
+
+    Args:
+        section_size (int)
+        native_size (int): The native block or strip size.
+        image_size (int): The image rows or columns.
+        scale_block_diff (int): The section overlap.
+    """
+
+    if (native_size <= 1) or (section_size >= image_size):
+        return section_size
+
+    section_step = section_size - scale_block_diff
+
+    if section_step <= native_size:
+        section_step = native_size
+    else:
+        section_step -= section_step % native_size
+
+    return min(section_step + scale_block_diff, image_size)
+
+
 def get_section_size(image_info, parameter_object):
 
     """
@@ -655,12 +971,43 @@ def get_section_size(image_info, parameter_object):
     else:
         sect_col_size = parameter_object.section_size
 
+    # Align section origins to the native blocks
+    #   so that compressed blocks are decoded once.
+    if parameter_object.align_sections:
+
+        block_rows, block_cols = get_block_size(parameter_object.input_image)
+
+        scale_block_diff = parameter_object.scales[-1] - parameter_object.block
+
+        sect_row_size = _align_section_size(sect_row_size, block_rows, image_info.rows, scale_block_diff)
+        sect_col_size = _align_section_size(sect_col_size, block_cols, image_info.cols, scale_block_diff)
+
     parameter_object.update_info(sect_row_size=sect_row_size,
                                  sect_col_size=sect_col_size)
 
     return parameter_object
 
 
+def get_block_offset(parameter_object):
+
+    """
+    Gets the offset of the first output cell from the section origin
+
+    Each output cell is the center block of the largest scale window,
+    so the offset is the half scale less the half block, in whole input
+    pixels, as in the kernels. The tile georeference, the no-data
+    footprints and the legacy tile origins all use this offset.
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        The offset in input pixels
+    """
+
+    return int(parameter_object.scales[-1] / 2) - int(parameter_object.block / 2)
+
+
 def get_output_info_tile(meta_info, image_info, tile_parameter_object, i_sect, j_sect, out_rows, out_cols):
 
     """
@@ -683,12 +1030,15 @@ def get_output_info_tile(meta_info, image_info, tile_parameter_object, i_sect, j
     cell_size_y = float(tile_parameter_object.block) * meta_info.cellY
     cell_size_x = float(tile_parameter_object.block) * meta_info.cellX
 
-    block_offset = (tile_parameter_object.scales[-1] / 2) - (tile_parameter_object.block / 2)
+    block_offset = get_block_offset(tile_parameter_object)
 
     # Adjust the output left and right coordinates.
     left_coord = meta_info.left + abs(j_sect * meta_info.cellY) + (block_offset * abs(meta_info.cellY))
     top_coord = meta_info.top - abs(i_sect * meta_info.cellX) - (block_offset * abs(meta_info.cellY))
 
+    # The output data type.
+    storage = get_raster_storage(get_tile_storage(tile_parameter_object))[0]
+
     image_info.update_info(rows=out_rows,
                            cols=out_cols,
                            left=left_coord,
@@ -696,7 +1046,7 @@ def get_output_info_tile(meta_info, image_info, tile_parameter_object, i_sect, j
                            cellY=cell_size_y,
                            cellX=cell_size_x,
                            bands=tile_parameter_object.band_info['band_count'],
-                           storage='float32')
+                           storage=storage)
 
     # image_info.update_info(right=image_info.left+(cols*meta_info.cellY),
     #                        bottom=image_info.top-(rows*meta_info.cellY))
@@ -780,6 +1130,32 @@ def get_stats(image_info, parameter_object):
          parameter_object (class)
     """
 
+    # Use the global histogram percentiles
+    #   unless the user set the range.
+    if parameter_object.global_stats and hasattr(parameter_object, 'image_hists'):
+
+        hist_key = 'rgb' if parameter_object.use_rgb else int(parameter_object.band_position)
+        hist, edges = parameter_object.image_hists[hist_key]
+
+        layer_min, layer_max = get_histogram_min_max(hist, edges)
+
+        if parameter_object.image_min_user == -999:
+            parameter_object.update_info(image_min=layer_min)
+
+        if parameter_object.image_max_user == -999:
+            parameter_object.update_info(image_max=layer_max)
+
+        # The global equalization look-up table.
+        if parameter_object.equalize:
+
+            parameter_object.update_info(equalize_lut=get_equalize_lut(hist,
+                                                                       edges,
+                                                                       parameter_object.image_min,
+                                                                       parameter_object.image_max,
+                                                                       (0, 31) if parameter_object.trigger in ['pantex', 'lac'] else (0, 255)))
+
+        return parameter_object
+
     # Set the image minimum.
     if parameter_object.image_min == -999:
         parameter_object.update_info(image_min=0)
@@ -890,7 +1266,7 @@ def pad_array(parameter_object, array_section, n_rows, n_cols):
     # pad left and top
     if parameter_object.scales[-1] != parameter_object.block:
 
-        pad_len = (parameter_object.scales[-1] / 2) - (parameter_object.block / 2)
+        pad_len = get_block_offset(parameter_object)
 
         if (parameter_object.i_sect_blk_ctr == 1) and (parameter_object.j_sect_blk_ctr == 1):
 
@@ -4,19 +4,35 @@ from builtins import map
 
 import os
 import copy
+import time
 import fnmatch
+import itertools
+import threading
 import multiprocessing as multi
+from collections import namedtuple
+from future.moves.queue import Queue
 
 from .errors import logger, CorruptedBandsError
 from .sphelpers import sputilities
 from . import spsplit
 from .sphelpers import spreshape
+from .sphelpers import spstorage
+from .sphelpers import spcache
+from .sphelpers import spmask
+from .sphelpers import spshared
+from .sphelpers import spresults
+from .sphelpers import spcost
+from .sphelpers import spprogress
+from .sphelpers import spprofile
+from .sphelpers import sptune
+from .sphelpers import spapprox
+from .sphelpers import spindices
+from .sphelpers import spneighbors
 from .spfunctions import get_mag_avg, get_saliency_tile_mean, saliency, segment_image, get_dmp, get_orb_keypoints, convolve_gabor
 
 # MpGlue
 try:
-    from mpglue import raster_tools, VegIndicesEquations, vrt_builder
-    from mpglue import utils
+    from mpglue import raster_tools, vrt_builder
 except:
     logger.error('MpGlue must be installed')
     raise ImportError
@@ -41,6 +57,136 @@ try:
 except ImportError:
     raise ImportError('Scikit-learn must be installed')
 
+# Memory tracing (Python 3.4+)
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+# A section task. The run configuration is installed in
+#   each worker once, so tasks stay small and fixed in size.
+SectionTask = namedtuple('SectionTask', 'config_id section_counter i_sect j_sect coverage window_mask section_hash')
+
+# The result of a section task. The compute time
+#   is None when the features were not computed.
+SectionResult = namedtuple('SectionResult', 'section_counter is_corrupt seconds out_pixels')
+
+# Per-section lists that are carried by the tasks
+#   instead of the run configuration.
+_TASK_ATTRIBUTES = ['section_idx_pairs', 'section_coverage', 'section_masks', 'section_hashes', 'update_sections', 'cost_features']
+
+run_configs = dict()
+
+# The start signal of the concurrent autotune timing.
+tune_sync = None
+
+
+def get_run_config(parameter_object):
+
+    """
+    Gets the read-only run configuration of the current trigger and band
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        The configuration as a dictionary
+    """
+
+    return dict([(k, v) for k, v in viewitems(sputilities.class2dict(parameter_object))
+                 if (k not in _TASK_ATTRIBUTES) and not callable(v)])
+
+
+def get_section_tasks(parameter_object, config_id, section_list):
+
+    """
+    Gets the tasks of the current trigger and band
+
+    Args:
+        parameter_object (class)
+        config_id (int): The run configuration id.
+        section_list (list): The section counters.
+
+    Returns:
+        A list of `SectionTask`
+    """
+
+    section_tasks = list()
+
+    for section_counter in section_list:
+
+        i_sect, j_sect = parameter_object.section_idx_pairs[section_counter-1]
+
+        if parameter_object.skip_nodata:
+
+            coverage = parameter_object.section_coverage[section_counter-1]
+            window_mask = parameter_object.section_masks[section_counter-1]
+
+        else:
+
+            coverage = None
+            window_mask = None
+
+        if parameter_object.result_store:
+            section_hash = parameter_object.section_hashes['TL{:06}'.format(section_counter)]
+        else:
+            section_hash = None
+
+        section_tasks.append(SectionTask(config_id,
+                                         section_counter,
+                                         i_sect,
+                                         j_sect,
+                                         coverage,
+                                         window_mask,
+                                         section_hash))
+
+    return section_tasks
+
+
+def _init_worker(worker_configs, gdal_cache, n_jobs, section_ring=None):
+
+    """
+    Installs the run configurations in a worker process
+
+    Args:
+        worker_configs (dict): The run configurations, keyed by id.
+        gdal_cache (int)
+        n_jobs (int)
+        section_ring (Optional[`SectionRing` object]): The shared section buffers.
+    """
+
+    global run_configs, shared_ring
+
+    run_configs = worker_configs
+    shared_ring = section_ring
+
+    sputilities.set_gdal_cache(gdal_cache, n_jobs)
+
+
+def _get_task_parameters(section_task):
+
+    """Gets a parameter object for a section task"""
+
+    this_parameter_object_ = sputilities.dict2class(run_configs[section_task.config_id])
+
+    this_parameter_object_.update_info(section_counter=section_task.section_counter)
+
+    return this_parameter_object_
+
+
+def _get_section_result(section_counter, is_corrupt, section_record):
+
+    """Gets the `SectionResult` of a written (or skipped) section"""
+
+    if not section_record:
+        return SectionResult(section_counter, is_corrupt, None, 0)
+
+    return SectionResult(section_counter,
+                         is_corrupt,
+                         section_record.get('seconds', None),
+                         section_record['out_rows'] * section_record['out_cols'])
+
 
 def _write_section2file(this_parameter_object__,
                         meta_info,
@@ -49,7 +195,8 @@ def _write_section2file(this_parameter_object__,
                         j_sect,
                         out_rows,
                         out_cols,
-                        section_counter):
+                        section_counter,
+                        window_mask=None):
 
     """
     Writes the section array to disk
@@ -61,6 +208,8 @@ def _write_section2file(this_parameter_object__,
         i_sect (int)
         j_sect (int)
         section_counter (int)
+        window_mask (Optional[2d array]): The valid windows, which set the integer
+            storage range if the trigger has no shared range.
     """
     
     logger.info('  Writing section {:d} of {:d} to file ...'.format(section_counter,
@@ -80,10 +229,41 @@ def _write_section2file(this_parameter_object__,
 
         section2write = np.zeros((o_info.bands,
                                   o_info.rows,
-                                  o_info.cols), dtype='uint8')
+                                  o_info.cols), dtype='float32')
+
+    # Keep the float32 features for the quantization check.
+    o_section = section2write
 
     start_band = this_parameter_object__.band_info[this_parameter_object__.trigger] + this_parameter_object__.band_counter + 1
-    n_bands = this_parameter_object__.out_bands_dict[this_parameter_object__.trigger]
+    n_bands = spneighbors.get_tile_bands(this_parameter_object__, this_parameter_object__.trigger)
+
+    # Convert the features to the output storage.
+    trigger_storage = spstorage.get_trigger_storage(this_parameter_object__,
+                                                    this_parameter_object__.trigger)
+
+    tile_storage = spstorage.get_tile_storage(this_parameter_object__)
+
+    valid_mask = window_mask.astype('bool') if isinstance(window_mask, np.ndarray) else None
+
+    band_scales, band_offsets = spstorage.get_shared_scales(this_parameter_object__,
+                                                            this_parameter_object__.trigger,
+                                                            n_bands)
+
+    section2write, band_scales, band_offsets = spstorage.quantize_section(section2write,
+                                                                          trigger_storage,
+                                                                          tile_storage,
+                                                                          scales=band_scales,
+                                                                          offsets=band_offsets,
+                                                                          valid_mask=valid_mask)
+
+    if this_parameter_object__.check_storage and (tile_storage != 'float32'):
+
+        logger.info('  The maximum quantization error ({}) of section {:d} is {:.6f}'.format(tile_storage,
+                                                                                            section_counter,
+                                                                                            spstorage.quantization_error(o_section,
+                                                                                                                         section2write,
+                                                                                                                         band_scales,
+                                                                                                                         band_offsets)))
 
     if section2write[0].shape[0] == 0 or section2write[0].shape[1] == 0:
         pass
@@ -106,10 +286,13 @@ def _write_section2file(this_parameter_object__,
 
         else:
 
+            creation_options = spstorage.get_raster_storage(tile_storage)[1]
+
             # Create the output raster.
             with raster_tools.create_raster(this_parameter_object__.out_img,
                                             o_info,
-                                            bigtiff='yes') as out_raster:
+                                            bigtiff='yes',
+                                            **creation_options) as out_raster:
 
                 array_layer_counter = 0
 
@@ -123,6 +306,19 @@ def _write_section2file(this_parameter_object__,
 
         del out_raster
 
+        # Record the integer scales and offsets.
+        spstorage.set_band_scales(this_parameter_object__.out_img,
+                                  start_band,
+                                  band_scales,
+                                  band_offsets)
+
+        # Build the tile overviews in the worker while the
+        #   written blocks are still in the GDAL cache.
+        if this_parameter_object__.overviews:
+
+            spstorage.update_overviews(this_parameter_object__.out_img,
+                                       list(range(start_band, start_band+n_bands)))
+
     is_corrupt = False
 
     # The tile won't be written to file
@@ -144,191 +340,294 @@ def _write_section2file(this_parameter_object__,
     return is_corrupt
 
 
-def _section_read_write(section_counter):
+def _get_section_cache_key(this_parameter_object_, i_sect, j_sect, n_rows, n_cols):
 
     """
-    Handles the section reading and writing
+    Gets the section cache and the cache key of a prepared section
+
+    Only sections that are read from a band (or the RGB average) without
+    a trigger-specific transform are shared between triggers.
+
+    Args:
+        this_parameter_object_ (class)
+        i_sect (int)
+        j_sect (int)
+        n_rows (int)
+        n_cols (int)
+
+    Returns:
+        The section cache (or None), the cache key (or None)
+    """
+
+    if not this_parameter_object_.section_cache_dir:
+        return None, None
+
+    section_cache = spcache.SectionCache(this_parameter_object_.section_cache_dir,
+                                         this_parameter_object_.cache_size)
+
+    if this_parameter_object_.trigger in this_parameter_object_.spectral_indices + spsplit.DERIVED_TRIGGERS:
+
+        return section_cache, None
+
+    band_key = 'rgb' if this_parameter_object_.use_rgb else this_parameter_object_.band_position
+
+    cache_key = section_cache.get_key('prepared',
+                                      i_sect,
+                                      j_sect,
+                                      n_rows,
+                                      n_cols,
+                                      band_key,
+                                      this_parameter_object_.image_min,
+                                      this_parameter_object_.image_max,
+                                      spsplit.get_out_d_range(this_parameter_object_),
+                                      this_parameter_object_.equalize,
+                                      this_parameter_object_.equalize_adapt,
+                                      this_parameter_object_.smooth,
+                                      this_parameter_object_.global_stats)
+
+    return section_cache, cache_key
+
+
+def _get_result_store_key(this_parameter_object_, section_hash, i_sect, j_sect, n_rows, n_cols):
+
+    """
+    Gets the result store and the store key of a section
+
+    Args:
+        this_parameter_object_ (class)
+        section_hash (str)
+        i_sect (int)
+        j_sect (int)
+        n_rows (int)
+        n_cols (int)
+
+    Returns:
+        The result store (or None), the store key (or None)
+    """
+
+    if not this_parameter_object_.result_store:
+        return None, None
+
+    result_store = spresults.ResultStore(this_parameter_object_.result_store)
+
+    return result_store, result_store.get_key(this_parameter_object_,
+                                              section_hash,
+                                              i_sect,
+                                              j_sect,
+                                              n_rows,
+                                              n_cols)
+
+
+def _get_stored_features(this_parameter_object_, i_sect, j_sect, n_rows, n_cols, section_counter, section_hash):
+
+    """
+    Gets the stored features of a section from the result store or the legacy tiles
+
+    Fused spectral indices are only loaded if every index is stored.
 
     Args:
+        this_parameter_object_ (class)
+        i_sect (int)
+        j_sect (int)
+        n_rows (int)
+        n_cols (int)
         section_counter (int)
+        section_hash (str): The section checksum, or None without a result store.
+
+    Returns:
+        The result store (or None), the store key of each section trigger (or None),
+            the stored features (or None)
     """
 
-    section_pair = potsi[section_counter-1]
+    result_store = None
+    result_keys = list()
+    stored_list = list()
 
-    # this_parameter_object_ = this_parameter_object.copy()
-    this_parameter_object_ = copy.copy(param_dict)
-    this_parameter_object_ = sputilities.dict2class(this_parameter_object_)
+    for trigger in spindices.get_section_triggers(this_parameter_object_):
 
-    # Get the input image information.
-    with raster_tools.ropen(this_parameter_object_.input_image) as this_image_info:
+        trigger_parameter_object = copy.copy(this_parameter_object_)
+        trigger_parameter_object.update_info(trigger=trigger)
 
-        this_parameter_object_.update_info(section_counter=section_counter)
+        result_store, result_key = _get_result_store_key(trigger_parameter_object,
+                                                         section_hash,
+                                                         i_sect,
+                                                         j_sect,
+                                                         n_rows,
+                                                         n_cols)
 
-        # Set the output name.
-        this_parameter_object_ = sputilities.scale_fea_check(this_parameter_object_)
+        result_keys.append(result_key)
 
-        # Open the status YAML file.
-        mts_ = sputilities.ManageStatus()
+        stored_features = result_store.get(result_key) if result_key else None
 
-        # Load the status dictionary
-        mts_.load_status(this_parameter_object_.status_file)
+        if isinstance(stored_features, np.ndarray):
+            logger.info('  Loading section {:d} ({}) from the result store ...'.format(section_counter, trigger))
+        else:
 
-        # Check file status.
-        if os.path.isfile(this_parameter_object_.out_img):
+            stored_features = spresults.read_legacy_features(trigger_parameter_object,
+                                                             i_sect,
+                                                             j_sect,
+                                                             n_rows,
+                                                             n_cols)
 
-            if this_parameter_object_.out_img_base in mts_.status_dict:
+            if isinstance(stored_features, np.ndarray):
+                logger.info('  Loading section {:d} ({}) from the legacy tiles ...'.format(section_counter, trigger))
 
-                if this_parameter_object_.trigger in mts_.status_dict[this_parameter_object_.out_img_base]:
+        stored_list.append(stored_features)
 
-                    # Check every trigger because the
-                    #   entire file needs to be removed.
-                    status_list = [mts_.status_dict[this_parameter_object_.out_img_base]['{TR}-{BD}'.format(TR=tr,
-                                                                                                            BD=this_parameter_object_.band_position)]
-                                   for tr in this_parameter_object_.triggers]
+    if not result_store:
+        result_keys = None
 
-                    if 'corrupt' in status_list:
+    if all([isinstance(stored_features, np.ndarray) for stored_features in stored_list]):
 
-                        logger.info('Re-running {} ...'.format(this_parameter_object_.out_img))
+        if len(stored_list) == 1:
+            return result_store, result_keys, stored_list[0]
 
-                        # Remove the file on the first trigger
-                        #   if the file is corrupt.
-                        if this_parameter_object_.trigger == this_parameter_object_.triggers[0]:
-                            os.remove(this_parameter_object_.out_img)
+        return result_store, result_keys, np.concatenate(stored_list, axis=0)
 
-                        mts_.status_dict[this_parameter_object_.out_img_base]['{TR}-{BD}'.format(TR=this_parameter_object_.trigger,
-                                                                                                 BD=this_parameter_object_.band_position)] = 'incomplete'
-                        mts_.dump_status(this_parameter_object_.status_file)
+    return result_store, result_keys, None
 
-                    elif ('corrupt' not in status_list) and ('incomplete' in status_list):
 
-                        logger.info('Re-running {} ...'.format(this_parameter_object_.out_img))
+def _split_section_triggers(this_parameter_object_, out_section_array):
 
-                    else:
+    """
+    Splits the features of a section task into the features of each trigger
+
+    Args:
+        this_parameter_object_ (class)
+        out_section_array (3d array): The <features x rows x columns> section features.
 
-                        if this_parameter_object_.overwrite:
+    Returns:
+        A list of (trigger, features) pairs
+    """
 
-                            logger.info('Re-running {} ...'.format(this_parameter_object_.out_img))
+    trigger_features = list()
 
-                            # Remove the file on the first trigger.
-                            if this_parameter_object_.trigger == this_parameter_object_.triggers[0]:
-                                os.remove(this_parameter_object_.out_img)
+    start_band = 0
 
-                            mts_.status_dict[this_parameter_object_.out_img_base]['{TR}-{BD}'.format(TR=this_parameter_object_.trigger,
-                                                                                                     BD=this_parameter_object_.band_position)] = 'incomplete'
-                            mts_.dump_status(this_parameter_object_.status_file)
+    for trigger in spindices.get_section_triggers(this_parameter_object_):
 
-                        else:
+        n_bands = this_parameter_object_.out_bands_dict[trigger]
 
-                            logger.info('{} is already finished ...'.format(this_parameter_object_.out_img))
-                            return
+        trigger_features.append((trigger, out_section_array[start_band:start_band+n_bands]))
+
+        start_band += n_bands
+
+    return trigger_features
 
-            else:
 
-                # Remove the file on the first trigger.
-                if this_parameter_object_.trigger == this_parameter_object_.triggers[0]:
-                    os.remove(this_parameter_object_.out_img)
+def _read_luminosity(this_image_info, this_parameter_object_, i_sect, j_sect, n_rows, n_cols, section_cache):
 
-                logger.info('Re-running {} ...'.format(this_parameter_object_.out_img))
+    """
+    Reads the RGB average of a section, using the section cache if available
 
-        i_sect = section_pair[0]
-        j_sect = section_pair[1]
+    Args:
+        this_image_info (`ropen` object)
+        this_parameter_object_ (class)
+        i_sect (int)
+        j_sect (int)
+        n_rows (int)
+        n_cols (int)
+        section_cache (`SectionCache` object or None)
+    """
 
-        # Row and column section bounds checking
-        n_rows = raster_tools.n_rows_cols(i_sect,
-                                          this_parameter_object_.sect_row_size,
-                                          this_image_info.rows)
+    if section_cache:
 
-        n_cols = raster_tools.n_rows_cols(j_sect,
-                                          this_parameter_object_.sect_col_size,
-                                          this_image_info.cols)
+        cache_key = section_cache.get_key('luminosity',
+                                          i_sect,
+                                          j_sect,
+                                          n_rows,
+                                          n_cols,
+                                          this_parameter_object_.sat_sensor)
 
-        # Open the image array.
-        if this_parameter_object_.trigger in this_parameter_object_.spectral_indices:
+        luminosity = section_cache.get(cache_key)
 
-            wavelengths = utils.VI_WAVELENGTHS[this_parameter_object_.trigger.upper()]
+        if isinstance(luminosity, np.ndarray):
+            return luminosity
 
-            # Check if the sensor supports the spectral index
-            utils.sensor_wavelength_check(this_parameter_object_.sat_sensor,
-                                          wavelengths)
+    luminosity = sputilities.convert_rgb2gray(this_image_info,
+                                              i_sect,
+                                              j_sect,
+                                              n_rows,
+                                              n_cols,
+                                              this_parameter_object_.sat_sensor)[0]
 
-            # Get the band positions needed
-            #   to process the spectral index.
-            spectral_bands = utils.get_index_bands(this_parameter_object_.trigger.upper(),
-                                                   this_parameter_object_.sat_sensor)
+    if section_cache:
+        section_cache.put(cache_key, luminosity)
 
-            sect_in = this_image_info.read(bands2open=spectral_bands,
-                                           i=i_sect,
-                                           j=j_sect,
-                                           rows=n_rows,
-                                           cols=n_cols,
-                                           d_type='float32')
+    return luminosity
 
-            sect_in[sect_in >= this_parameter_object_.image_max] = this_parameter_object_.image_max
-            sect_in /= this_parameter_object_.image_max
 
-            vie = VegIndicesEquations(sect_in, chunk_size=-1)
-            sect_in = vie.compute(this_parameter_object_.trigger.upper(), out_type=1)
+def _read_section_array(this_image_info, this_parameter_object_, i_sect, j_sect, n_rows, n_cols, section_cache):
 
-            this_parameter_object_.update_info(image_min=0,
-                                               image_max=1)
+    """
+    Reads the input array of a section for the current trigger
 
-        elif this_parameter_object_.trigger == 'saliency':
+    Args:
+        this_image_info (`ropen` object)
+        this_parameter_object_ (class)
+        i_sect (int)
+        j_sect (int)
+        n_rows (int)
+        n_cols (int)
+        section_cache (`SectionCache` object or None)
 
-            sect_in = saliency(this_image_info,
-                               this_parameter_object_,
-                               i_sect,
-                               j_sect,
-                               n_rows,
-                               n_cols)
+    Returns:
+        The section array
+    """
 
-            this_parameter_object_.update_info(image_min=0,
-                                               image_max=255)
+    if this_parameter_object_.trigger in this_parameter_object_.spectral_indices:
 
-        elif this_parameter_object_.trigger == 'seg':
+        section_triggers = spindices.get_section_triggers(this_parameter_object_)
 
-            sect_in = this_image_info.read(bands2open=[1, 2, 3],
-                                           i=i_sect,
-                                           j=j_sect,
-                                           rows=n_rows,
-                                           cols=n_cols)
+        # Fused spectral indices are stacked as an
+        #   <indices x rows x columns> array.
+        sect_in = spindices.read_indices(this_image_info,
+                                         this_parameter_object_,
+                                         section_triggers,
+                                         i_sect,
+                                         j_sect,
+                                         n_rows,
+                                         n_cols)
 
-            sect_in = segment_image(sect_in, this_parameter_object_)
+        if len(section_triggers) == 1:
+            sect_in = sect_in[0]
 
-        elif this_parameter_object_.trigger == 'grad':
+        this_parameter_object_.update_info(image_min=0,
+                                           image_max=1)
 
-            if this_image_info.bands >= 3:
+    elif this_parameter_object_.trigger == 'saliency':
 
-                sect_in = sputilities.convert_rgb2gray(this_image_info,
-                                                       i_sect,
-                                                       j_sect,
-                                                       n_rows,
-                                                       n_cols,
-                                                       this_parameter_object_.sat_sensor)[0]
+        sect_in = saliency(this_image_info,
+                           this_parameter_object_,
+                           i_sect,
+                           j_sect,
+                           n_rows,
+                           n_cols)
 
-            else:
+        this_parameter_object_.update_info(image_min=0,
+                                           image_max=255)
 
-                sect_in = this_image_info.read(bands2open=this_parameter_object_.band_position,
-                                               i=i_sect,
-                                               j=j_sect,
-                                               rows=n_rows,
-                                               cols=n_cols)
+    elif this_parameter_object_.trigger == 'seg':
 
-            sect_in = np.uint8(rescale_intensity(sect_in,
-                                                 in_range=(this_parameter_object_.image_min,
-                                                           this_parameter_object_.image_max),
-                                                 out_range=(0, 255)))
+        sect_in = this_image_info.read(bands2open=[1, 2, 3],
+                                       i=i_sect,
+                                       j=j_sect,
+                                       rows=n_rows,
+                                       cols=n_cols)
 
-            sect_in = get_mag_avg(sect_in)
+        sect_in = segment_image(sect_in, this_parameter_object_)
 
-        elif this_parameter_object_.use_rgb and this_parameter_object_.trigger \
-                not in this_parameter_object_.spectral_indices + ['grad', 'saliency', 'seg']:
+    elif this_parameter_object_.trigger == 'grad':
 
-            sect_in = sputilities.convert_rgb2gray(this_image_info,
-                                                   i_sect,
-                                                   j_sect,
-                                                   n_rows,
-                                                   n_cols,
-                                                   this_parameter_object_.sat_sensor)[0]
+        if this_image_info.bands >= 3:
+
+            sect_in = _read_luminosity(this_image_info,
+                                       this_parameter_object_,
+                                       i_sect,
+                                       j_sect,
+                                       n_rows,
+                                       n_cols,
+                                       section_cache)
 
         else:
 
@@ -338,386 +637,2308 @@ def _section_read_write(section_counter):
                                            rows=n_rows,
                                            cols=n_cols)
 
-        if this_parameter_object_.trigger == 'dmp':
-
-            # The Differential Morphological Profile
-            #   is a [D x M x N] array
-            # where,
-            #   D = the opening/closing derivative.
-            sect_in = get_dmp(sect_in,
-                              this_parameter_object_.image_min,
-                              this_parameter_object_.image_max)
-
-        if this_parameter_object_.trigger == 'gabor':
-
-            sect_in = convolve_gabor(sect_in,
-                                     this_parameter_object_.image_min,
-                                     this_parameter_object_.image_max,
-                                     this_parameter_object_.scales)
+        sect_in = np.uint8(rescale_intensity(sect_in,
+                                             in_range=(this_parameter_object_.image_min,
+                                                       this_parameter_object_.image_max),
+                                             out_range=(0, 255)))
 
-        if this_parameter_object_.trigger == 'orb':
+        sect_in = get_mag_avg(sect_in)
 
-            sect_in = get_orb_keypoints(sect_in,
-                                        this_parameter_object_.image_min,
-                                        this_parameter_object_.image_max)
+    elif this_parameter_object_.use_rgb and this_parameter_object_.trigger \
+            not in this_parameter_object_.spectral_indices + ['grad', 'saliency', 'seg']:
 
-        this_parameter_object_.update_info(i_sect_blk_ctr=1,
-                                           j_sect_blk_ctr=1)
+        sect_in = _read_luminosity(this_image_info,
+                                   this_parameter_object_,
+                                   i_sect,
+                                   j_sect,
+                                   n_rows,
+                                   n_cols,
+                                   section_cache)
 
-        if this_parameter_object_.trigger == 'gabor':
-            l_rows, l_cols = sect_in[0].shape
-        else:
-            l_rows, l_cols = sect_in.shape
-
-        # Compute section statistics.
-        section_stats_array = spsplit.get_section_stats(sect_in,
-                                                        l_rows,
-                                                        l_cols,
-                                                        this_parameter_object_,
-                                                        section_counter)
-
-        # Get the section output rows and columns.
-        out_rows, out_cols = spsplit.get_out_dims(l_rows,
-                                                  l_cols,
-                                                  this_parameter_object_)
-
-        # Reshape the list of features into
-        #   <features x rows x columns> array.
-        out_section_array = spreshape.reshape_feature_list(section_stats_array,
-                                                           out_rows,
-                                                           out_cols,
-                                                           this_parameter_object_)
-
-        is_corrupt = _write_section2file(this_parameter_object_,
-                                         this_image_info,
-                                         out_section_array,
-                                         i_sect,
-                                         j_sect,
-                                         out_rows,
-                                         out_cols,
-                                         section_counter)
+    else:
 
-    this_parameter_object_ = None
-    this_image_info_ = None
+        sect_in = this_image_info.read(bands2open=this_parameter_object_.band_position,
+                                       i=i_sect,
+                                       j=j_sect,
+                                       rows=n_rows,
+                                       cols=n_cols)
 
-    return is_corrupt
+    return sect_in
 
 
-def run(parameter_object):
+def _read_section(section_task, this_image_info):
 
     """
+    Reads a section (the first processing stage)
+
     Args:
-        input_image, output_dir, band_positions=[1], use_rgb=False, block=2, scales=[8], triggers=['mean'],
-        threshold=20, min_len=10, line_gap=2, weighted=False, sfs_thresh=80, resamp_sfs=0.,
-        equalize=False, equalize_adapt=False, smooth=0, visualize=False, convert_stk=False, gdal_cache=256,
-        do_pca=False, stack_feas=True, stack_only=False, neighbors=False, n_jobs=-1,
-        reset_sects=False, image_max=0, lac_r=2, section_size=8000, chunk_size=512
-    """
+        section_task (`SectionTask`)
+        this_image_info (`ropen` object)
 
-    global potsi, param_dict
+    Returns:
+        The section record as a dictionary, or None if the section is finished or entirely no-data
+    """
 
-    if parameter_object.n_jobs == 0:
-        parameter_object.n_jobs = 1
-    elif parameter_object.n_jobs < 0:
-        parameter_object.n_jobs = multi.cpu_count()
-    elif parameter_object.n_jobs > multi.cpu_count():
-        parameter_object.n_jobs = multi.cpu_count()
+    section_counter = section_task.section_counter
 
-    # It is assumed in various places that the scales are sorted
-    parameter_object.scales.sort()
+    this_parameter_object_ = _get_task_parameters(section_task)
 
-    sputilities.parameter_checks(parameter_object)
+    # Set the output name.
+    this_parameter_object_ = sputilities.scale_fea_check(this_parameter_object_)
 
-    # Write the parameters to file.
-    sputilities.write_log(parameter_object)
+    # Open the status YAML file.
+    mts_ = sputilities.ManageStatus()
 
-    if parameter_object.stack_only:
+    # Load the status dictionary
+    mts_.load_status(this_parameter_object_.status_file)
 
-        with raster_tools.ropen(parameter_object.input_image) as i_info:
+    # Check file status.
+    if os.path.isfile(this_parameter_object_.out_img):
 
-            # Get image statistics.
-            parameter_object = sputilities.get_stats(i_info, parameter_object)
+        if this_parameter_object_.out_img_base in mts_.status_dict:
 
-            # Get the section size.
-            parameter_object = sputilities.get_section_size(i_info, parameter_object)
+            if this_parameter_object_.trigger in mts_.status_dict[this_parameter_object_.out_img_base]:
 
-            # Get the number of sections in
-            #   the image (only used as a counter).
-            parameter_object = sputilities.get_n_sects(i_info, parameter_object)
+                # Check every trigger because the
+                #   entire file needs to be removed.
+                status_list = [mts_.status_dict[this_parameter_object_.out_img_base]['{TR}-{BD}'.format(TR=tr,
+                                                                                                        BD=this_parameter_object_.band_position)]
+                               for tr in this_parameter_object_.triggers]
 
-        i_info = None
+                if 'corrupt' in status_list:
 
-        new_feas_list = list()
+                    logger.info('Re-running {} ...'.format(this_parameter_object_.out_img))
 
-        # If prompted, stack features without processing.
-        parameter_object = sputilities.stack_features(parameter_object,
-                                                      new_feas_list)
+                    # Remove the file on the first trigger
+                    #   if the file is corrupt.
+                    if this_parameter_object_.trigger == this_parameter_object_.triggers[0]:
+                        os.remove(this_parameter_object_.out_img)
 
-    else:
+                    mts_.status_dict[this_parameter_object_.out_img_base]['{TR}-{BD}'.format(TR=this_parameter_object_.trigger,
+                                                                                             BD=this_parameter_object_.band_position)] = 'incomplete'
+                    mts_.dump_status(this_parameter_object_.status_file)
 
-        # Create the status object.
-        mts = sputilities.ManageStatus()
+                elif ('corrupt' not in status_list) and ('incomplete' in status_list):
 
-        parameter_object.remove_files = False
+                    logger.info('Re-running {} ...'.format(this_parameter_object_.out_img))
 
-        # Setup the status dictionary.
-        if os.path.isfile(parameter_object.status_file):
+                else:
 
-            mts.load_status(parameter_object.status_file)
+                    if this_parameter_object_.overwrite:
 
-            if parameter_object.section_size != mts.status_dict['SECTION_SIZE']:
+                        logger.info('Re-running {} ...'.format(this_parameter_object_.out_img))
 
-                logger.warning('The section size was changed, so all existing tiled images will be removed.')
+                        # Remove the file on the first trigger.
+                        if this_parameter_object_.trigger == this_parameter_object_.triggers[0]:
+                            os.remove(this_parameter_object_.out_img)
 
-                parameter_object.remove_files = True
+                        mts_.status_dict[this_parameter_object_.out_img_base]['{TR}-{BD}'.format(TR=this_parameter_object_.trigger,
+                                                                                                 BD=this_parameter_object_.band_position)] = 'incomplete'
+                        mts_.dump_status(this_parameter_object_.status_file)
 
-            if not isinstance(mts.status_dict, dict):
+                    else:
 
-                logger.error('The YAML file already existed, but was not properly stored and saved.\nPlease remove and re-run.')
-                raise AttributeError
+                        logger.info('{} is already finished ...'.format(this_parameter_object_.out_img))
+                        return None
 
         else:
 
-            mts.status_dict = dict()
+            # Remove the file on the first trigger.
+            if this_parameter_object_.trigger == this_parameter_object_.triggers[0]:
+                os.remove(this_parameter_object_.out_img)
 
-            mts.status_dict['ALL_FINISHED'] = 'no'
-            mts.status_dict['BAND_ORDER'] = dict()
+            logger.info('Re-running {} ...'.format(this_parameter_object_.out_img))
 
-            # Save the band order.
-            for trigger in parameter_object.triggers:
+    i_sect = section_task.i_sect
+    j_sect = section_task.j_sect
 
-                mts.status_dict['BAND_ORDER']['{}'.format(trigger)] = '{:d}-{:d}'.format(parameter_object.band_info[trigger]+1,
-                                                                                         parameter_object.band_info[trigger]+parameter_object.out_bands_dict[trigger]*parameter_object.n_bands)
+    # Row and column section bounds checking
+    n_rows = raster_tools.n_rows_cols(i_sect,
+                                      this_parameter_object_.sect_row_size,
+                                      this_image_info.rows)
 
-            mts.status_dict['SECTION_SIZE'] = parameter_object.section_size
+    n_cols = raster_tools.n_rows_cols(j_sect,
+                                      this_parameter_object_.sect_col_size,
+                                      this_image_info.cols)
 
-            mts.dump_status(parameter_object.status_file)
+    window_mask = None
 
-        process_image = True
+    # Get the windows that hold valid data.
+    if this_parameter_object_.skip_nodata:
 
-        if 'ALL_FINISHED' in mts.status_dict:
+        section_coverage = section_task.coverage
 
-            if mts.status_dict['ALL_FINISHED'] == 'yes':
-                process_image = False
+        if section_coverage == 0:
 
-        # Set the output features folder.
-        parameter_object = sputilities.set_feas_dir(parameter_object)
+            logger.info('  Section {:d} is entirely no-data ...'.format(section_counter))
+            return None
 
-        if parameter_object.remove_files:
+        elif section_coverage < 1:
 
-            image_list = fnmatch.filter(os.listdir(parameter_object.feas_dir), '*.tif')
+            # The mask from the coverage scan
+            window_mask = section_task.window_mask
 
-            if image_list:
+    # Check the result store for already computed features.
+    result_store, result_keys, stored_features = _get_stored_features(this_parameter_object_,
+                                                                      i_sect,
+                                                                      j_sect,
+                                                                      n_rows,
+                                                                      n_cols,
+                                                                      section_counter,
+                                                                      section_task.section_hash)
 
-                image_list = [os.path.join(parameter_object.feas_dir, im_) for im_ in image_list]
+    if isinstance(stored_features, np.ndarray):
 
-                for full_image in image_list:
-                    os.remove(full_image)
+        return dict(section_counter=section_counter,
+                    config_id=section_task.config_id,
+                    parameter_object=this_parameter_object_,
+                    i_sect=i_sect,
+                    j_sect=j_sect,
+                    sect_in=None,
+                    is_prepared=False,
+                    section_cache=None,
+                    cache_key=None,
+                    window_mask=window_mask,
+                    result_store=result_store,
+                    result_keys=result_keys,
+                    out_section_array=stored_features,
+                    out_rows=stored_features.shape[1],
+                    out_cols=stored_features.shape[2])
 
-        if not process_image:
-            logger.warning('The input image, {}, is set as finished processing.'.format(parameter_object.input_image))
-        else:
+    # Check the cache for an already prepared section.
+    section_cache, cache_key = _get_section_cache_key(this_parameter_object_,
+                                                      i_sect,
+                                                      j_sect,
+                                                      n_rows,
+                                                      n_cols)
 
-            original_band_positions = copy.copy(parameter_object.band_positions)
+    sect_in = section_cache.get(cache_key) if cache_key else None
 
-            # Iterate over each feature trigger.
-            for trigger in parameter_object.triggers:
+    is_prepared = True if isinstance(sect_in, np.ndarray) else False
 
-                parameter_object.update_info(trigger=trigger,
-                                             band_positions=original_band_positions,
-                                             band_counter=0)
+    # Open the image array.
+    if is_prepared:
+        logger.info('  Loading section {:d} from the section cache ...'.format(section_counter))
+    else:
 
-                # Iterate over each band
-                for band_position in parameter_object.band_positions:
+        sect_in = _read_section_array(this_image_info,
+                                      this_parameter_object_,
+                                      i_sect,
+                                      j_sect,
+                                      n_rows,
+                                      n_cols,
+                                      section_cache)
+
+    return dict(section_counter=section_counter,
+                config_id=section_task.config_id,
+                parameter_object=this_parameter_object_,
+                i_sect=i_sect,
+                j_sect=j_sect,
+                sect_in=sect_in,
+                is_prepared=is_prepared,
+                section_cache=section_cache,
+                cache_key=cache_key,
+                window_mask=window_mask,
+                result_store=result_store,
+                result_keys=result_keys)
+
+
+def _compute_section(section_record):
 
-                    parameter_object.update_info(band_position=band_position)
+    """
+    Computes the features of a section (the second processing stage)
 
-                    # Get the input image information.
-                    with raster_tools.ropen(parameter_object.input_image) as i_info:
+    Args:
+        section_record (dict): The section record from `_read_section`.
 
-                        # Check if any of the input
-                        #   bands are corrupted.
-                        i_info.check_corrupted_bands()
+    Returns:
+        The section record, with the features in place of the input array
+    """
 
-                        if i_info.corrupted_bands:
+    # The features were loaded from the result store.
+    if isinstance(section_record.get('out_section_array'), np.ndarray):
+        return section_record
 
-                            logger.error('\nThe following bands appear to be corrupted:\n{}'.format(', '.join(i_info.corrupted_bands)))
-                            raise CorruptedBandsError
+    if spprofile.is_profiled(section_record['parameter_object']):
 
-                        # Get image statistics.
-                        parameter_object = sputilities.get_stats(i_info, parameter_object)
+        section_record = spprofile.profile_call(section_record['parameter_object'],
+                                                _compute_features,
+                                                section_record)
 
-                        # Get the section size.
-                        parameter_object = sputilities.get_section_size(i_info, parameter_object)
+        # Profiled times are not representative.
+        section_record['seconds'] = None
 
-                        # Get the number of sections in
-                        #   the image (only used as a counter).
-                        parameter_object = sputilities.get_n_sects(i_info, parameter_object)
+        return section_record
 
-                        if parameter_object.trigger == 'saliency':
+    return _compute_features(section_record)
 
-                            bp = raster_tools.BlockFunc(get_saliency_tile_mean,
-                                                        [i_info],
-                                                        None,
-                                                        None,
-                                                        band_list=[[1, 2, 3]],
-                                                        d_types=['float32'],
-                                                        write_array=False,
-                                                        close_files=False,
-                                                        be_quiet=True,
-                                                        print_statement='\nGetting tile lab means for saliency',
-                                                        out_attributes=['lab_means'],
-                                                        block_rows=parameter_object.sect_row_size,
-                                                        block_cols=parameter_object.sect_col_size,
-                                                        min_max=[(parameter_object.image_min,
-                                                                  parameter_object.image_max)]*3,
-                                                        vis_order=parameter_object.vis_order)
 
-                            bp.run()
+def _compute_features(section_record):
 
-                            parameter_object.update_info(lab_means=np.array(bp.lab_means,
-                                                                            dtype='float32').mean(axis=0))
+    """
+    Computes the features of a section array
 
-                    del i_info
+    Args:
+        section_record (dict): The section record from `_read_section`.
 
-                    mts = sputilities.ManageStatus()
-                    mts.load_status(parameter_object.status_file)
+    Returns:
+        The section record, with the features in place of the input array
+    """
 
-                    for sect_counter in range(1, parameter_object.n_sects+1):
+    start_time = time.time()
 
-                        parameter_object.update_info(section_counter=sect_counter)
-                        parameter_object = sputilities.scale_fea_check(parameter_object)
+    this_parameter_object_ = section_record['parameter_object']
+    section_counter = section_record['section_counter']
+    sect_in = section_record['sect_in']
+    is_prepared = section_record['is_prepared']
+    section_cache = section_record['section_cache']
+    cache_key = section_record['cache_key']
+    window_mask = section_record['window_mask']
 
-                        if trigger == parameter_object.triggers[0]:
-                            mts.status_dict[parameter_object.out_img_base] = dict()
+    if this_parameter_object_.trigger == 'dmp':
 
-                        mts.status_dict[parameter_object.out_img_base]['{TR}-{BD}'.format(TR=parameter_object.trigger,
-                                                                                          BD=parameter_object.band_position)] = 'unprocessed'
+        # The Differential Morphological Profile
+        #   is a [D x M x N] array
+        # where,
+        #   D = the opening/closing derivative.
+        sect_in = get_dmp(sect_in,
+                          this_parameter_object_.image_min,
+                          this_parameter_object_.image_max)
 
-                    mts.dump_status(parameter_object.status_file)
+    if this_parameter_object_.trigger == 'gabor':
 
-                    param_dict = sputilities.class2dict(parameter_object)
-                    potsi = parameter_object.section_idx_pairs
+        sect_in = convolve_gabor(sect_in,
+                                 this_parameter_object_.image_min,
+                                 this_parameter_object_.image_max,
+                                 this_parameter_object_.scales)
 
-                    # PROCESS IN PARALLEL CHUNKS
+    if this_parameter_object_.trigger == 'orb':
 
-                    parallel_chunk_counter = 1
+        sect_in = get_orb_keypoints(sect_in,
+                                    this_parameter_object_.image_min,
+                                    this_parameter_object_.image_max)
 
-                    for parallel_chunk in range(1,
-                                                parameter_object.n_sects+parameter_object.n_jobs,
-                                                parameter_object.n_jobs):
+    this_parameter_object_.update_info(i_sect_blk_ctr=1,
+                                       j_sect_blk_ctr=1)
 
-                        if parallel_chunk + parameter_object.n_jobs < parameter_object.n_sects:
-                            parallel_chunk_end = parallel_chunk + parameter_object.n_jobs
-                        else:
-                            parallel_chunk_end = parallel_chunk + (parameter_object.n_sects - parallel_chunk) + 1
+    # Gabor responses and fused spectral indices are stacked.
+    if (this_parameter_object_.trigger == 'gabor') or \
+            (this_parameter_object_.trigger in this_parameter_object_.spectral_indices and sect_in.ndim == 3):
 
-                        # Testing
-                        # results = list(map(_section_read_write, range(parallel_chunk, parallel_chunk_end)))
+        l_rows, l_cols = sect_in[0].shape
 
-                        pool = multi.Pool(processes=parameter_object.n_jobs)
+    else:
+        l_rows, l_cols = sect_in.shape
 
-                        results = pool.map(_section_read_write,
-                                           range(parallel_chunk,
-                                                 parallel_chunk_end))
+    # Prepare the section once so that
+    #   later triggers can load it.
+    if cache_key and not is_prepared:
 
-                        pool.close()
-                        pool.join()
-                        pool = None
+        sect_in = spsplit.prepare_section(sect_in,
+                                          l_rows,
+                                          l_cols,
+                                          this_parameter_object_)
 
-                        logger.info('  Updating status ...')
+        section_cache.put(cache_key, sect_in)
 
-                        for result in results:
+        is_prepared = True
 
-                            parameter_object.update_info(section_counter=parallel_chunk_counter)
-                            parameter_object = sputilities.scale_fea_check(parameter_object)
+    # Compute section statistics.
+    section_stats_array = spsplit.get_section_stats(sect_in,
+                                                    l_rows,
+                                                    l_cols,
+                                                    this_parameter_object_,
+                                                    section_counter,
+                                                    prepared=is_prepared,
+                                                    window_mask=window_mask)
 
-                            # Open the status YAML file.
-                            mts = sputilities.ManageStatus()
+    # Get the section output rows and columns.
+    out_rows, out_cols = spsplit.get_out_dims(l_rows,
+                                              l_cols,
+                                              this_parameter_object_)
 
-                            # Load the status dictionary
-                            mts.load_status(parameter_object.status_file)
+    # Reshape the list of features into
+    #   <features x rows x columns> array.
+    out_section_array = spreshape.reshape_feature_list(section_stats_array,
+                                                       out_rows,
+                                                       out_cols,
+                                                       this_parameter_object_)
 
-                            if parameter_object.out_img_base in mts.status_dict:
+    # Masked windows are not written.
+    if isinstance(window_mask, np.ndarray):
+        out_section_array[:, window_mask == 0] = 0
 
-                                if result:
+    if section_record['result_keys']:
 
-                                    mts.status_dict[parameter_object.out_img_base]['{TR}-{BD}'.format(TR=parameter_object.trigger,
-                                                                                                      BD=parameter_object.band_position)] = 'corrupt'
+        # Fused spectral indices are stored one trigger at a time.
+        for result_key, (trigger, trigger_features) in zip(section_record['result_keys'],
+                                                           _split_section_triggers(this_parameter_object_,
+                                                                                   out_section_array)):
 
-                                else:
+            section_record['result_store'].put(result_key, trigger_features)
 
-                                    mts.status_dict[parameter_object.out_img_base]['{TR}-{BD}'.format(TR=parameter_object.trigger,
-                                                                                                      BD=parameter_object.band_position)] = 'complete'
+    section_record.update(sect_in=None,
+                          out_section_array=out_section_array,
+                          out_rows=out_rows,
+                          out_cols=out_cols,
+                          seconds=time.time() - start_time)
 
-                            mts.dump_status(parameter_object.status_file)
+    return section_record
 
-                            parallel_chunk_counter += 1
 
-                    # Parallel(n_jobs=parameter_object.n_jobs,
-                    #          batch_size=1,
-                    #          max_nbytes=None)(delayed(_section_read_write)(idx_pair,
-                    #                                                        parameter_object.section_idx_pairs[idx_pair-1],
-                    #                                                        param_dict)
-                    #                           for idx_pair in range(1, parameter_object.n_sects+1))
+def _write_section(section_record, this_image_info):
 
-                    parameter_object.band_counter += parameter_object.out_bands_dict[parameter_object.trigger]
+    """
+    Writes the features of a section (the last processing stage)
 
-        # Check the corruption status.
-        mts.load_status(parameter_object.status_file)
+    Args:
+        section_record (dict): The section record from `_compute_section`.
+        this_image_info (`ropen` object)
 
-        n_corrupt = 0
-        for k, v in viewitems(mts.status_dict):
+    Returns:
+        Whether the output tile is corrupt
+    """
 
-            if isinstance(v, dict):
+    is_corrupt = False
 
-                for ksub, vsub in viewitems(v):
+    # Fused spectral indices are written to
+    #   the bands of each trigger.
+    for trigger, trigger_features in _split_section_triggers(section_record['parameter_object'],
+                                                             section_record['out_section_array']):
 
-                    if vsub in ['corrupt', 'incomplete']:
-                        n_corrupt += 1
+        trigger_parameter_object = copy.copy(section_record['parameter_object'])
+        trigger_parameter_object.update_info(trigger=trigger)
 
-        if n_corrupt == 0:
+        # The neighbor copies are shifted copies of the features.
+        if trigger_parameter_object.neighbors:
+            trigger_features = spneighbors.add_neighbors(trigger_features)
 
-            mts.status_dict['ALL_FINISHED'] = 'yes'
-            mts.dump_status(parameter_object.status_file)
+        if _write_section2file(trigger_parameter_object,
+                               this_image_info,
+                               trigger_features,
+                               section_record['i_sect'],
+                               section_record['j_sect'],
+                               section_record['out_rows'],
+                               section_record['out_cols'],
+                               section_record['section_counter'],
+                               window_mask=section_record.get('window_mask')):
 
-            # Finally, mosaic the image tiles.
+            is_corrupt = True
 
-            logger.info('  Creating the VRT mosaic ...')
+    return is_corrupt
 
-            comp_dict = dict()
 
-            # Get the image list.
-            parameter_object = sputilities.scale_fea_check(parameter_object, is_image=False)
+def _section_read_write(section_task):
 
-            image_list = fnmatch.filter(os.listdir(parameter_object.feas_dir), parameter_object.search_wildcard)
-            image_list = [os.path.join(parameter_object.feas_dir, im) for im in image_list]
+    """
+    Handles the section reading and writing
 
-            comp_dict['001'] = image_list
+    Args:
+        section_task (`SectionTask`)
 
-            vrt_mosaic = parameter_object.status_file.replace('.yaml', '.vrt')
+    Returns:
+        A `SectionResult`
+    """
 
-            vrt_builder(comp_dict,
-                        vrt_mosaic,
-                        force_type='float32',
-                        be_quiet=True,
-                        overwrite=True,
-                        relative_path=parameter_object.relative_path)
+    input_image = run_configs[section_task.config_id]['input_image']
 
-            if parameter_object.overviews:
+    # Get the input image information.
+    with raster_tools.ropen(input_image) as this_image_info:
 
-                logger.info('\nBuilding VRT overviews ...')
+        section_record = _read_section(section_task, this_image_info)
 
-                with raster_tools.ropen(vrt_mosaic, open2read=False) as vrt_info:
+        if section_record:
 
-                    vrt_info.remove_overviews()
-                    vrt_info.build_overviews(levels=[2, 4, 8, 16])
+            section_record = _compute_section(section_record)
 
-                del vrt_info
+            is_corrupt = _write_section(section_record, this_image_info)
 
         else:
+            is_corrupt = False
 
-            if n_corrupt == 1:
-                logger.warning('\nThere was {:d} corrupt or incomplete tile.\nRe-run the command with the same parameters.'.format(n_corrupt))
-            else:
-                logger.warning('\nThere were {:d} corrupt or incomplete tiles.\nRe-run the command with the same parameters.'.format(n_corrupt))
+    this_image_info = None
+
+    return _get_section_result(section_task.section_counter, is_corrupt, section_record)
+
+
+def _get_queue_depths(parameter_object):
+
+    """
+    Gets the read and write queue depths of the prefetch pipeline
+
+    The depths are bounded so that the estimated size of the queued
+    input sections and output features stays within `prefetch_mem`.
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        Read queue depth, write queue depth
+    """
+
+    read_bytes, write_bytes = spshared.get_section_bytes(parameter_object)
+
+    # Half of the memory cap for each queue.
+    queue_bytes = parameter_object.prefetch_mem * 1024 * 1024 / 2
+
+    read_depth = max(1, min(parameter_object.prefetch, int(queue_bytes / max(1, read_bytes))))
+    write_depth = max(1, min(parameter_object.prefetch, int(queue_bytes / max(1, write_bytes))))
+
+    return read_depth, write_depth
+
+
+def _section_batch_read_write(section_batch):
+
+    """
+    Handles the reading and writing of a batch of sections
+
+    A reader thread stages the next sections while the current section
+    is computed, and a writer thread flushes finished sections.
+
+    Args:
+        section_batch (list): The `SectionTask` tasks.
+
+    Returns:
+        A list of `SectionResult`, ordered as `section_batch`
+    """
+
+    this_parameter_object_ = _get_task_parameters(section_batch[0])
+
+    read_depth, write_depth = _get_queue_depths(this_parameter_object_)
+
+    read_queue = Queue(maxsize=read_depth)
+    write_queue = Queue(maxsize=write_depth)
+
+    batch_results = dict()
+    batch_errors = list()
+
+    def _reader():
+
+        try:
+
+            with raster_tools.ropen(this_parameter_object_.input_image) as reader_info:
+
+                for task_index, section_task in enumerate(section_batch):
+
+                    if batch_errors:
+                        break
+
+                    read_queue.put((task_index, _read_section(section_task, reader_info)))
+
+        except Exception as e:
+            batch_errors.append(e)
+
+        read_queue.put(None)
+
+    def _writer():
+
+        with raster_tools.ropen(this_parameter_object_.input_image) as writer_info:
+
+            while True:
+
+                queue_item = write_queue.get()
+
+                if queue_item is None:
+                    break
+
+                task_index, section_record = queue_item
+
+                try:
+
+                    batch_results[task_index] = _get_section_result(section_batch[task_index].section_counter,
+                                                                    _write_section(section_record, writer_info),
+                                                                    section_record)
+
+                except Exception as e:
+                    batch_errors.append(e)
+
+    reader_thread = threading.Thread(target=_reader)
+    writer_thread = threading.Thread(target=_writer)
+
+    reader_thread.daemon = True
+    writer_thread.daemon = True
+
+    reader_thread.start()
+    writer_thread.start()
+
+    try:
+
+        while True:
+
+            queue_item = read_queue.get()
+
+            if queue_item is None:
+                break
+
+            task_index, section_record = queue_item
+
+            if not section_record or batch_errors:
+
+                batch_results[task_index] = _get_section_result(section_batch[task_index].section_counter, False, None)
+                continue
+
+            write_queue.put((task_index, _compute_section(section_record)))
+
+    except Exception as e:
+
+        batch_errors.append(e)
+
+        # Let the reader finish.
+        while read_queue.get() is not None:
+            pass
+
+    write_queue.put(None)
+
+    reader_thread.join()
+    writer_thread.join()
+
+    if batch_errors:
+        raise batch_errors[0]
+
+    # The tasks of a batch may share a section (one task per trigger-band).
+    return [batch_results.get(task_index, _get_section_result(section_task.section_counter, False, None))
+            for task_index, section_task in enumerate(section_batch)]
+
+
+def _compute_shared(section_record, slot, in_shape, in_dtype):
+
+    """
+    Computes the features of a section held in shared memory
+
+    Args:
+        section_record (dict): The section record, without the parameters or the input array.
+        slot (int): The shared buffer slot.
+        in_shape (tuple): The input section shape.
+        in_dtype (str): The input section data type.
+
+    Returns:
+        The slot, the section record (or the raised exception)
+    """
+
+    try:
+
+        this_parameter_object_ = sputilities.dict2class(run_configs[section_record['config_id']])
+
+        this_parameter_object_.update_info(section_counter=section_record['section_counter'],
+                                           **section_record['parameter_updates'])
+
+        this_parameter_object_ = sputilities.scale_fea_check(this_parameter_object_)
+
+        section_record.update(parameter_object=this_parameter_object_,
+                              sect_in=shared_ring.get_input(slot, in_shape, in_dtype))
+
+        section_record = _compute_section(section_record)
+
+        out_shape, out_dtype = shared_ring.put_output(slot, section_record['out_section_array'])
+
+        section_record.update(parameter_object=None,
+                              out_section_array=None,
+                              out_shape=out_shape,
+                              out_dtype=out_dtype)
+
+        return slot, section_record
+
+    except Exception as e:
+        return slot, e
+
+
+def _single_reader_read_write(parameter_object, section_tasks):
+
+    """
+    Processes sections with one I/O process and shared-memory compute workers
+
+    The calling process reads sections in raster order into a ring of
+    shared buffers, the workers compute features in place, and the
+    calling process writes the finished features.
+
+    Args:
+        parameter_object (class)
+        section_tasks (list): The `SectionTask` tasks, in raster order.
+
+    Returns:
+        A list of `SectionResult`, ordered as `section_tasks`
+    """
+
+    n_slots, input_bytes, output_bytes = spshared.get_ring_size(parameter_object)
+
+    logger.info('  Processing with a single reader and {:d} shared section buffers ...'.format(n_slots))
+
+    section_ring = spshared.SectionRing(n_slots, input_bytes, output_bytes)
+
+    finished_queue = Queue()
+
+    section_results = dict()
+    section_parameters = dict()
+
+    pool = multi.Pool(processes=parameter_object.n_jobs,
+                      initializer=_init_worker,
+                      initargs=(run_configs,
+                                parameter_object.gdal_cache,
+                                parameter_object.n_jobs,
+                                section_ring))
+
+    n_pending = 0
+    is_reading = True
+    section_iter = iter(section_tasks)
+
+    try:
+
+        with raster_tools.ropen(parameter_object.input_image) as io_info:
+
+            while is_reading or (n_pending > 0):
+
+                # Read sections while there are free buffers.
+                while is_reading and section_ring.free_slots:
+
+                    try:
+                        section_task = next(section_iter)
+                    except StopIteration:
+
+                        is_reading = False
+                        break
+
+                    section_counter = section_task.section_counter
+
+                    section_record = _read_section(section_task, io_info)
+
+                    if not section_record:
+
+                        section_results[section_counter] = _get_section_result(section_counter, False, None)
+                        continue
+
+                    # Stored features go straight to the writer.
+                    if isinstance(section_record.get('out_section_array'), np.ndarray):
+
+                        section_results[section_counter] = _get_section_result(section_counter,
+                                                                               _write_section(section_record, io_info),
+                                                                               section_record)
+
+                        continue
+
+                    slot = section_ring.free_slots.pop()
+
+                    in_shape, in_dtype = section_ring.put_input(slot, section_record['sect_in'])
+
+                    this_parameter_object_ = section_record['parameter_object']
+
+                    section_parameters[section_counter] = this_parameter_object_
+
+                    # Only send what the worker cannot rebuild.
+                    section_record.update(parameter_object=None,
+                                          sect_in=None,
+                                          parameter_updates=dict(image_min=this_parameter_object_.image_min,
+                                                                 image_max=this_parameter_object_.image_max))
+
+                    pool.apply_async(_compute_shared,
+                                     (section_record, slot, in_shape, in_dtype),
+                                     callback=finished_queue.put)
+
+                    n_pending += 1
+
+                if n_pending == 0:
+                    continue
+
+                # Write a finished section and release its buffers.
+                slot, section_record = finished_queue.get()
+
+                n_pending -= 1
+
+                if isinstance(section_record, Exception):
+                    raise section_record
+
+                section_counter = section_record['section_counter']
+
+                section_record.update(parameter_object=section_parameters.pop(section_counter),
+                                      out_section_array=section_ring.get_output(slot,
+                                                                                section_record['out_shape'],
+                                                                                section_record['out_dtype']))
+
+                section_results[section_counter] = _get_section_result(section_counter,
+                                                                       _write_section(section_record, io_info),
+                                                                       section_record)
+
+                section_ring.free_slots.append(slot)
+
+    except:
+
+        pool.terminate()
+        raise
+
+    pool.close()
+    pool.join()
+    pool = None
+
+    return [section_results.get(section_task.section_counter, _get_section_result(section_task.section_counter, False, None))
+            for section_task in section_tasks]
+
+
+def _get_updated_sections(parameter_object, mts):
+
+    """
+    Finds the sections whose input changed since the last run
+
+    The section checksums are stored in the status dictionary.
+
+    Args:
+        parameter_object (class)
+        mts (`ManageStatus` object)
+
+    Returns:
+        A list of the changed section counters, or None if the
+            previous checksums are unknown (every section is processed)
+    """
+
+    with raster_tools.ropen(parameter_object.input_image) as i_info:
+
+        parameter_object = sputilities.get_section_size(i_info, parameter_object)
+        parameter_object = sputilities.get_n_sects(i_info, parameter_object)
+
+        section_hashes = spresults.get_section_hashes(i_info, parameter_object)
+
+    del i_info
+
+    # The checksums also key the result store.
+    parameter_object.update_info(section_hashes=section_hashes)
+
+    # Every section is processed when the finished tiles are archived.
+    if parameter_object.archive_tiles:
+
+        mts.status_dict['SECTION_HASHES'] = section_hashes
+
+        return None
+
+    updated_sections = spresults.get_changed_sections(mts.status_dict, section_hashes, parameter_object.n_sects)
+
+    if updated_sections is not None:
+
+        logger.info('  {:,d} of {:,d} sections have changed input.'.format(len(updated_sections),
+                                                                          parameter_object.n_sects))
+
+    return updated_sections
+
+
+def _setup_run(parameter_object):
+
+    """
+    Sets the worker count, checks the parameters and writes the log
+
+    Args:
+        parameter_object (class)
+    """
+
+    if parameter_object.n_jobs == 0:
+        parameter_object.n_jobs = 1
+    elif parameter_object.n_jobs < 0:
+        parameter_object.n_jobs = multi.cpu_count()
+    elif parameter_object.n_jobs > multi.cpu_count():
+        parameter_object.n_jobs = multi.cpu_count()
+
+    # It is assumed in various places that the scales are sorted
+    parameter_object.scales.sort()
+
+    sputilities.parameter_checks(parameter_object)
+
+    # The main process holds the full GDAL cache.
+    sputilities.set_gdal_cache(parameter_object.gdal_cache)
+
+    # Write the parameters to file.
+    sputilities.write_log(parameter_object)
+
+    if parameter_object.profile:
+        spprofile.setup_profiles(parameter_object)
+
+
+def _get_window_parameters(parameter_object, image_info, trigger, i_sect, j_sect, n_rows, n_cols):
+
+    """
+    Gets a copy of the parameters to compute one trigger on a sample window
+
+    Args:
+        parameter_object (class)
+        image_info (`ropen` object)
+        trigger (str)
+        i_sect (int): The window starting row.
+        j_sect (int): The window starting column.
+        n_rows (int)
+        n_cols (int)
+
+    Returns:
+        The window parameter object
+    """
+
+    window_parameter_object = copy.copy(parameter_object)
+
+    window_parameter_object.update_info(trigger=trigger,
+                                        band_position=parameter_object.band_positions[0],
+                                        section_counter=0,
+                                        n_sects=1,
+                                        sect_row_size=n_rows,
+                                        sect_col_size=n_cols,
+                                        result_store=None,
+                                        legacy_tiles=list(),
+                                        fused_triggers=None)
+
+    window_parameter_object = sputilities.get_stats(image_info, window_parameter_object)
+
+    if trigger == 'saliency':
+
+        lab_means = get_saliency_tile_mean([image_info.read(bands2open=[1, 2, 3],
+                                                            i=i_sect,
+                                                            j=j_sect,
+                                                            rows=n_rows,
+                                                            cols=n_cols)],
+                                           min_max=[(window_parameter_object.image_min,
+                                                     window_parameter_object.image_max)]*3,
+                                           vis_order=window_parameter_object.vis_order)[1]
+
+        window_parameter_object.update_info(lab_means=np.array(lab_means, dtype='float32'))
+
+    return window_parameter_object
+
+
+def _compute_window(window_parameter_object, image_info, i_sect, j_sect, n_rows, n_cols):
+
+    """
+    Reads a sample window and computes its features
+
+    Args:
+        window_parameter_object (class): The parameters from `_get_window_parameters`.
+        image_info (`ropen` object)
+        i_sect (int): The window starting row.
+        j_sect (int): The window starting column.
+        n_rows (int)
+        n_cols (int)
+
+    Returns:
+        The <features x rows x columns> array
+    """
+
+    sect_in = _read_section_array(image_info,
+                                  window_parameter_object,
+                                  i_sect,
+                                  j_sect,
+                                  n_rows,
+                                  n_cols,
+                                  None)
+
+    section_record = _compute_features(dict(section_counter=0,
+                                            parameter_object=window_parameter_object,
+                                            sect_in=sect_in,
+                                            is_prepared=False,
+                                            section_cache=None,
+                                            cache_key=None,
+                                            window_mask=None,
+                                            result_store=None,
+                                            result_keys=None))
+
+    return section_record['out_section_array']
+
+
+def _get_window_position(image_info, section_size, window_fraction):
+
+    """
+    Gets a representative window of a section size
+
+    Returns:
+        The window starting row and column, the window rows and columns
+    """
+
+    n_rows = min(section_size, image_info.rows)
+    n_cols = min(section_size, image_info.cols)
+
+    return int((image_info.rows - n_rows) * window_fraction[0]), \
+           int((image_info.cols - n_cols) * window_fraction[1]), \
+           n_rows, \
+           n_cols
+
+
+def _time_window(parameter_object, image_info, i_sect, j_sect, n_rows, n_cols, measure_mem=False):
+
+    """
+    Times the selected triggers on one sample window
+
+    Args:
+        parameter_object (class)
+        image_info (`ropen` object)
+        i_sect (int): The window starting row.
+        j_sect (int): The window starting column.
+        n_rows (int)
+        n_cols (int)
+        measure_mem (Optional[bool]): Whether to measure the peak memory.
+
+    Returns:
+        The time (seconds) of all triggers on one band, the peak memory (MB)
+    """
+
+    section_seconds = 0.
+    peak_mem = 0.
+
+    for trigger in parameter_object.triggers:
+
+        tune_parameter_object = _get_window_parameters(parameter_object,
+                                                       image_info,
+                                                       trigger,
+                                                       i_sect,
+                                                       j_sect,
+                                                       n_rows,
+                                                       n_cols)
+
+        if measure_mem:
+            tracemalloc.start()
+
+        start_time = time.time()
+
+        _compute_window(tune_parameter_object, image_info, i_sect, j_sect, n_rows, n_cols)
+
+        section_seconds += time.time() - start_time
+
+        if measure_mem:
+
+            peak_mem = max(peak_mem, tracemalloc.get_traced_memory()[1] / (1024. * 1024.))
+            tracemalloc.stop()
+
+    return section_seconds, peak_mem
+
+
+def _get_section_bands(parameter_object):
+
+    """Gets the number of bands that are processed for each section"""
+
+    return 1 if parameter_object.use_rgb else len(parameter_object.band_positions)
+
+
+def _time_section_size(parameter_object, image_info, section_size):
+
+    """
+    Times the selected triggers on representative windows of a section size
+
+    Args:
+        parameter_object (class)
+        image_info (`ropen` object)
+        section_size (int)
+
+    Returns:
+        The mean time (seconds) of one section for all triggers and bands,
+            the peak memory (MB) of one section
+    """
+
+    window_seconds = list()
+    peak_mem = 0.
+
+    for window_counter, window_fraction in enumerate(sptune.WINDOW_FRACTIONS):
+
+        i_sect, j_sect, n_rows, n_cols = _get_window_position(image_info, section_size, window_fraction)
+
+        # The first window measures memory, which
+        #   would slow the timing of the others.
+        measure_mem = (window_counter == 0) and (tracemalloc is not None)
+
+        section_seconds, window_mem = _time_window(parameter_object,
+                                                   image_info,
+                                                   i_sect,
+                                                   j_sect,
+                                                   n_rows,
+                                                   n_cols,
+                                                   measure_mem=measure_mem)
+
+        peak_mem = max(peak_mem, window_mem)
+
+        if (window_counter > 0) or (len(sptune.WINDOW_FRACTIONS) == 1):
+            window_seconds.append(section_seconds)
+
+    return float(np.mean(window_seconds)) * _get_section_bands(parameter_object), peak_mem
+
+
+def _init_tune_worker(tune_config, gdal_cache, n_jobs, n_ready, start_event):
+
+    """
+    Installs the tuning configuration and start signal in a worker process
+
+    Args:
+        tune_config (dict): The run configuration.
+        gdal_cache (int)
+        n_jobs (int)
+        n_ready (`multiprocessing.Value`): The number of workers that are ready.
+        start_event (`multiprocessing.Event`): Set once all workers are ready.
+    """
+
+    global tune_sync
+
+    tune_sync = (n_ready, start_event)
+
+    _init_worker({0: tune_config}, gdal_cache, n_jobs)
+
+
+def _time_concurrent_window(window_args):
+
+    """
+    Times a sample window once every worker holds its window
+
+    Args:
+        window_args (tuple): The section size, the window fraction.
+
+    Returns:
+        The time (seconds) of all triggers on one band
+    """
+
+    section_size, window_fraction = window_args
+
+    n_ready, start_event = tune_sync
+
+    tune_parameter_object = sputilities.dict2class(run_configs[0])
+
+    with raster_tools.ropen(tune_parameter_object.input_image) as tune_info:
+
+        i_sect, j_sect, n_rows, n_cols = _get_window_position(tune_info, section_size, window_fraction)
+
+        with n_ready.get_lock():
+            n_ready.value += 1
+
+        start_event.wait()
+
+        section_seconds = _time_window(tune_parameter_object, tune_info, i_sect, j_sect, n_rows, n_cols)[0]
+
+    del tune_info
+
+    return section_seconds
+
+
+def _time_concurrent_section_size(parameter_object, section_size, n_jobs):
+
+    """
+    Times a section size with several processes at once
+
+    Each process computes one representative window with its share of
+    the GDAL threads, as in a run with `n_jobs` processes, so the time
+    includes the contention for the cores, memory and GDAL threads.
+
+    Args:
+        parameter_object (class)
+        section_size (int)
+        n_jobs (int)
+
+    Returns:
+        The mean time (seconds) of one section for all triggers and bands
+    """
+
+    n_ready = multi.Value('i', 0)
+    start_event = multi.Event()
+
+    pool = multi.Pool(processes=n_jobs,
+                      initializer=_init_tune_worker,
+                      initargs=(get_run_config(parameter_object),
+                                parameter_object.gdal_cache,
+                                n_jobs,
+                                n_ready,
+                                start_event))
+
+    try:
+
+        # A worker blocks on its window until the start,
+        #   so each worker takes exactly one window.
+        window_results = [pool.apply_async(_time_concurrent_window,
+                                           ((section_size,
+                                             sptune.WINDOW_FRACTIONS[worker_counter % len(sptune.WINDOW_FRACTIONS)]),))
+                          for worker_counter in range(0, n_jobs)]
+
+        # A failed worker never becomes ready.
+        while (n_ready.value < n_jobs) and not any(window_result.ready() for window_result in window_results):
+            time.sleep(0.01)
+
+        start_event.set()
+
+        window_seconds = [window_result.get() for window_result in window_results]
+
+    except:
+
+        pool.terminate()
+        raise
+
+    pool.close()
+    pool.join()
+
+    return float(np.mean(window_seconds)) * _get_section_bands(parameter_object)
+
+
+def _autotune(parameter_object):
+
+    """
+    Sets the section size and the number of workers with the best predicted run time
+
+    The decision is appended to the log and reused by later
+    runs with the same input, triggers and parameters.
+
+    Args:
+        parameter_object (class)
+    """
+
+    with raster_tools.ropen(parameter_object.input_image) as i_info:
+
+        tune_key = sptune.get_tune_key(parameter_object, i_info.rows, i_info.cols)
+
+        tune_record = sptune.read_tune_record(parameter_object.log_txt, tune_key)
+
+        if tune_record:
+
+            section_size, n_jobs = tune_record
+
+            logger.info('  Reusing the tuned section size ({:d}) and number of processes ({:d}).'.format(section_size,
+                                                                                                         n_jobs))
+
+        else:
+
+            memory_budget = sptune.get_memory_budget(parameter_object)
+
+            size_timings = list()
+
+            for section_size in sptune.get_candidate_sizes(parameter_object, i_info.rows, i_info.cols):
+
+                logger.info('  Timing section size {:d} ...'.format(section_size))
+
+                section_seconds, peak_mem = _time_section_size(parameter_object, i_info, section_size)
+
+                logger.info('    {:.2f} seconds and {:,.0f} MB per section'.format(section_seconds, peak_mem))
+
+                # Time the most processes that fit in memory at once.
+                concurrent_jobs = sptune.get_concurrent_jobs(peak_mem, parameter_object.n_jobs, memory_budget)
+
+                if concurrent_jobs > 1:
+
+                    concurrent_seconds = _time_concurrent_section_size(parameter_object, section_size, concurrent_jobs)
+
+                    logger.info('    {:.2f} seconds per section with {:d} processes'.format(concurrent_seconds,
+                                                                                        concurrent_jobs))
+
+                else:
+                    concurrent_seconds = section_seconds
+
+                size_timings.append(dict(section_size=section_size,
+                                         n_sections=sptune.get_section_count(parameter_object,
+                                                                             i_info.rows,
+                                                                             i_info.cols,
+                                                                             section_size),
+                                         seconds=section_seconds,
+                                         concurrent_jobs=concurrent_jobs,
+                                         concurrent_seconds=concurrent_seconds,
+                                         peak_mem=peak_mem))
+
+            section_size, n_jobs, predicted_seconds = sptune.select_configuration(size_timings,
+                                                                                  parameter_object.n_jobs,
+                                                                                  memory_budget)
+
+            sptune.write_tune_record(parameter_object.log_txt, tune_key, section_size, n_jobs, predicted_seconds)
+
+            logger.info('  Autotune selected a section size of {:d} with {:d} processes ({:.1f} seconds predicted).'.format(section_size,
+                                                                                                                        n_jobs,
+                                                                                                                        predicted_seconds))
+
+    del i_info
+
+    parameter_object.update_info(section_size=section_size,
+                                 n_jobs=n_jobs)
+
+    # The main process holds the full GDAL cache.
+    sputilities.set_gdal_cache(parameter_object.gdal_cache)
+
+
+def _validate_approx(parameter_object):
+
+    """
+    Reports the approximated scales against exact scales on sample sections
+
+    Each approximated trigger is computed exactly and approximately on the
+    representative windows of the first band. The correlation and root mean
+    squared error (RMSE) of each approximated band, pooled over the windows,
+    and the compute times are written next to the log.
+
+    Args:
+        parameter_object (class)
+    """
+
+    report_file = os.path.join(parameter_object.output_dir, '{}_approx_report.txt'.format(parameter_object.f_base))
+
+    report_lines = ['Approximation report --- ({})\n'.format(time.asctime(time.localtime(time.time()))),
+                    'Input image: {}\n'.format(parameter_object.input_image),
+                    'Downsampling factor: {:d}\n'.format(parameter_object.approx_factor)]
+
+    exact_parameter_object = copy.copy(parameter_object)
+    exact_parameter_object.update_info(approx=dict())
+
+    with raster_tools.ropen(parameter_object.input_image) as i_info:
+
+        n_rows = min(parameter_object.section_size, i_info.rows)
+        n_cols = min(parameter_object.section_size, i_info.cols)
+
+        report_lines.append('Sample sections: {:d} of {:d} x {:d} pixels\n'.format(len(sptune.WINDOW_FRACTIONS),
+                                                                                   n_rows,
+                                                                                   n_cols))
+
+        for trigger in parameter_object.triggers:
+
+            if trigger not in parameter_object.approx:
+                continue
+
+            approx_parameter_object = copy.copy(parameter_object)
+            approx_parameter_object.update_info(trigger=trigger)
+
+            exact_scales, approx_scales = spapprox.get_approx_scales(approx_parameter_object)
+
+            report_lines.append('\n{} (scales >= {:d})\n'.format(trigger, parameter_object.approx[trigger]))
+
+            if not approx_scales:
+
+                report_lines.append('  No scales are approximated.\n')
+                continue
+
+            logger.info('  Validating the approximated {} scales ...'.format(trigger))
+
+            exact_list = list()
+            approx_list = list()
+
+            exact_seconds = 0.
+            approx_seconds = 0.
+
+            for window_fraction in sptune.WINDOW_FRACTIONS:
+
+                i_sect = int((i_info.rows - n_rows) * window_fraction[0])
+                j_sect = int((i_info.cols - n_cols) * window_fraction[1])
+
+                for window_list, window_parameters in [(exact_list, exact_parameter_object),
+                                                       (approx_list, parameter_object)]:
+
+                    window_parameter_object = _get_window_parameters(window_parameters,
+                                                                     i_info,
+                                                                     trigger,
+                                                                     i_sect,
+                                                                     j_sect,
+                                                                     n_rows,
+                                                                     n_cols)
+
+                    start_time = time.time()
+
+                    window_list.append(_compute_window(window_parameter_object, i_info, i_sect, j_sect, n_rows, n_cols))
+
+                    if window_list is exact_list:
+                        exact_seconds += time.time() - start_time
+                    else:
+                        approx_seconds += time.time() - start_time
+
+            report_lines.append('  Compute time: {:.2f} seconds exact, {:.2f} seconds approximated ({:.1f}x)\n'.format(exact_seconds,
+                                                                                                                    approx_seconds,
+                                                                                                                    exact_seconds / max(approx_seconds, 1e-6)))
+
+            report_lines.append('  {:>6} {:>8} {:>12} {:>12} {:>12}\n'.format('scale', 'feature', 'correlation', 'RMSE', 'exact std'))
+
+            n_bands = exact_list[0].shape[0]
+
+            for band_index, band_scale in enumerate(spapprox.get_band_scales(n_bands, parameter_object.scales)):
+
+                scale, feature_index = band_scale
+
+                if scale not in approx_scales:
+                    continue
+
+                correlation, rmse, exact_std = spapprox.compare_features(np.concatenate([exact_array[band_index].ravel()
+                                                                                         for exact_array in exact_list]),
+                                                                         np.concatenate([approx_array[band_index].ravel()
+                                                                                         for approx_array in approx_list]))
+
+                report_lines.append('  {:>6d} {:>8d} {:>12.4f} {:>12.4f} {:>12.4f}\n'.format(scale,
+                                                                                             feature_index+1,
+                                                                                             correlation,
+                                                                                             rmse,
+                                                                                             exact_std))
+
+    del i_info
+
+    with open(report_file, 'w') as report_wr:
+        report_wr.writelines(report_lines)
+
+    for report_line in report_lines:
+        logger.info('  ' + report_line.rstrip())
+
+    logger.info('  Wrote the approximation report to {}'.format(report_file))
+
+
+def _sample_band_scales(parameter_object, trigger, levels):
+
+    """
+    Gets the integer storage range of each band of a trigger from sample windows
+
+    The features of small windows spread over the current band are
+    pooled, without NaN and no-data windows, and the range is widened
+    by `spstorage.STORAGE_MARGIN`. The windows are much smaller than
+    a section, so that sampling costs a fraction of one section.
+
+    Args:
+        parameter_object (class)
+        trigger (str)
+        levels (int): The number of quantization levels.
+
+    Returns:
+        The band scales, the band offsets
+    """
+
+    logger.info('  Sampling the {} storage range ...'.format(trigger))
+
+    band_parameter_object = copy.copy(parameter_object)
+    band_parameter_object.update_info(band_positions=[parameter_object.band_position])
+
+    sample_scales = list()
+
+    with raster_tools.ropen(parameter_object.input_image) as i_info:
+
+        # A window holds at least two of the largest scale windows.
+        sample_size = max(spstorage.SAMPLE_SIZE, parameter_object.scales[-1] * 2)
+
+        n_rows = min(sample_size, parameter_object.sect_row_size, i_info.rows)
+        n_cols = min(sample_size, parameter_object.sect_col_size, i_info.cols)
+
+        for window_fraction in spstorage.SAMPLE_FRACTIONS:
+
+            i_sect = int((i_info.rows - n_rows) * window_fraction[0])
+            j_sect = int((i_info.cols - n_cols) * window_fraction[1])
+
+            window_parameter_object = _get_window_parameters(band_parameter_object,
+                                                             i_info,
+                                                             trigger,
+                                                             i_sect,
+                                                             j_sect,
+                                                             n_rows,
+                                                             n_cols)
+
+            window_features = _compute_window(window_parameter_object, i_info, i_sect, j_sect, n_rows, n_cols)
+
+            valid_mask = None
+
+            if parameter_object.skip_nodata:
+
+                window_mask = spmask.get_window_mask(window_parameter_object,
+                                                     i_sect,
+                                                     j_sect,
+                                                     n_rows,
+                                                     n_cols)
+
+                if isinstance(window_mask, np.ndarray):
+                    valid_mask = window_mask.astype('bool')
+
+            sample_scales.append(spstorage.get_band_scales(window_features, levels, valid_mask=valid_mask))
+
+    del i_info
+
+    return spstorage.merge_band_scales(sample_scales, levels, margin=spstorage.STORAGE_MARGIN)
+
+
+def _setup_storage_scales(parameter_object, mts):
+
+    """
+    Sets the integer storage range of the current band, shared by every tile
+
+    The ranges are kept in the status file, so that resumed and
+    updated runs quantize with the same ranges.
+
+    Args:
+        parameter_object (class)
+        mts (`ManageStatus` object): The loaded status.
+    """
+
+    tile_storage = spstorage.get_tile_storage(parameter_object)
+
+    storage_scales = mts.status_dict.setdefault('STORAGE_SCALES', dict())
+
+    for section_trigger in spindices.get_section_triggers(parameter_object):
+
+        levels = spstorage.get_storage_levels(spstorage.get_trigger_storage(parameter_object, section_trigger),
+                                              tile_storage)
+
+        if not levels:
+            continue
+
+        scale_key = '{TR}-{BD}'.format(TR=section_trigger, BD=parameter_object.band_position)
+
+        # Overwritten outputs get new ranges.
+        if (scale_key in storage_scales) and not parameter_object.overwrite:
+            continue
+
+        scales, offsets = _sample_band_scales(parameter_object, section_trigger, levels)
+
+        storage_scales[scale_key] = dict(scales=[float(scale) for scale in scales],
+                                         offsets=[float(offset) for offset in offsets])
+
+    parameter_object.update_info(storage_scales=dict(storage_scales))
+
+
+def _setup_status(parameter_object):
+
+    """
+    Sets up the status file and the output features directory
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        The status object, whether the image needs processing
+    """
+
+    # Create the status object.
+    mts = sputilities.ManageStatus()
+
+    parameter_object.archive_tiles = False
+    parameter_object.update_info(update_sections=None,
+                                 section_hashes=None)
+
+    # Setup the status dictionary.
+    if os.path.isfile(parameter_object.status_file):
+
+        mts.load_status(parameter_object.status_file)
+
+        if parameter_object.section_size != mts.status_dict['SECTION_SIZE']:
+
+            logger.warning('The section size was changed, so finished tiles will be moved to a legacy directory and reused.')
+
+            parameter_object.archive_tiles = True
+
+            mts.status_dict['ALL_FINISHED'] = 'no'
+
+        if not isinstance(mts.status_dict, dict):
+
+            logger.error('The YAML file already existed, but was not properly stored and saved.\nPlease remove and re-run.')
+            raise AttributeError
+
+        # Only re-process sections with changed input.
+        if parameter_object.update:
+
+            parameter_object.update_info(update_sections=_get_updated_sections(parameter_object, mts))
+
+            mts.dump_status(parameter_object.status_file)
+
+    else:
+
+        mts.status_dict = dict()
+
+        mts.status_dict['ALL_FINISHED'] = 'no'
+        mts.status_dict['BAND_ORDER'] = dict()
+
+        # Save the band order.
+        for trigger in parameter_object.triggers:
+
+            mts.status_dict['BAND_ORDER']['{}'.format(trigger)] = '{:d}-{:d}'.format(parameter_object.band_info[trigger]+1,
+                                                                                     parameter_object.band_info[trigger]+spneighbors.get_tile_bands(parameter_object, trigger)*parameter_object.n_bands)
+
+        mts.status_dict['SECTION_SIZE'] = parameter_object.section_size
+
+        # Legacy tiles are read with the layout they were written with.
+        mts.status_dict['BAND_LAYOUT'] = spresults.get_band_layout(parameter_object)
+
+        # Store the section checksums for later updates.
+        if parameter_object.update:
+            _get_updated_sections(parameter_object, mts)
+
+        mts.dump_status(parameter_object.status_file)
+
+    process_image = True
+
+    if 'ALL_FINISHED' in mts.status_dict:
+
+        if mts.status_dict['ALL_FINISHED'] == 'yes':
+            process_image = False
+
+    # Set the output features folder.
+    parameter_object = sputilities.set_feas_dir(parameter_object)
+
+    if parameter_object.archive_tiles:
+
+        spresults.archive_tiles(parameter_object, mts.status_dict)
+
+        mts.dump_status(parameter_object.status_file)
+
+    # Tiles of earlier section sizes fill the new sections they cover.
+    parameter_object.update_info(legacy_tiles=mts.status_dict.get('LEGACY_TILES', list()),
+                                 legacy_layouts=mts.status_dict.get('LEGACY_LAYOUTS', dict()))
+
+    return mts, process_image
+
+
+def _setup_image(parameter_object):
+
+    """
+    Sets up the per-image resources shared by every trigger
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        The section cache (or None)
+    """
+
+    # Set the per-run section cache.
+    if parameter_object.cache_size > 0:
+
+        section_cache = spcache.SectionCache(spcache.get_cache_dir(parameter_object),
+                                             parameter_object.cache_size)
+
+        parameter_object.update_info(section_cache_dir=section_cache.cache_dir)
+
+    else:
+
+        section_cache = None
+        parameter_object.update_info(section_cache_dir=None)
+
+    # Get the global image histograms in one pass.
+    if parameter_object.global_stats:
+        parameter_object = sputilities.get_global_stats(parameter_object)
+
+    # The no-data mask and the section costs are scanned once per run.
+    parameter_object.update_info(section_coverage=None,
+                                 section_masks=None,
+                                 cost_features=None)
+
+    return section_cache
+
+
+def _setup_sections(i_info, parameter_object):
+
+    """
+    Gets the image sections and the per-section data that are shared by every trigger and band
+
+    Args:
+        i_info (object): The opened input image.
+        parameter_object (class)
+
+    Returns:
+        The updated `parameter_object`
+    """
+
+    # Check if any of the input
+    #   bands are corrupted.
+    i_info.check_corrupted_bands()
+
+    if i_info.corrupted_bands:
+
+        logger.error('\nThe following bands appear to be corrupted:\n{}'.format(', '.join(i_info.corrupted_bands)))
+        raise CorruptedBandsError
+
+    # Get image statistics.
+    parameter_object = sputilities.get_stats(i_info, parameter_object)
+
+    # Get the section size.
+    parameter_object = sputilities.get_section_size(i_info, parameter_object)
+
+    # Get the number of sections in
+    #   the image (only used as a counter).
+    parameter_object = sputilities.get_n_sects(i_info, parameter_object)
+
+    # Find the sections that are entirely no-data.
+    if parameter_object.skip_nodata and (parameter_object.section_coverage is None):
+
+        section_coverage, section_masks = spmask.get_section_coverage(i_info, parameter_object)
+
+        parameter_object.update_info(section_coverage=section_coverage,
+                                     section_masks=section_masks)
+
+    # The section checksums key the result store.
+    if parameter_object.result_store and (parameter_object.section_hashes is None):
+        parameter_object.update_info(section_hashes=spresults.get_section_hashes(i_info, parameter_object))
+
+    # Get the section cost features for scheduling.
+    if parameter_object.cost_features is None:
+        parameter_object.update_info(cost_features=spcost.get_cost_features(i_info, parameter_object))
+
+    return parameter_object
+
+
+def get_sections2process(parameter_object):
+
+    """
+    Gets the sections to dispatch for each trigger and band
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        A list of the section counters to process
+    """
+
+    # Sections without valid data are
+    #   finished without being dispatched.
+    if parameter_object.skip_nodata:
+
+        sections2process = [sect_counter for sect_counter in range(1, parameter_object.n_sects+1)
+                            if parameter_object.section_coverage[sect_counter-1] > 0]
+
+    else:
+        sections2process = list(range(1, parameter_object.n_sects+1))
+
+    # Unchanged sections keep their tiles.
+    if parameter_object.update_sections is not None:
+
+        sections2process = [sect_counter for sect_counter in sections2process
+                            if sect_counter in parameter_object.update_sections]
+
+    return sections2process
+
+
+def _get_band_triggers(parameter_object):
+
+    """
+    Gets the triggers that are dispatched, one per group of fused spectral indices
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        A list of (trigger, fused triggers) pairs
+    """
+
+    band_triggers = list()
+
+    for trigger in parameter_object.triggers:
+
+        parameter_object.update_info(trigger=trigger)
+
+        fused_triggers = spindices.get_fused_triggers(parameter_object)
+
+        # Fused spectral indices are processed with the first of them.
+        if fused_triggers and (trigger != fused_triggers[0]):
+            continue
+
+        band_triggers.append((trigger, fused_triggers))
+
+    return band_triggers
+
+
+def _add_queued_costs(parameter_object, band_triggers, band_positions, progress_monitor):
+
+    """
+    Registers the estimated section costs of every trigger and band with the progress monitor
+
+    Args:
+        parameter_object (class)
+        band_triggers (list): The (trigger, fused triggers) pairs to process.
+        band_positions (list): The band positions to process.
+        progress_monitor (`ProgressMonitor` object)
+
+    Returns:
+        A dictionary of the registered section costs, keyed by (trigger, band position)
+    """
+
+    with raster_tools.ropen(parameter_object.input_image) as i_info:
+        parameter_object = _setup_sections(i_info, parameter_object)
+
+    del i_info
+
+    sections2process = get_sections2process(parameter_object)
+
+    cost_model = _load_cost_model(parameter_object)
+
+    queued_costs = dict()
+
+    for trigger, __ in band_triggers:
+
+        parameter_object.update_info(trigger=trigger)
+
+        for band_position in band_positions:
+            queued_costs[(trigger, band_position)] = get_section_costs(parameter_object, cost_model, sections2process)
+
+    progress_monitor.add_sections([section_cost
+                                   for section_costs in queued_costs.values()
+                                   for section_cost in section_costs.values()])
+
+    return queued_costs
+
+
+def _setup_band(parameter_object):
+
+    """
+    Sets up the sections of the current trigger and band
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        A list of the section counters to process
+    """
+
+    # Get the input image information.
+    with raster_tools.ropen(parameter_object.input_image) as i_info:
+
+        parameter_object = _setup_sections(i_info, parameter_object)
+
+        if parameter_object.trigger == 'saliency':
+
+            bp = raster_tools.BlockFunc(get_saliency_tile_mean,
+                                        [i_info],
+                                        None,
+                                        None,
+                                        band_list=[[1, 2, 3]],
+                                        d_types=['float32'],
+                                        write_array=False,
+                                        close_files=False,
+                                        be_quiet=True,
+                                        print_statement='\nGetting tile lab means for saliency',
+                                        out_attributes=['lab_means'],
+                                        block_rows=parameter_object.sect_row_size,
+                                        block_cols=parameter_object.sect_col_size,
+                                        min_max=[(parameter_object.image_min,
+                                                  parameter_object.image_max)]*3,
+                                        vis_order=parameter_object.vis_order)
+
+            bp.run()
+
+            parameter_object.update_info(lab_means=np.array(bp.lab_means,
+                                                            dtype='float32').mean(axis=0))
+
+    del i_info
+
+    mts = sputilities.ManageStatus()
+    mts.load_status(parameter_object.status_file)
+
+    # Integer storage uses one range per band for every tile.
+    _setup_storage_scales(parameter_object, mts)
+
+    sections2process = get_sections2process(parameter_object)
+
+    for sect_counter in range(1, parameter_object.n_sects+1):
+
+        parameter_object.update_info(section_counter=sect_counter)
+        parameter_object = sputilities.scale_fea_check(parameter_object)
+
+        if parameter_object.trigger == parameter_object.triggers[0]:
+            mts.status_dict[parameter_object.out_img_base] = dict()
+
+        if sect_counter in sections2process:
+            section_status = 'unprocessed'
+        else:
+            section_status = 'complete'
+
+        for section_trigger in spindices.get_section_triggers(parameter_object):
+
+            mts.status_dict[parameter_object.out_img_base]['{TR}-{BD}'.format(TR=section_trigger,
+                                                                              BD=parameter_object.band_position)] = section_status
+
+    mts.dump_status(parameter_object.status_file)
+
+    return sections2process
+
+
+def _set_section_status(parameter_object, section_counter, is_corrupt):
+
+    """
+    Records the status of a processed section
+
+    Args:
+        parameter_object (class)
+        section_counter (int)
+        is_corrupt (bool)
+    """
+
+    parameter_object.update_info(section_counter=section_counter)
+    parameter_object = sputilities.scale_fea_check(parameter_object)
+
+    # Open the status YAML file.
+    mts = sputilities.ManageStatus()
+
+    # Load the status dictionary
+    mts.load_status(parameter_object.status_file)
+
+    if parameter_object.out_img_base in mts.status_dict:
+
+        for section_trigger in spindices.get_section_triggers(parameter_object):
+
+            mts.status_dict[parameter_object.out_img_base]['{TR}-{BD}'.format(TR=section_trigger,
+                                                                              BD=parameter_object.band_position)] = 'corrupt' if is_corrupt else 'complete'
+
+    mts.dump_status(parameter_object.status_file)
+
+
+def get_section_costs(parameter_object, cost_model, section_list):
+
+    """
+    Estimates the compute time of the sections of the current trigger and band
+
+    Args:
+        parameter_object (class)
+        cost_model (`CostModel` object)
+        section_list (list): The section counters.
+
+    Returns:
+        A dictionary of estimated seconds, keyed by the section counter
+    """
+
+    return dict([(section_counter, cost_model.estimate(parameter_object.trigger,
+                                                       *parameter_object.cost_features[section_counter-1]))
+                 for section_counter in section_list])
+
+
+def _load_cost_model(parameter_object):
+
+    """Loads the section cost model from the status file"""
+
+    mts = sputilities.ManageStatus()
+    mts.load_status(parameter_object.status_file)
+
+    return spcost.CostModel(mts.status_dict.get('COST_MODEL', None))
+
+
+def _save_cost_model(parameter_object, cost_model):
+
+    """Saves the section cost model to the status file"""
+
+    mts = sputilities.ManageStatus()
+    mts.load_status(parameter_object.status_file)
+
+    mts.status_dict['COST_MODEL'] = cost_model.to_dict()
+
+    mts.dump_status(parameter_object.status_file)
+
+
+def _update_section_cost(parameter_object, cost_model, section_result, estimated_seconds):
+
+    """
+    Logs the estimated and actual compute time of a section and adds it to the cost model
+
+    Args:
+        parameter_object (class)
+        cost_model (`CostModel` object)
+        section_result (`SectionResult`)
+        estimated_seconds (float)
+    """
+
+    if section_result.seconds is None:
+        return
+
+    logger.info('  Section {:d} ({}): estimated {:.2f} seconds, actual {:.2f} seconds'.format(section_result.section_counter,
+                                                                                           parameter_object.trigger,
+                                                                                           estimated_seconds,
+                                                                                           section_result.seconds))
+
+    megapixels, probe = parameter_object.cost_features[section_result.section_counter-1]
+
+    cost_model.update(parameter_object.trigger, megapixels, probe, section_result.seconds)
+
+
+def get_progress_monitor(parameter_object):
+
+    """
+    Gets the progress monitor of a run
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        A `ProgressMonitor` object
+    """
+
+    return spprogress.ProgressMonitor(parameter_object.n_jobs,
+                                      metrics_file=parameter_object.metrics_file,
+                                      refresh_interval=parameter_object.metrics_interval,
+                                      label=os.path.basename(parameter_object.input_image))
+
+
+def _process_sections(parameter_object, sections2process, progress_monitor=None, queued_costs=None):
+
+    """
+    Processes the sections of the current trigger and band in parallel
+
+    Sections are dispatched longest first, by the estimated compute time
+    of the cost model, so that the last sections to finish are short.
+
+    Args:
+        parameter_object (class)
+        sections2process (list): The section counters.
+        progress_monitor (Optional[`ProgressMonitor` object])
+        queued_costs (Optional[dict]): The section costs that were registered with `progress_monitor`.
+            Sections that were not registered are added to it.
+    """
+
+    global run_configs
+
+    # The run configuration is installed once per worker.
+    run_configs = {0: get_run_config(parameter_object)}
+
+    cost_model = _load_cost_model(parameter_object)
+
+    section_costs = get_section_costs(parameter_object, cost_model, sections2process)
+
+    if queued_costs is None:
+        queued_costs = dict()
+
+    if progress_monitor:
+
+        progress_monitor.add_sections([section_costs[section_counter] for section_counter in sections2process
+                                       if section_counter not in queued_costs])
+
+        queued_costs = dict([(section_counter, queued_costs.get(section_counter, section_costs[section_counter]))
+                             for section_counter in sections2process])
+
+    # The single reader keeps the raster
+    #   order so that reads are sequential.
+    if parameter_object.io_mode != 'single':
+        sections2process = sorted(sections2process, key=lambda sc: section_costs[sc], reverse=True)
+
+    section_tasks = get_section_tasks(parameter_object, 0, sections2process)
+
+    pool = None
+
+    # Testing
+    # section_results = list(map(_section_read_write, section_tasks))
+
+    if parameter_object.io_mode == 'single':
+        section_results = _single_reader_read_write(parameter_object, section_tasks)
+    else:
+
+        pool = multi.Pool(processes=parameter_object.n_jobs,
+                          initializer=_init_worker,
+                          initargs=(run_configs,
+                                    parameter_object.gdal_cache,
+                                    parameter_object.n_jobs))
+
+        # With prefetching, each worker handles a batch of
+        #   sections so that reads overlap with compute.
+        if parameter_object.prefetch > 0:
+
+            batch_size = parameter_object.prefetch + 1
+
+            # Deal the sorted sections across the batches
+            #   so that the batch costs stay balanced.
+            n_batches = int(np.ceil(len(section_tasks) / batch_size))
+
+            section_batches = [section_tasks[batch_idx::n_batches] for batch_idx in range(0, n_batches)]
+
+            section_results = itertools.chain.from_iterable(pool.imap_unordered(_section_batch_read_write,
+                                                                                section_batches,
+                                                                                chunksize=1))
+
+        else:
+            section_results = pool.imap_unordered(_section_read_write, section_tasks, chunksize=1)
+
+    estimated_total = 0.
+    actual_total = 0.
+
+    try:
+
+        for section_result in section_results:
+
+            _set_section_status(parameter_object, section_result.section_counter, section_result.is_corrupt)
+
+            _update_section_cost(parameter_object,
+                                 cost_model,
+                                 section_result,
+                                 section_costs[section_result.section_counter])
+
+            if progress_monitor:
+
+                progress_monitor.update(parameter_object.trigger,
+                                        section_result,
+                                        queued_costs[section_result.section_counter])
+
+            if section_result.seconds is not None:
+
+                estimated_total += section_costs[section_result.section_counter]
+                actual_total += section_result.seconds
+
+    except:
+
+        if pool is not None:
+            pool.terminate()
+
+        raise
+
+    if pool is not None:
+
+        pool.close()
+        pool.join()
+        pool = None
+
+    _save_cost_model(parameter_object, cost_model)
+
+    logger.info('  {} compute time: estimated {:.2f} seconds, actual {:.2f} seconds'.format(parameter_object.trigger,
+                                                                                         estimated_total,
+                                                                                         actual_total))
+
+    # Parallel(n_jobs=parameter_object.n_jobs,
+    #          batch_size=1,
+    #          max_nbytes=None)(delayed(_section_read_write)(idx_pair,
+    #                                                        parameter_object.section_idx_pairs[idx_pair-1],
+    #                                                        param_dict)
+    #                           for idx_pair in range(1, parameter_object.n_sects+1))
+
+
+def _get_tile_manifest(parameter_object):
+
+    """
+    Gets the written tiles of the section grid
+
+    Args:
+        parameter_object (class)
+
+    Returns:
+        The tile `image`, `i_sect` and `j_sect` of each section counter, or None
+            for sections without a tile
+    """
+
+    tile_list = list()
+
+    for section_counter in range(1, parameter_object.n_sects+1):
+
+        parameter_object.update_info(section_counter=section_counter)
+        parameter_object = sputilities.scale_fea_check(parameter_object)
+
+        # Sections without valid data have no tile.
+        if os.path.isfile(parameter_object.out_img):
+
+            i_sect, j_sect = parameter_object.section_idx_pairs[section_counter-1]
+
+            tile_list.append(dict(image=parameter_object.out_img,
+                                  i_sect=i_sect,
+                                  j_sect=j_sect))
+
+        else:
+            tile_list.append(None)
+
+    return tile_list
+
+
+def _exchange_neighbor_halos(parameter_object, tile_list):
+
+    """
+    Fills the neighbor copies on the tile borders from the adjacent tiles
+
+    Args:
+        parameter_object (class)
+        tile_list (list): The tile manifest from `_get_tile_manifest`.
+    """
+
+    logger.info('  Exchanging the neighbor borders ...')
+
+    for trigger in parameter_object.triggers:
+
+        tile_bands = spneighbors.get_tile_bands(parameter_object, trigger)
+
+        for band_counter in range(0, parameter_object.n_bands):
+
+            spneighbors.exchange_halos(parameter_object,
+                                       trigger,
+                                       parameter_object.band_info[trigger] + band_counter*tile_bands + 1,
+                                       tile_list)
+
+
+def _finish_image(parameter_object, mts):
+
+    """
+    Checks the tile status and builds the VRT mosaic
+
+    Args:
+        parameter_object (class)
+        mts (`ManageStatus` object)
+    """
+
+    # Check the corruption status.
+    mts.load_status(parameter_object.status_file)
+
+    was_finished = mts.status_dict.get('ALL_FINISHED', 'no') == 'yes'
+
+    n_corrupt = 0
+    for k, v in viewitems(mts.status_dict):
+
+        if isinstance(v, dict):
+
+            for ksub, vsub in viewitems(v):
+
+                if vsub in ['corrupt', 'incomplete']:
+                    n_corrupt += 1
+
+    if n_corrupt == 0:
+
+        if getattr(parameter_object, 'section_idx_pairs', None):
+            tile_list = _get_tile_manifest(parameter_object)
+        else:
+            tile_list = None
+
+        # The tile borders are exchanged once every section is written.
+        if parameter_object.neighbors and not was_finished and tile_list:
+            _exchange_neighbor_halos(parameter_object, tile_list)
+
+        # Tiles written without overviews (e.g., by an
+        #   earlier run) get them here, so that every
+        #   VRT source has the same overview levels.
+        if parameter_object.overviews and tile_list:
+
+            for tile in tile_list:
+
+                if tile and not spstorage.has_overviews(tile['image']):
+
+                    spstorage.update_overviews(tile['image'],
+                                               list(range(1, parameter_object.band_info['band_count']+1)))
+
+        mts.status_dict['ALL_FINISHED'] = 'yes'
+        mts.status_dict.pop('UPDATE_SECTIONS', None)
+        mts.dump_status(parameter_object.status_file)
+
+        # Finally, mosaic the image tiles.
+
+        logger.info('  Creating the VRT mosaic ...')
+
+        comp_dict = dict()
+
+        # Get the image list from the tile manifest, in
+        #   section order, or from the features directory.
+        if tile_list:
+            image_list = [tile['image'] for tile in tile_list if tile]
+        else:
+
+            parameter_object = sputilities.scale_fea_check(parameter_object, is_image=False)
+
+            image_list = fnmatch.filter(os.listdir(parameter_object.feas_dir), parameter_object.search_wildcard)
+            image_list = [os.path.join(parameter_object.feas_dir, im) for im in image_list]
+
+        comp_dict['001'] = image_list
+
+        vrt_mosaic = parameter_object.status_file.replace('.yaml', '.vrt')
+
+        vrt_builder(comp_dict,
+                    vrt_mosaic,
+                    force_type='float32',
+                    be_quiet=True,
+                    overwrite=True,
+                    relative_path=parameter_object.relative_path)
+
+        # Integer tiles share one range per band, which
+        #   is recorded on the VRT bands.
+        storage_scales = mts.status_dict.get('STORAGE_SCALES', dict())
+
+        if storage_scales:
+
+            for trigger in parameter_object.triggers:
+
+                tile_bands = spneighbors.get_tile_bands(parameter_object, trigger)
+
+                for band_counter, band_position in enumerate(parameter_object.band_positions):
+
+                    band_parameter_object = copy.copy(parameter_object)
+
+                    band_parameter_object.update_info(band_position=band_position,
+                                                      storage_scales=storage_scales)
+
+                    band_scales, band_offsets = spstorage.get_shared_scales(band_parameter_object, trigger, tile_bands)
+
+                    if band_scales is not None:
+
+                        spstorage.set_band_scales(vrt_mosaic,
+                                                  parameter_object.band_info[trigger] + band_counter*tile_bands + 1,
+                                                  band_scales,
+                                                  band_offsets)
+
+        if parameter_object.overviews:
+
+            # The tile overviews were built by the workers, and the
+            #   VRT exposes them as its own overview levels, so only
+            #   the overviews of an earlier mosaic are removed.
+            with raster_tools.ropen(vrt_mosaic, open2read=False) as vrt_info:
+                vrt_info.remove_overviews()
+
+            del vrt_info
+
+    else:
+
+        if n_corrupt == 1:
+            logger.warning('\nThere was {:d} corrupt or incomplete tile.\nRe-run the command with the same parameters.'.format(n_corrupt))
+        else:
+            logger.warning('\nThere were {:d} corrupt or incomplete tiles.\nRe-run the command with the same parameters.'.format(n_corrupt))
+
+
+def run(parameter_object):
+
+    """
+    Args:
+        input_image, output_dir, band_positions=[1], use_rgb=False, block=2, scales=[8], triggers=['mean'],
+        threshold=20, min_len=10, line_gap=2, weighted=False, sfs_thresh=80, resamp_sfs=0.,
+        equalize=False, equalize_adapt=False, smooth=0, visualize=False, convert_stk=False, gdal_cache=256,
+        do_pca=False, stack_feas=True, stack_only=False, neighbors=False, n_jobs=-1,
+        reset_sects=False, image_max=0, lac_r=2, section_size=8000, chunk_size=512
+    """
+
+    _setup_run(parameter_object)
+
+    if parameter_object.stack_only:
+
+        with raster_tools.ropen(parameter_object.input_image) as i_info:
+
+            # Get image statistics.
+            parameter_object = sputilities.get_stats(i_info, parameter_object)
+
+            # Get the section size.
+            parameter_object = sputilities.get_section_size(i_info, parameter_object)
+
+            # Get the number of sections in
+            #   the image (only used as a counter).
+            parameter_object = sputilities.get_n_sects(i_info, parameter_object)
+
+        i_info = None
+
+        new_feas_list = list()
+
+        # If prompted, stack features without processing.
+        parameter_object = sputilities.stack_features(parameter_object,
+                                                      new_feas_list)
+
+    else:
+
+        if parameter_object.autotune:
+            _autotune(parameter_object)
+
+        if parameter_object.approx and parameter_object.approx_report:
+            _validate_approx(parameter_object)
+
+        mts, process_image = _setup_status(parameter_object)
+
+        if not process_image:
+            logger.warning('The input image, {}, is set as finished processing.'.format(parameter_object.input_image))
+        else:
+
+            section_cache = _setup_image(parameter_object)
+
+            progress_monitor = get_progress_monitor(parameter_object)
+
+            original_band_positions = copy.copy(parameter_object.band_positions)
+
+            band_triggers = _get_band_triggers(parameter_object)
+
+            # The costs of every trigger and band are registered
+            #   up front so that the total and the ETA cover the run.
+            queued_costs = _add_queued_costs(parameter_object,
+                                             band_triggers,
+                                             original_band_positions,
+                                             progress_monitor)
+
+            # Iterate over each feature trigger.
+            for trigger, fused_triggers in band_triggers:
+
+                parameter_object.update_info(trigger=trigger,
+                                             band_positions=original_band_positions,
+                                             band_counter=0,
+                                             fused_triggers=fused_triggers)
+
+                # Iterate over each band
+                for band_position in parameter_object.band_positions:
+
+                    parameter_object.update_info(band_position=band_position)
+
+                    sections2process = _setup_band(parameter_object)
+
+                    _process_sections(parameter_object,
+                                      sections2process,
+                                      progress_monitor=progress_monitor,
+                                      queued_costs=queued_costs.get((trigger, band_position), None))
+
+                    parameter_object.band_counter += spneighbors.get_tile_bands(parameter_object, parameter_object.trigger)
+
+            progress_monitor.refresh()
+
+            if parameter_object.profile:
+                spprofile.merge_profiles(parameter_object)
+
+            if section_cache:
+                section_cache.clear()
+
+        _finish_image(parameter_object, mts)
@@ -0,0 +1,592 @@
+from __future__ import print_function
+from future.utils import viewitems
+
+import os
+import sys
+import time
+import errno
+import socket
+import argparse
+import traceback
+import multiprocessing as multi
+from future.moves.queue import Queue, Empty
+
+from .errors import logger
+
+# YAML
+try:
+    import yaml
+except:
+    logger.error('YAML must be installed')
+    raise ImportError
+
+
+JOB_STATES = ['pending', 'running', 'done', 'failed']
+
+
+def _get_state_dir(queue_dir, job_state):
+    return os.path.join(queue_dir, job_state)
+
+
+def setup_queue(queue_dir):
+
+    """
+    Creates the job queue directories
+
+    Args:
+        queue_dir (str): The queue directory.
+    """
+
+    for job_state in JOB_STATES:
+
+        state_dir = _get_state_dir(queue_dir, job_state)
+
+        if not os.path.isdir(state_dir):
+
+            try:
+                os.makedirs(state_dir)
+            except OSError:
+                pass
+
+
+def _load_job(job_file):
+
+    with open(job_file, 'r') as jf:
+        return yaml.safe_load(jf)
+
+
+def _dump_job(job_file, job_dict):
+
+    with open(job_file, 'w') as jf:
+        yaml.dump(job_dict, jf, default_flow_style=False)
+
+
+def submit_job(queue_dir, input_image, output_dir, **kwargs):
+
+    """
+    Adds an extraction job to the queue
+
+    Args:
+        queue_dir (str): The queue directory.
+        input_image (str)
+        output_dir (str)
+        kwargs (dict): The `spatial_features` parameters.
+
+    Returns:
+        The job id
+    """
+
+    setup_queue(queue_dir)
+
+    # Jobs run in the order of their ids.
+    job_id = '{:d}_{:d}_{}'.format(int(time.time() * 1000),
+                                   os.getpid(),
+                                   os.path.splitext(os.path.basename(input_image))[0])
+
+    job_dict = dict(job_id=job_id,
+                    input_image=os.path.abspath(input_image),
+                    output_dir=os.path.abspath(output_dir),
+                    parameters=kwargs,
+                    submitted=time.asctime(time.localtime(time.time())))
+
+    # Write to a temporary file first so the
+    #   server never loads a partial job.
+    job_file = os.path.join(_get_state_dir(queue_dir, 'pending'), '{}.yaml'.format(job_id))
+    temp_file = '{}.tmp'.format(job_file)
+
+    _dump_job(temp_file, job_dict)
+
+    os.rename(temp_file, job_file)
+
+    logger.info('  Submitted job {} to {}'.format(job_id, queue_dir))
+
+    return job_id
+
+
+def _claim_job(queue_dir):
+
+    """
+    Moves the oldest pending job to the running state
+
+    The move is atomic, so several servers can share a queue.
+
+    Returns:
+        The running job file, or None if the queue is empty
+    """
+
+    pending_dir = _get_state_dir(queue_dir, 'pending')
+
+    for job_name in sorted(os.listdir(pending_dir)):
+
+        if not job_name.endswith('.yaml'):
+            continue
+
+        running_file = os.path.join(_get_state_dir(queue_dir, 'running'), job_name)
+
+        try:
+            os.rename(os.path.join(pending_dir, job_name), running_file)
+        except OSError:
+
+            # Another server claimed the job.
+            continue
+
+        return running_file
+
+    return None
+
+
+def _is_server_alive(job_dict):
+
+    """Checks if the server of a running job is alive on this host"""
+
+    server = job_dict.get('server', None)
+
+    if not isinstance(server, dict) or (server.get('host', None) != socket.gethostname()):
+        return None
+
+    try:
+        os.kill(server['pid'], 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+
+    return True
+
+
+def requeue_stale_jobs(queue_dir, stale_seconds=3600.):
+
+    """
+    Moves the running jobs of stopped servers back to the pending state
+
+    A job is stale if its server process on this host is gone, or if its
+    server (on any host) has not touched the job file for `stale_seconds`.
+    The status file of a requeued job resumes it at the unfinished sections.
+
+    Args:
+        queue_dir (str): The queue directory.
+        stale_seconds (Optional[float]): The time (seconds) without a server heartbeat.
+
+    Returns:
+        The requeued job ids
+    """
+
+    running_dir = _get_state_dir(queue_dir, 'running')
+
+    requeued = list()
+
+    for job_name in sorted(os.listdir(running_dir)):
+
+        if not job_name.endswith('.yaml'):
+            continue
+
+        running_file = os.path.join(running_dir, job_name)
+
+        try:
+
+            server_alive = _is_server_alive(_load_job(running_file))
+            heartbeat_age = time.time() - os.path.getmtime(running_file)
+
+        except (IOError, OSError):
+            continue
+
+        if (server_alive is False) or ((server_alive is None) and (heartbeat_age >= stale_seconds)):
+
+            try:
+                os.rename(running_file, os.path.join(_get_state_dir(queue_dir, 'pending'), job_name))
+            except OSError:
+
+                # Another server requeued the job.
+                continue
+
+            requeued.append(os.path.splitext(job_name)[0])
+
+            logger.warning('  Requeued the stale job {}'.format(os.path.splitext(job_name)[0]))
+
+    return requeued
+
+
+def _start_job(job_file):
+
+    """Records the start and the server of a claimed job"""
+
+    job_dict = _load_job(job_file)
+
+    job_dict['started'] = time.asctime(time.localtime(time.time()))
+    job_dict['server'] = dict(host=socket.gethostname(), pid=os.getpid())
+
+    _dump_job(job_file, job_dict)
+
+    logger.info('  Running job {} ...'.format(job_dict['job_id']))
+
+    return job_dict
+
+
+def _finish_job(queue_dir, job_file, job_dict, start_time, error=None):
+
+    """
+    Moves a running job to the done or failed state
+
+    Args:
+        queue_dir (str)
+        job_file (str): The running job file.
+        job_dict (dict)
+        start_time (float)
+        error (Optional[str]): The error traceback of a failed job.
+    """
+
+    if error:
+
+        job_dict['error'] = error
+        job_state = 'failed'
+
+        logger.error('  Job {} failed:\n{}'.format(job_dict['job_id'], error))
+
+    else:
+        job_state = 'done'
+
+    job_dict['finished'] = time.asctime(time.localtime(time.time()))
+    job_dict['seconds'] = round(time.time() - start_time, 2)
+
+    _dump_job(job_file, job_dict)
+
+    os.rename(job_file, os.path.join(_get_state_dir(queue_dir, job_state), os.path.basename(job_file)))
+
+    logger.info('  Job {} is {} ({:.2f} seconds)'.format(job_dict['job_id'], job_state, job_dict['seconds']))
+
+
+def _serve_section_read_write(serve_task):
+
+    """
+    Processes one scene section of a job in a server worker
+
+    The run configurations of the job travel with the task, because the
+    workers were started before the job was claimed. They replace the
+    configurations of the previous task, so a worker only holds the
+    configurations of one job and the ids of finished jobs can be reused.
+
+    Args:
+        serve_task (tuple): The job id, the job run configurations, and the scene task.
+
+    Returns:
+        The job id, and the scene section results or the error traceback
+    """
+
+    from . import spprocess
+    from . import spbatch
+
+    job_id, job_configs, scene_task = serve_task
+
+    spprocess.run_configs = job_configs
+
+    try:
+        return job_id, spbatch._scene_section_read_write(scene_task)
+    except (Exception, SystemExit):
+        return job_id, traceback.format_exc()
+
+
+def _finish_job_scene(queue_dir, job_state, run_configs):
+
+    """Builds the mosaic of a finished job and moves it to the done or failed state"""
+
+    from . import spbatch
+
+    scene_dict = job_state['scene_dict']
+
+    try:
+
+        spbatch._finish_scene(scene_dict)
+        error = None
+
+    except (Exception, SystemExit):
+        error = traceback.format_exc()
+
+    _drop_job_configs(job_state, run_configs)
+
+    _finish_job(queue_dir, job_state['job_file'], job_state['job_dict'], job_state['start_time'], error=error)
+
+
+def _drop_job_configs(job_state, run_configs):
+
+    """Removes the run configurations of a finished or failed job"""
+
+    if job_state['scene_dict'] is not None:
+
+        for config_id in job_state['scene_dict']['config_ids']:
+            run_configs.pop(config_id, None)
+
+
+def _get_n_workers(n_jobs):
+
+    if n_jobs < 0:
+        return multi.cpu_count()
+
+    return min(max(1, n_jobs), multi.cpu_count())
+
+
+def serve(queue_dir, poll_interval=5., max_jobs=0, n_jobs=-1, gdal_cache=256, stale_seconds=3600.):
+
+    """
+    Runs queued extraction jobs in a long-running process
+
+    One worker pool is started with the server and kept warm between jobs.
+    Claimed jobs are set up as batch scenes (see `spbatch.batch_features`),
+    and the section tasks of every running job are fed to the same pool, so
+    several small jobs run at once. New jobs are claimed while fewer section
+    tasks are queued than there are workers.
+
+    Args:
+        queue_dir (str): The queue directory.
+        poll_interval (Optional[float]): The time (seconds) to wait for new jobs.
+        max_jobs (Optional[int]): The number of jobs to run before exiting (0 runs until interrupted).
+        n_jobs (Optional[int]): The number of parallel workers, shared by all jobs.
+        gdal_cache (Optional[int]): The GDAL cache size (MB), shared by the workers.
+        stale_seconds (Optional[float]): The time (seconds) after which a running job
+            without a server heartbeat is requeued at start-up.
+    """
+
+    from . import spprocess
+    from . import spbatch
+
+    setup_queue(queue_dir)
+
+    requeue_stale_jobs(queue_dir, stale_seconds=stale_seconds)
+
+    n_workers = _get_n_workers(n_jobs)
+
+    logger.info('  Serving jobs from {} with {:d} workers ...'.format(queue_dir, n_workers))
+
+    pool = multi.Pool(processes=n_workers,
+                      initializer=spprocess._init_worker,
+                      initargs=(dict(), gdal_cache, n_workers))
+
+    # Section results, put by the pool result thread
+    result_queue = Queue()
+
+    # The running jobs, keyed by job id
+    running_jobs = dict()
+
+    # The configurations of every running job
+    run_configs = dict()
+
+    n_claimed = 0
+    n_queued = 0
+
+    heartbeat_time = time.time()
+
+    try:
+
+        while True:
+
+            # Claim jobs while the workers have room.
+            while (n_queued < n_workers) and ((max_jobs == 0) or (n_claimed < max_jobs)):
+
+                job_file = _claim_job(queue_dir)
+
+                if not job_file:
+                    break
+
+                n_claimed += 1
+
+                job_dict = _start_job(job_file)
+
+                job_state = dict(job_file=job_file,
+                                 job_dict=job_dict,
+                                 start_time=time.time(),
+                                 scene_dict=None)
+
+                # The configurations of a job that fails
+                #   during its setup are removed.
+                previous_config_ids = set(run_configs)
+
+                try:
+
+                    scene_dict, section_tasks = spbatch._load_scene(dict(input_image=job_dict['input_image'],
+                                                                         output_dir=job_dict['output_dir'],
+                                                                         parameters=job_dict['parameters']),
+                                                                    n_workers,
+                                                                    run_configs)
+
+                    job_state['scene_dict'] = scene_dict
+
+                    if scene_dict['n_remaining'] == 0:
+
+                        _finish_job_scene(queue_dir, job_state, run_configs)
+                        continue
+
+                except (Exception, SystemExit):
+
+                    for config_id in set(run_configs).difference(previous_config_ids):
+                        run_configs.pop(config_id, None)
+
+                    _finish_job(queue_dir, job_file, job_dict, job_state['start_time'], error=traceback.format_exc())
+                    continue
+
+                job_configs = dict([(config_id, run_configs[config_id]) for config_id in scene_dict['config_ids']])
+
+                running_jobs[job_dict['job_id']] = job_state
+
+                # Longest tasks first
+                for section_cost, section_counter, unit_tasks in sorted(section_tasks, key=lambda st: st[0], reverse=True):
+
+                    pool.apply_async(_serve_section_read_write,
+                                     ((job_dict['job_id'], job_configs, (0, section_counter, unit_tasks)),),
+                                     callback=result_queue.put)
+
+                    n_queued += 1
+
+            # Tasks of failed jobs may still be queued.
+            if not running_jobs and (n_queued == 0):
+
+                if (max_jobs > 0) and (n_claimed >= max_jobs):
+                    break
+
+                time.sleep(poll_interval)
+                continue
+
+            # Touch the job files so other servers see them alive.
+            if time.time() - heartbeat_time >= poll_interval:
+
+                for job_state in running_jobs.values():
+                    os.utime(job_state['job_file'], None)
+
+                heartbeat_time = time.time()
+
+            try:
+                job_id, scene_result = result_queue.get(timeout=poll_interval)
+            except Empty:
+                continue
+
+            n_queued -= 1
+
+            # The remaining sections of a failed job are ignored.
+            if job_id not in running_jobs:
+                continue
+
+            job_state = running_jobs[job_id]
+
+            if not isinstance(scene_result, tuple):
+
+                del running_jobs[job_id]
+
+                _drop_job_configs(job_state, run_configs)
+
+                _finish_job(queue_dir,
+                            job_state['job_file'],
+                            job_state['job_dict'],
+                            job_state['start_time'],
+                            error=scene_result)
+
+                continue
+
+            scene_index, section_counter, unit_results = scene_result
+
+            try:
+
+                if spbatch._update_scene(job_state['scene_dict'], section_counter, unit_results):
+
+                    del running_jobs[job_id]
+
+                    _finish_job_scene(queue_dir, job_state, run_configs)
+
+            except (Exception, SystemExit):
+
+                running_jobs.pop(job_id, None)
+
+                _drop_job_configs(job_state, run_configs)
+
+                _finish_job(queue_dir,
+                            job_state['job_file'],
+                            job_state['job_dict'],
+                            job_state['start_time'],
+                            error=traceback.format_exc())
+
+    except KeyboardInterrupt:
+
+        logger.info('  Stopping the server ...')
+
+        # Running jobs are requeued when a server starts again.
+        pool.terminate()
+        pool.join()
+
+        return
+
+    except:
+
+        pool.terminate()
+        raise
+
+    pool.close()
+    pool.join()
+
+
+def get_queue_status(queue_dir):
+
+    """
+    Gets the jobs of each state
+
+    Args:
+        queue_dir (str): The queue directory.
+
+    Returns:
+        A dictionary of job ids, keyed by state
+    """
+
+    queue_status = dict()
+
+    for job_state in JOB_STATES:
+
+        state_dir = _get_state_dir(queue_dir, job_state)
+
+        if os.path.isdir(state_dir):
+            queue_status[job_state] = sorted([os.path.splitext(job_name)[0] for job_name in os.listdir(state_dir)
+                                              if job_name.endswith('.yaml')])
+        else:
+            queue_status[job_state] = list()
+
+    return queue_status
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog='spfeas serve',
+                                     description='Runs queued feature extraction jobs in a long-running process',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-q', '--queue-dir', dest='queue_dir', help='The job queue directory', default=None)
+    parser.add_argument('--poll', dest='poll_interval', help='The time (seconds) to wait for new jobs',
+                        default=5., type=float)
+    parser.add_argument('--max-jobs', dest='max_jobs',
+                        help='The number of jobs to run before exiting (0 runs until interrupted)', default=0, type=int)
+    parser.add_argument('--n-jobs', dest='n_jobs', help='The number of parallel workers, shared by all jobs',
+                        default=-1, type=int)
+    parser.add_argument('--gdal-cache', dest='gdal_cache', help='The GDAL cache size (MB), shared by the workers',
+                        default=256, type=int)
+    parser.add_argument('--stale', dest='stale_seconds',
+                        help='The time (seconds) without a server heartbeat after which a running job is requeued at start-up',
+                        default=3600., type=float)
+    parser.add_argument('--status', dest='status', help='Whether to show the queue status and exit',
+                        action='store_true')
+
+    args = parser.parse_args(argv)
+
+    if not args.queue_dir:
+
+        logger.error('  The queue directory must be given.')
+        raise NameError
+
+    if args.status:
+
+        for job_state, job_ids in viewitems(get_queue_status(args.queue_dir)):
+
+            print('{} ({:d})'.format(job_state, len(job_ids)))
+
+            for job_id in job_ids:
+                print('  {}'.format(job_id))
+
+        sys.exit()
+
+    serve(args.queue_dir,
+          poll_interval=args.poll_interval,
+          max_jobs=args.max_jobs,
+          n_jobs=args.n_jobs,
+          gdal_cache=args.gdal_cache,
+          stale_seconds=args.stale_seconds)
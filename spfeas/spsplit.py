@@ -12,6 +12,7 @@ import subprocess
 
 from .errors import logger
 from . import spfunctions
+from .sphelpers import spapprox
 from .paths import get_path
 
 from mpglue import raster_tools
@@ -41,24 +42,6 @@ try:
 except ImportError:
     raise ImportError('OpenCV must be installed')
 
-# Matplotlib
-try:
-    import matplotlib.pyplot as plt
-except ImportError:
-    raise ImportError('Matplotlib must be installed')
-
-# Numexpr
-try:
-    import numexpr as ne
-except ImportError:
-    raise ImportError('Numexpr must be installed')
-
-# SciPy
-try:
-    from scipy.stats import linregress
-except ImportError:
-    raise ImportError('SciPy must be installed')
-
 # Dask
 # try:
 #     import dask.array as da
@@ -75,24 +58,24 @@ import warnings
 warnings.filterwarnings('ignore')
 
 
-def call_gabor(block_array_, block_size_, scales_, end_scale_):
-    return _stats.feature_gabor(np.float32(block_array_), block_size_, scales_, end_scale_)
+def call_gabor(block_array_, block_size_, scales_, end_scale_, window_mask_=None, weight_scale_=1.):
+    return _stats.feature_gabor(np.float32(block_array_), block_size_, scales_, end_scale_, window_mask=window_mask_, weight_scale=weight_scale_)
 
 
 def call_fourier(block_array_, block_size_, scales_, end_scale_):
     return spfunctions.feature_fourier(block_array_, block_size_, scales_, end_scale_)
 
 
-def call_dmp(block_array_, block_size_, scales_, end_scale_):
-    return _stats.feature_dmp(np.float32(block_array_), block_size_, scales_, end_scale_)
+def call_dmp(block_array_, block_size_, scales_, end_scale_, window_mask_=None):
+    return _stats.feature_dmp(np.float32(block_array_), block_size_, scales_, end_scale_, window_mask=window_mask_)
 
 
 # def call_hog(gradient_array_, orientation_array_, block_size_, scales_, end_scale_):
 #     return _hog.feature_hog(gradient_array_, orientation_array_, block_size_, scales_, end_scale_)
 
 
-def call_hog(block_array_, block_size_, scales_, end_scale_):
-    return _stats.feature_hog(np.float32(block_array_), block_size_, scales_, end_scale_)
+def call_hog(block_array_, block_size_, scales_, end_scale_, window_mask_=None):
+    return _stats.feature_hog(np.float32(block_array_), block_size_, scales_, end_scale_, window_mask=window_mask_)
 
 
 def call_hough(block_array_, block_size_, scales_, end_scale_, threshold_, min_len_, line_gap_):
@@ -103,60 +86,60 @@ def call_lbp(block_array_, block_size_, scales_, end_scale_):
     return _stats.feature_lbp(block_array_, block_size_, scales_, end_scale_)
 
 
-def call_lbpm(block_array_, block_size_, scales_, end_scale_):
-    return _stats.feature_lbpm(block_array_, block_size_, scales_, end_scale_)
+def call_lbpm(block_array_, block_size_, scales_, end_scale_, window_mask_=None):
+    return _stats.feature_lbpm(block_array_, block_size_, scales_, end_scale_, window_mask=window_mask_)
 
 
-def call_lacunarity(block_array_, block_size_, scales_, end_scale_, lac_r_):
-    return _stats.feature_lacunarity(np.uint8(block_array_), block_size_, scales_, end_scale_, lac_r_)
+def call_lacunarity(block_array_, block_size_, scales_, end_scale_, lac_r_, window_mask_=None):
+    return _stats.feature_lacunarity(np.uint8(block_array_), block_size_, scales_, end_scale_, lac_r_, window_mask=window_mask_)
 
 
 def call_lsr(block_array_, block_size_, scales_, end_scale_):
     return spfunctions.feature_lsr(block_array_, block_size_, scales_, end_scale_)
 
 
-def call_mean(block_array_, block_size_, scales_, end_scale_):
-    return _stats.feature_mean(np.float32(block_array_), block_size_, scales_, end_scale_)
+def call_mean(block_array_, block_size_, scales_, end_scale_, window_mask_=None, weight_scale_=1.):
+    return _stats.feature_mean(np.float32(block_array_), block_size_, scales_, end_scale_, window_mask=window_mask_, weight_scale=weight_scale_)
 
 
-def call_orb(block_array_, block_size_, scales_, end_scale_):
-    return _stats.feature_orb(np.uint8(np.ascontiguousarray(block_array_)), block_size_, scales_, end_scale_)
+def call_orb(block_array_, block_size_, scales_, end_scale_, window_mask_=None):
+    return _stats.feature_orb(np.uint8(np.ascontiguousarray(block_array_)), block_size_, scales_, end_scale_, window_mask=window_mask_)
 
 
-def call_pantex(block_array_, block_size_, scales_, end_scale_, weighted_):
-    return _stats.feature_pantex(np.uint8(block_array_), block_size_, scales_, end_scale_, weighted_)
+def call_pantex(block_array_, block_size_, scales_, end_scale_, weighted_, window_mask_=None):
+    return _stats.feature_pantex(np.uint8(block_array_), block_size_, scales_, end_scale_, weighted_, window_mask=window_mask_)
 
 
-def call_sfs(block_array_, block_size_, scales_, end_scale_, sfs_thresh_, sfs_skip_):
-    return _stats.feature_sfs(np.uint8(block_array_), block_size_, scales_, end_scale_, sfs_thresh_, skip_factor=sfs_skip_)
+def call_sfs(block_array_, block_size_, scales_, end_scale_, sfs_thresh_, sfs_skip_, window_mask_=None):
+    return _stats.feature_sfs(np.uint8(block_array_), block_size_, scales_, end_scale_, sfs_thresh_, skip_factor=sfs_skip_, window_mask=window_mask_)
 
 
-def call_func(block_array_, block_size_, scales_, end_scale_, trigger_, **kwargs):
+def call_func(block_array_, block_size_, scales_, end_scale_, trigger_, window_mask_=None, **kwargs):
 
     if trigger_ in ['grad', 'mean', 'saliency', 'seg']:
-        return call_mean(block_array_, block_size_, scales_, end_scale_)
+        return call_mean(block_array_, block_size_, scales_, end_scale_, window_mask_=window_mask_, weight_scale_=kwargs.get('weight_scale', 1.))
     elif trigger_ == 'dmp':
-        return call_dmp(block_array_, block_size_, scales_, end_scale_)
+        return call_dmp(block_array_, block_size_, scales_, end_scale_, window_mask_=window_mask_)
     elif trigger_ == 'fourier':
         return call_fourier(block_array_, block_size_, scales_, end_scale_)
     elif trigger_ == 'gabor':
-        return call_gabor(block_array_, block_size_, scales_, end_scale_)
+        return call_gabor(block_array_, block_size_, scales_, end_scale_, window_mask_=window_mask_, weight_scale_=kwargs.get('weight_scale', 1.))
     elif trigger_ == 'hog':
-        return call_hog(block_array_, block_size_, scales_, end_scale_)
+        return call_hog(block_array_, block_size_, scales_, end_scale_, window_mask_=window_mask_)
     elif trigger_ == 'lbp':
         return call_lbp(block_array_, block_size_, scales_, end_scale_)
     elif trigger_ == 'lbpm':
-        return call_lbpm(block_array_, block_size_, scales_, end_scale_)
+        return call_lbpm(block_array_, block_size_, scales_, end_scale_, window_mask_=window_mask_)
     elif trigger_ == 'lac':
-        return call_lacunarity(block_array_, block_size_, scales_, end_scale_, kwargs['lac_r'])
+        return call_lacunarity(block_array_, block_size_, scales_, end_scale_, kwargs['lac_r'], window_mask_=window_mask_)
     elif trigger_ == 'lsr':
         return call_lsr(block_array_, block_size_, scales_, end_scale_)
     elif trigger_ == 'orb':
-        return call_orb(block_array_, block_size_, scales_, end_scale_)
+        return call_orb(block_array_, block_size_, scales_, end_scale_, window_mask_=window_mask_)
     elif trigger_ == 'pantex':
-        return call_pantex(block_array_, block_size_, scales_, end_scale_, kwargs['weight'])
+        return call_pantex(block_array_, block_size_, scales_, end_scale_, kwargs['weight'], window_mask_=window_mask_)
     elif trigger_ == 'sfs':
-        return call_sfs(block_array_, block_size_, scales_, end_scale_, kwargs['sfs_threshold'], kwargs['sfs_skip'])
+        return call_sfs(block_array_, block_size_, scales_, end_scale_, kwargs['sfs_threshold'], kwargs['sfs_skip'], window_mask_=window_mask_)
 
 # def call_surf(block_array_, block_size_, scales_, end_scale_):
 #     return _stats.feature_surf(block_array_, block_size_, scales_, end_scale_)
@@ -302,6 +285,7 @@ def sfs_orfeo(parameter_object):
 
 def test_plot(bd, bdOrig, trigger, parameter_object):
     
+    import matplotlib.pyplot as plt
     import matplotlib.cm as cm
 
     my_cmap = cm.autumn
@@ -371,6 +355,9 @@ def test_plot(bd, bdOrig, trigger, parameter_object):
 
 
 def get_slopes(X, y):
+
+    from scipy.stats import linregress
+
     slope, __, __, __, __ = linregress(X, y)
     return slope
 
@@ -387,25 +374,45 @@ def wrapper(func, *args, **kwargs):
     return wrapped
 
 
-def get_section_stats(bd, section_rows, section_cols, parameter_object, section_counter):
+# Triggers that transform the image before feature
+#   processing, rather than using a band directly.
+DERIVED_TRIGGERS = ['dmp', 'gabor', 'grad', 'orb', 'saliency', 'seg']
+
+# The Gabor kernel orientations of each scale (see `convolve_gabor`).
+GABOR_ORIENTATIONS = 8
+
+
+def get_out_d_range(parameter_object):
 
     """
-    Split section into chunks and process features at each scale
-    
+    Gets the 8-bit output range of the current trigger
+
+    Args:
+        parameter_object (class object)
+    """
+
+    if parameter_object.trigger in ['pantex', 'lac']:
+        return 0, 31
+    else:
+        return 0, 255
+
+
+def prepare_section(bd, section_rows, section_cols, parameter_object):
+
+    """
+    Scales, equalizes and smooths a section before feature processing
+
     Args:
         bd (ndarray): The section array.
         section_rows (int)
         section_cols (int)
-        parameter_object (class object)        
-    
+        parameter_object (class object)
+
     Returns:
-        List of computed features for each scale, for each statistic.
+        The prepared section array.
     """
 
-    if parameter_object.trigger in ['pantex', 'lac']:
-        out_d_range = (0, 31)
-    else:
-        out_d_range = (0, 255)
+    out_d_range = get_out_d_range(parameter_object)
 
     # Scale the data to an 8-bit range.
     if (bd.dtype != 'uint8') and (parameter_object.trigger not in parameter_object.spectral_indices):
@@ -418,7 +425,16 @@ def get_section_stats(bd, section_rows, section_cols, parameter_object, section_
     # Apply histogram equalization.
     if parameter_object.trigger != 'dmp':
 
-        if parameter_object.equalize:
+        # The global look-up table only applies
+        #   to sections read from a band.
+        use_global_lut = parameter_object.equalize and \
+                         (getattr(parameter_object, 'equalize_lut', None) is not None) and \
+                         (parameter_object.trigger not in parameter_object.spectral_indices + DERIVED_TRIGGERS)
+
+        if use_global_lut:
+            bd = parameter_object.equalize_lut[bd]
+
+        elif parameter_object.equalize:
             bd = equalize_hist(bd, nbins=256)
 
         elif parameter_object.equalize_adapt:
@@ -429,7 +445,7 @@ def get_section_stats(bd, section_rows, section_cols, parameter_object, section_
                                     clip_limit=.05,
                                     nbins=256)
 
-        if parameter_object.equalize or parameter_object.equalize_adapt:
+        if (parameter_object.equalize and not use_global_lut) or parameter_object.equalize_adapt:
 
             bd = np.uint8(rescale_intensity(bd,
                                             in_range=(0., 1.0),
@@ -439,6 +455,185 @@ def get_section_stats(bd, section_rows, section_cols, parameter_object, section_
         if parameter_object.smooth > 0:
             bd = np.uint8(cv2.bilateralFilter(bd, parameter_object.smooth, 0.1, 0.1))
 
+    return bd
+
+
+def get_approx_stats(bd, parameter_object, trigger, exact_scales, approx_scales, window_mask, other_args):
+
+    """
+    Computes the small scales exactly and the large scales on a downsampled section
+
+    The large scales are computed at 1/factor of the scale on a
+    section downsampled by the factor and mapped back onto the output grid.
+
+    Args:
+        bd (ndarray): The prepared section array.
+        parameter_object (class object)
+        trigger (str): The kernel trigger.
+        exact_scales (list): The scales computed at full resolution.
+        approx_scales (list): The scales computed on the downsampled section.
+        window_mask (1d array): A flattened mask of windows to process (1) or skip (0).
+        other_args (dict): The trigger arguments.
+
+    Returns:
+        The <features x rows x columns> array, ordered by scale
+    """
+
+    factor = parameter_object.approx_factor
+    blk = parameter_object.block
+    end_scale = parameter_object.scales[-1]
+
+    rows, cols = bd.shape[-2:]
+
+    block_ds = max(1, int(blk / factor))
+    scales_ds = [max(block_ds, int(scale / factor)) for scale in approx_scales]
+    end_scale_ds = scales_ds[-1]
+
+    rows_ds = int(rows / factor)
+    cols_ds = int(cols / factor)
+
+    # Small sections fall back to the exact scales.
+    if (rows_ds - (end_scale_ds - block_ds) <= 0) or (cols_ds - (end_scale_ds - block_ds) <= 0):
+
+        return call_func(bd,
+                         blk,
+                         parameter_object.scales,
+                         end_scale,
+                         trigger,
+                         window_mask_=window_mask,
+                         **other_args)
+
+    out_rows = len(range(0, rows-(end_scale-blk), blk))
+    out_cols = len(range(0, cols-(end_scale-blk), blk))
+
+    # Gabor sections hold the kernel responses of each scale, in scale order.
+    if trigger == 'gabor':
+
+        n_exact_layers = GABOR_ORIENTATIONS * len(exact_scales)
+
+        bd_exact = bd[:n_exact_layers]
+        bd_approx = bd[n_exact_layers:]
+
+    else:
+
+        bd_exact = bd
+        bd_approx = bd
+
+    stats_list = list()
+
+    if exact_scales:
+
+        # The largest scale is kept as the end
+        #   scale so that the output grid is unchanged.
+        stats_list.append(call_func(bd_exact,
+                                    blk,
+                                    exact_scales,
+                                    end_scale,
+                                    trigger,
+                                    window_mask_=window_mask,
+                                    **other_args))
+
+    # The window mask is on the full resolution grid, so every
+    #   downsampled window is computed and masked windows
+    #   are cleared after the features are reshaped. The distance
+    #   weights of the mean and Gabor kernels are matched to the
+    #   full resolution weights.
+    stats_ds = call_func(spapprox.downsample_section(bd_approx, factor),
+                         block_ds,
+                         scales_ds,
+                         end_scale_ds,
+                         trigger,
+                         weight_scale=spapprox.get_mean_weight_scales(approx_scales, scales_ds),
+                         **other_args)
+
+    stats_list.append(spapprox.map_to_grid(stats_ds,
+                                           out_rows,
+                                           out_cols,
+                                           blk,
+                                           end_scale,
+                                           block_ds,
+                                           end_scale_ds,
+                                           factor))
+
+    # Multi-channel mean features are ordered by channel, then by scale.
+    if (trigger == 'mean') and (bd.ndim == 3):
+
+        stats_list = [stats.reshape(bd.shape[0], -1, out_rows, out_cols) for stats in stats_list]
+
+        return np.ascontiguousarray(np.concatenate(stats_list, axis=1).reshape(-1, out_rows, out_cols), dtype='float32')
+
+    return np.ascontiguousarray(np.concatenate(stats_list, axis=0), dtype='float32')
+
+
+def get_scale_stats(bd, parameter_object, trigger, window_mask, other_args):
+
+    """
+    Computes the features of a prepared section at each scale
+
+    Args:
+        bd (ndarray): The prepared section array.
+        parameter_object (class object)
+        trigger (str): The kernel trigger.
+        window_mask (1d array): A flattened mask of windows to process (1) or skip (0).
+        other_args (dict): The trigger arguments.
+
+    Returns:
+        The computed features
+    """
+
+    exact_scales, approx_scales = spapprox.get_approx_scales(parameter_object)
+
+    if approx_scales:
+
+        return get_approx_stats(bd,
+                                parameter_object,
+                                trigger,
+                                exact_scales,
+                                approx_scales,
+                                window_mask,
+                                other_args)
+
+    return call_func(bd,
+                     parameter_object.block,
+                     parameter_object.scales,
+                     parameter_object.scales[-1],
+                     trigger,
+                     window_mask_=window_mask,
+                     **other_args)
+
+
+def get_section_stats(bd, section_rows, section_cols, parameter_object, section_counter, prepared=False, window_mask=None):
+
+    """
+    Split section into chunks and process features at each scale
+    
+    Args:
+        bd (ndarray): The section array.
+        section_rows (int)
+        section_cols (int)
+        parameter_object (class object)        
+        section_counter (int)
+        prepared (Optional[bool]): Whether the section was already prepared with `prepare_section`.
+        window_mask (Optional[2d array]): A mask of windows to process (1) or skip (0).
+
+    Returns:
+        List of computed features for each scale, for each statistic.
+    """
+
+    # Fused spectral indices are stacked
+    #   as <indices x rows x columns>.
+    is_stacked = (bd.ndim == 3) and (parameter_object.trigger in parameter_object.spectral_indices)
+
+    if not prepared:
+
+        if is_stacked:
+
+            bd = np.array([prepare_section(index_layer, section_rows, section_cols, parameter_object)
+                           for index_layer in bd])
+
+        else:
+            bd = prepare_section(bd, section_rows, section_cols, parameter_object)
+
     # elif parameter_object.trigger == 'lbp':
     #
     #     if parameter_object.visualize:
@@ -513,17 +708,18 @@ def get_section_stats(bd, section_rows, section_cols, parameter_object, section_
 
     other_args = func_dict[parameter_object.trigger]['args']
 
+    # The kernels index windows on the flattened mask.
+    if isinstance(window_mask, np.ndarray):
+        window_mask = np.ascontiguousarray(window_mask, dtype='uint8').ravel()
+
     if parameter_object.trigger in parameter_object.spectral_indices:
         trigger = 'mean'
     else:
         trigger = parameter_object.trigger
 
-    return call_func(bd,
-                     parameter_object.block,
-                     parameter_object.scales,
-                     parameter_object.scales[-1],
-                     trigger,
-                     **other_args)
+    # Stacked spectral indices are computed in one pass of the
+    #   mean kernel, ordered by index, then by scale.
+    return get_scale_stats(bd, parameter_object, trigger, window_mask, other_args)
 
     # return Parallel(n_jobs=parameter_object.n_jobs_chunk,
     #                 max_nbytes=None)(delayed(call_func)(bd[chi[0]:chi[1],
@@ -77,3 +77,1075 @@ def test_features():
     logger.info('  SpFeas tests were OK.')
 
     shutil.rmtree(test_features_dir)
+
+
+def test_storage():
+
+    """
+    Test the integer storage round trip
+    """
+
+    from .sphelpers import spstorage
+
+    rng = np.random.RandomState(0)
+
+    features = np.float32(rng.rand(3, 20, 30) * 100. - 50.)
+
+    # The first columns are masked, and hold values far outside the valid range.
+    valid_mask = np.ones((20, 30), dtype='bool')
+    valid_mask[:, :5] = False
+
+    features[:, :, :5] = 1e6
+    features[0, 0, 10] = np.nan
+
+    for storage in ['uint8', 'uint16']:
+
+        levels = spstorage.STORAGE_LEVELS[storage]
+
+        scales, offsets = spstorage.get_band_scales(features, levels, valid_mask=valid_mask)
+
+        assert np.all(np.isfinite(scales)) and np.all(np.isfinite(offsets))
+        assert np.all(offsets >= -50.) and np.all(offsets + scales * levels <= 50.)
+
+        stored_array, stored_scales, stored_offsets = spstorage.quantize_section(features,
+                                                                                 storage,
+                                                                                 storage,
+                                                                                 scales=scales,
+                                                                                 offsets=offsets)
+
+        assert stored_array.dtype == storage
+        assert np.allclose(stored_scales, scales) and np.allclose(stored_offsets, offsets)
+
+        # NaN is stored as the band offset.
+        assert stored_array[0, 0, 10] == 0
+
+        restored = spstorage.dequantize_section(stored_array, scales, offsets)
+
+        valid_cells = valid_mask[np.newaxis] & np.isfinite(features)
+
+        # The error is at most half of a quantization step.
+        step_error = np.abs(restored - features) - (scales[:, np.newaxis, np.newaxis] / 2.)
+
+        assert step_error[valid_cells].max() <= 1e-4
+
+        # A section with a narrower range keeps the shared codes.
+        narrow_array = np.float32(features[:, :, 5:] * 0.5)
+
+        narrow_stored = spstorage.quantize_section(narrow_array,
+                                                   storage,
+                                                   storage,
+                                                   scales=scales,
+                                                   offsets=offsets)[0]
+
+        narrow_restored = spstorage.dequantize_section(narrow_stored, scales, offsets)
+
+        narrow_error = np.abs(narrow_restored - narrow_array) - (scales[:, np.newaxis, np.newaxis] / 2.)
+
+        assert narrow_error[np.isfinite(narrow_array)].max() <= 1e-4
+
+        assert spstorage.quantization_error(features[:, :, 5:],
+                                            stored_array[:, :, 5:],
+                                            scales,
+                                            offsets) <= scales.max() / 2. + 1e-4
+
+    # The section range ignores NaN without a mask.
+    scales, offsets = spstorage.get_band_scales(features[:, :, 5:], 255)
+
+    assert np.all(np.isfinite(scales)) and np.all(np.isfinite(offsets))
+
+    # Half precision matches the float32 raster, which is packed with 16 bits.
+    half_array = spstorage.quantize_section(features[:, :, 5:], 'float16', 'float16')[0]
+
+    assert spstorage.get_raster_storage('float16')[0] == half_array.dtype == 'float32'
+    assert np.array_equal(half_array, np.float32(np.float16(features[:, :, 5:])), equal_nan=True)
+
+
+def test_reconstruction():
+
+    """
+    Test the DMP reconstruction engine against scikit-image
+    """
+
+    from skimage.morphology import reconstruction
+
+    from .sphelpers import _morph
+
+    rng = np.random.RandomState(0)
+
+    mask = np.uint8(rng.randint(0, 256, size=(40, 50)))
+
+    for se_size in [3, 5, 9]:
+
+        se = np.ones((se_size, se_size), dtype='uint8')
+
+        for method, marker in [('dilation', np.uint8(np.maximum(np.int16(mask) - 60, 0))),
+                               ('erosion', np.uint8(np.minimum(np.int16(mask) + 60, 255)))]:
+
+            # Scikit-image renamed `selem` to `footprint`.
+            try:
+                good_recon = reconstruction(marker, mask, method=method, footprint=se)
+            except TypeError:
+                good_recon = reconstruction(marker, mask, method=method, selem=se)
+
+            test_recon = _morph.reconstruction(marker, mask, se_size, method=method)
+
+            assert np.array_equal(test_recon, np.uint8(good_recon))
+
+
+def test_queue():
+
+    """
+    Test the job queue states
+    """
+
+    import tempfile
+
+    from . import spserve
+
+    queue_dir = tempfile.mkdtemp()
+
+    try:
+
+        first_id = spserve.submit_job(queue_dir, 'first_image.tif', 'first_features', block=4, scales=[8])
+        second_id = spserve.submit_job(queue_dir, 'second_image.tif', 'second_features', block=2, scales=[8, 16])
+
+        assert spserve.get_queue_status(queue_dir)['pending'] == sorted([first_id, second_id])
+
+        # Jobs are claimed in submission order.
+        first_file = spserve._claim_job(queue_dir)
+        first_dict = spserve._start_job(first_file)
+
+        assert first_dict['job_id'] == first_id
+        assert first_dict['parameters'] == dict(block=4, scales=[8])
+
+        second_file = spserve._claim_job(queue_dir)
+        second_dict = spserve._start_job(second_file)
+
+        assert second_dict['job_id'] == second_id
+        assert spserve._claim_job(queue_dir) is None
+        assert spserve.get_queue_status(queue_dir)['running'] == sorted([first_id, second_id])
+
+        # The server of the running jobs is alive.
+        assert spserve.requeue_stale_jobs(queue_dir) == list()
+
+        spserve._finish_job(queue_dir, first_file, first_dict, 0.)
+        spserve._finish_job(queue_dir, second_file, second_dict, 0., error='Traceback')
+
+        queue_status = spserve.get_queue_status(queue_dir)
+
+        assert queue_status['done'] == [first_id]
+        assert queue_status['failed'] == [second_id]
+        assert queue_status['running'] == list()
+
+        failed_dict = spserve._load_job(os.path.join(queue_dir, 'failed', '{}.yaml'.format(second_id)))
+
+        assert failed_dict['error'] == 'Traceback'
+
+        # A running job without a server heartbeat is requeued.
+        third_id = spserve.submit_job(queue_dir, 'third_image.tif', 'third_features')
+
+        third_file = spserve._claim_job(queue_dir)
+
+        assert spserve.requeue_stale_jobs(queue_dir, stale_seconds=0) == [third_id]
+        assert spserve.get_queue_status(queue_dir)['pending'] == [third_id]
+
+    finally:
+        shutil.rmtree(queue_dir)
+
+
+def test_job_configs():
+
+    """
+    Test that server workers only hold the run configurations of one job
+    """
+
+    from . import spserve
+    from . import spprocess
+
+    first_configs = {0: dict(prefetch=0), 1: dict(prefetch=0)}
+    second_configs = {0: dict(prefetch=1)}
+
+    # A task without sections fails after its configurations are installed.
+    job_id, error = spserve._serve_section_read_write(('first', first_configs, (0, 1, list())))
+
+    assert job_id == 'first'
+    assert 'IndexError' in error
+    assert spprocess.run_configs == first_configs
+
+    # The configurations of the next job replace the
+    #   previous ones, which may share their ids.
+    spserve._serve_section_read_write(('second', second_configs, (0, 1, list())))
+
+    assert spprocess.run_configs == second_configs
+
+    # The server removes the configurations of finished jobs.
+    run_configs = {0: dict(), 1: dict(), 2: dict()}
+
+    spserve._drop_job_configs(dict(scene_dict=dict(config_ids=[0, 1])), run_configs)
+    spserve._drop_job_configs(dict(scene_dict=None), run_configs)
+
+    assert sorted(run_configs) == [2]
+
+
+def test_cost_model():
+
+    """
+    Test the section cost model fit
+    """
+
+    from .sphelpers import spcost
+
+    cost_model = spcost.CostModel()
+
+    # Untimed triggers use the default rate.
+    assert cost_model.get_coefficients('mean') == (spcost.DEFAULT_RATE, 0.)
+    assert cost_model.estimate('mean', 2., 0.5) == 2. * spcost.DEFAULT_RATE
+
+    # Fewer than three sections fall back to an area rate.
+    cost_model.update('mean', 1., 0.2, 3.)
+    cost_model.update('mean', 2., 0.8, 6.)
+
+    assert np.allclose(cost_model.get_coefficients('mean'), (3., 0.))
+
+    # The fit recovers the coefficients of noise-free timings.
+    area_coeff = 0.5
+    texture_coeff = 4.
+
+    rng = np.random.RandomState(0)
+
+    for megapixels, probe in zip(rng.uniform(0.1, 4., size=20), rng.uniform(0., 1., size=20)):
+        cost_model.update('lbp', megapixels, probe, megapixels * (area_coeff + texture_coeff * probe))
+
+    assert np.allclose(cost_model.get_coefficients('lbp'), (area_coeff, texture_coeff))
+
+    # Textured sections of the same area are estimated to take longer.
+    assert cost_model.estimate('lbp', 1., 0.9) > cost_model.estimate('lbp', 1., 0.1)
+
+    # Sections without valid pixels are not timed.
+    cost_model.update('lbp', 0., 0.5, 10.)
+
+    assert cost_model.model_dict['lbp'][-1] == 20
+
+    # The model is restored from the status file dictionary.
+    restored_model = spcost.CostModel(cost_model.to_dict())
+
+    assert np.allclose(restored_model.get_coefficients('lbp'), (area_coeff, texture_coeff))
+    assert restored_model.get_coefficients('mean') == cost_model.get_coefficients('mean')
+
+
+def test_collapsed_stacks():
+
+    """
+    Test the flame graph stacks of a profile
+    """
+
+    from .sphelpers import spprofile
+
+    main_func = ('/spfeas/spprocess.py', 10, 'main')
+    first_func = ('/spfeas/spprocess.py', 20, 'first')
+    second_func = ('/spfeas/spprocess.py', 30, 'second')
+    leaf_func = ('~', 0, '<built-in method leaf>')
+
+    # (primitive calls, calls, self time, total time, callers) of each function,
+    #   where `leaf` is called from both `first` and `second`, and calls itself.
+    class ProfileStats(object):
+
+        stats = {main_func: (1, 1, 1., 10., dict()),
+                 first_func: (1, 1, 1., 4., {main_func: (1, 1, 1., 4.)}),
+                 second_func: (1, 1, 2., 5., {main_func: (1, 1, 2., 5.)}),
+                 leaf_func: (2, 3, 6., 6., {first_func: (1, 1, 3., 3.),
+                                            second_func: (1, 1, 3., 3.),
+                                            leaf_func: (1, 1, 1., 1.)})}
+
+    collapsed_stacks = spprofile.get_collapsed_stacks(ProfileStats())
+
+    good_stacks = {'main (spprocess.py:10)': 1.,
+                   'main (spprocess.py:10);first (spprocess.py:20)': 1.,
+                   'main (spprocess.py:10);first (spprocess.py:20);<built-in method leaf>': 3.,
+                   'main (spprocess.py:10);second (spprocess.py:30)': 2.,
+                   'main (spprocess.py:10);second (spprocess.py:30);<built-in method leaf>': 3.}
+
+    assert sorted(collapsed_stacks) == sorted(good_stacks)
+
+    for stack_key, stack_time in good_stacks.items():
+        assert np.isclose(collapsed_stacks[stack_key], stack_time)
+
+    # The self times add up to the total time of the root.
+    assert np.isclose(sum(collapsed_stacks.values()), 10.)
+
+
+def test_autotune_selection():
+
+    """
+    Test the autotune run time predictions
+    """
+
+    from .sphelpers import sptune
+
+    # Four processes at once are memory bound.
+    size_timing = dict(section_size=500,
+                       n_sections=8,
+                       seconds=1.,
+                       concurrent_jobs=4,
+                       concurrent_seconds=4.5,
+                       peak_mem=100.)
+
+    assert np.isclose(sptune.get_section_seconds(size_timing, 1), 1.)
+    assert np.isclose(sptune.get_section_seconds(size_timing, 2), 1. + 3.5 / 3.)
+    assert np.isclose(sptune.get_section_seconds(size_timing, 4), 4.5)
+
+    # One process beats the section rounds saved by more processes.
+    section_size, n_jobs, predicted_seconds = sptune.select_configuration([size_timing], 4, None)
+
+    assert (section_size, n_jobs) == (500, 1)
+    assert np.isclose(predicted_seconds, 8 * (1. + sptune.TASK_OVERHEAD))
+
+    # Processes scale when they run as fast together as alone.
+    size_timing.update(concurrent_seconds=1.)
+
+    assert sptune.select_configuration([size_timing], 4, None)[1] == 4
+
+    # Only the process counts that fit in memory are timed.
+    worker_mem = sptune.get_worker_mem(size_timing['peak_mem'])
+
+    assert sptune.get_concurrent_jobs(size_timing['peak_mem'], 4, int(worker_mem * 3)) == 2
+    assert sptune.get_concurrent_jobs(size_timing['peak_mem'], 4, int(worker_mem / 2)) == 1
+    assert sptune.get_concurrent_jobs(size_timing['peak_mem'], 4, None) == 4
+
+
+def test_approx_mean():
+
+    """
+    Test the approximated mean features against the exact features
+    """
+
+    from . import spsplit
+    from .sphelpers import sputilities
+
+    rows, cols = np.mgrid[0:300, 0:300]
+
+    rng = np.random.RandomState(0)
+
+    # A smooth section with a little noise.
+    smooth_section = np.float32(500. + 200. * np.sin(rows / 23.) * np.cos(cols / 31.) + rng.normal(0, 2., size=rows.shape))
+    uniform_section = np.zeros((300, 300), dtype='float32') + 100.
+
+    for approx_factor in [2, 4]:
+
+        parameter_object = sputilities.dict2class(dict(trigger='mean',
+                                                       block=4,
+                                                       scales=[8, 32, 64],
+                                                       approx=dict(),
+                                                       approx_factor=approx_factor))
+
+        exact_uniform = spsplit.get_scale_stats(uniform_section, parameter_object, 'mean', None, dict())
+        exact_smooth = spsplit.get_scale_stats(smooth_section, parameter_object, 'mean', None, dict())
+
+        parameter_object.update_info(approx=dict(mean=32))
+
+        approx_uniform = spsplit.get_scale_stats(uniform_section, parameter_object, 'mean', None, dict())
+        approx_smooth = spsplit.get_scale_stats(smooth_section, parameter_object, 'mean', None, dict())
+
+        # The exact scale is unchanged.
+        assert np.array_equal(exact_smooth[:2], approx_smooth[:2])
+
+        # The (mean, variance) bands of the approximated scales.
+        for band_index in [2, 4]:
+
+            # The distance weights match the full resolution weights.
+            assert np.allclose(approx_uniform[band_index], exact_uniform[band_index], rtol=1e-4)
+
+            exact_mean = exact_smooth[band_index].ravel()
+            approx_mean = approx_smooth[band_index].ravel()
+
+            assert np.corrcoef(exact_mean, approx_mean)[0, 1] > 0.98
+            assert abs(approx_mean.mean() / exact_mean.mean() - 1.) < 0.01
+
+
+def test_approx_gabor():
+
+    """
+    Test the approximated Gabor features against the exact features
+    """
+
+    from . import spsplit
+    from .spfunctions import convolve_gabor
+    from .sphelpers import sputilities
+
+    rows, cols = np.mgrid[0:300, 0:300]
+
+    rng = np.random.RandomState(0)
+
+    section = np.uint8(np.clip(128. +
+                               60. * np.sin(rows / 5.) * np.cos(cols / 9.) +
+                               40. * np.sin(rows / 37.) +
+                               rng.normal(0, 5., size=rows.shape), 0, 255))
+
+    scales = [8, 32, 64]
+
+    # The kernel responses of each scale, in scale order.
+    gabor_section = convolve_gabor(section, 0, 255, scales)
+
+    n_exact_bands = spsplit.GABOR_ORIENTATIONS * 2
+
+    for approx_factor in [2, 4]:
+
+        parameter_object = sputilities.dict2class(dict(trigger='gabor',
+                                                       block=4,
+                                                       scales=scales,
+                                                       approx=dict(),
+                                                       approx_factor=approx_factor))
+
+        exact_features = spsplit.get_scale_stats(gabor_section, parameter_object, 'gabor', None, dict())
+
+        parameter_object.update_info(approx=dict(gabor=32))
+
+        approx_features = spsplit.get_scale_stats(gabor_section, parameter_object, 'gabor', None, dict())
+
+        assert approx_features.shape == exact_features.shape
+
+        # The exact scale is unchanged.
+        assert np.array_equal(exact_features[:n_exact_bands], approx_features[:n_exact_bands])
+
+        # Each approximated band is computed from the responses of its own scale.
+        for band_index in range(n_exact_bands, exact_features.shape[0]):
+
+            exact_values = exact_features[band_index].ravel()
+            approx_values = approx_features[band_index].ravel()
+
+            assert np.corrcoef(exact_values, approx_values)[0, 1] > 0.95
+            assert abs(approx_values.mean() / exact_values.mean() - 1.) < 0.02
+
+
+def _get_mean_reference(ch_stack, block, scales, window_mask=None, weight_scales=None):
+
+    """
+    Computes the mean kernel features of a <channels x rows x columns> stack, one window at a time
+    """
+
+    n_channels, rows, cols = ch_stack.shape
+
+    end_scale = scales[-1]
+    scales_half = int(end_scale / 2.)
+
+    row_starts = list(range(0, rows-(end_scale-block), block))
+    col_starts = list(range(0, cols-(end_scale-block), block))
+
+    out_features = np.zeros((n_channels*len(scales)*2, len(row_starts), len(col_starts)), dtype='float64')
+
+    for out_i, i in enumerate(row_starts):
+        for out_j, j in enumerate(col_starts):
+
+            if (window_mask is not None) and (window_mask[out_i*len(col_starts)+out_j] == 0):
+                continue
+
+            for scale_index, scale in enumerate(scales):
+
+                rc_start = scales_half - int(scale / 2.)
+
+                # Windows at the section edge are clipped.
+                window = np.float64(ch_stack[:, i+rc_start:i+rc_start+scale, j+rc_start:j+rc_start+scale])
+
+                window_rows, window_cols = np.mgrid[0:window.shape[1], 0:window.shape[2]]
+
+                weights = np.hypot(window_rows - scale / 2., window_cols - scale / 2.)
+
+                if weight_scales is not None:
+                    weights *= weight_scales[scale_index]
+
+                for channel_index in range(0, n_channels):
+
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        weighted_values = window[channel_index] / weights
+
+                    window_mean = weighted_values[np.isfinite(weighted_values)].sum() / window[channel_index].size
+
+                    out_band = (channel_index*len(scales) + scale_index) * 2
+
+                    out_features[out_band, out_i, out_j] = window_mean
+                    out_features[out_band+1, out_i, out_j] = np.mean((window[channel_index] - window_mean) ** 2)
+
+    return out_features
+
+
+def test_feature_mean():
+
+    """
+    Test the stacked mean kernel against a reference
+    """
+
+    from .sphelpers import _stats
+
+    rng = np.random.RandomState(0)
+
+    # The section size leaves clipped windows at the edges.
+    ch_stack = np.float32(rng.uniform(0, 255, size=(3, 70, 83)))
+
+    block = 4
+    scales = [8, 16]
+
+    features = _stats.feature_mean(ch_stack, block, scales, scales[-1])
+
+    good_features = _get_mean_reference(ch_stack, block, scales)
+
+    assert features.shape == good_features.shape
+    assert np.allclose(features, good_features, rtol=1e-4, atol=1e-3)
+
+    # A 2d section is one channel of the stack.
+    assert np.array_equal(_stats.feature_mean(ch_stack[1], block, scales, scales[-1]), features[4:8])
+
+    # Masked windows are skipped, and each scale has its own weight factor.
+    window_mask = np.uint8(rng.randint(0, 2, size=features.shape[1]*features.shape[2]))
+
+    features = _stats.feature_mean(ch_stack, block, scales, scales[-1], window_mask=window_mask, weight_scale=[2., 1.5])
+
+    good_features = _get_mean_reference(ch_stack, block, scales, window_mask=window_mask, weight_scales=[2., 1.5])
+
+    assert np.allclose(features, good_features, rtol=1e-4, atol=1e-3)
+    assert np.all(features[:, window_mask.reshape(features.shape[1:]) == 0] == 0)
+
+
+def test_neighbors():
+
+    """
+    Test the neighbor copies and the halo windows of adjacent tiles
+    """
+
+    from .sphelpers import spneighbors
+
+    features = np.float32(np.arange(2*3*4).reshape(2, 3, 4))
+
+    neighbor_features = spneighbors.add_neighbors(features)
+
+    assert neighbor_features.shape == (2*spneighbors.N_COPIES, 3, 4)
+    assert np.array_equal(neighbor_features[:2], features)
+
+    # Each copy holds the adjacent cell, and border cells repeat their own features.
+    for direction_counter, (direction, row_step, col_step) in enumerate(spneighbors.NEIGHBOR_DIRECTIONS):
+
+        neighbor_copy = neighbor_features[2*(direction_counter+1):2*(direction_counter+2)]
+
+        for i in range(0, 3):
+            for j in range(0, 4):
+
+                halo_i = min(max(i + row_step, 0), 2)
+                halo_j = min(max(j + col_step, 0), 3)
+
+                assert np.array_equal(neighbor_copy[:, i, j], features[:, halo_i, halo_j])
+
+    block = 4
+
+    tile = dict(i_sect=40, j_sect=0, rows=10, cols=12)
+
+    # The north tile ends where the tile starts.
+    north_tile = dict(i_sect=0, j_sect=0, rows=10, cols=12)
+
+    assert spneighbors._get_halo_window(tile, north_tile, -1, 0, block) == ((0, 0, 12, 1), (0, 9, 12, 1))
+
+    # The south tile starts where the tile ends.
+    assert spneighbors._get_halo_window(north_tile, tile, 1, 0, block) == ((0, 9, 12, 1), (0, 0, 12, 1))
+
+    # Overlapping tiles share output rows.
+    overlap_tile = dict(i_sect=36, j_sect=0, rows=10, cols=12)
+
+    assert spneighbors._get_halo_window(overlap_tile, north_tile, -1, 0, block) == ((0, 0, 12, 1), (0, 8, 12, 1))
+
+    # The east tile is narrower, so the window covers the shorter tile.
+    east_tile = dict(i_sect=40, j_sect=48, rows=7, cols=5)
+
+    assert spneighbors._get_halo_window(tile, east_tile, 0, 1, block) == ((11, 0, 1, 7), (0, 0, 1, 7))
+    assert spneighbors._get_halo_window(east_tile, tile, 0, -1, block) == ((0, 0, 1, 7), (11, 0, 1, 7))
+
+    # Output cells that do not line up are not exchanged.
+    assert spneighbors._get_halo_window(tile, dict(north_tile, i_sect=2), -1, 0, block) is None
+    assert spneighbors._get_halo_window(tile, dict(north_tile, j_sect=4), -1, 0, block) is None
+
+    # The adjacent cell is outside of the adjacent tile.
+    assert spneighbors._get_halo_window(tile, dict(north_tile, rows=5), -1, 0, block) is None
+
+
+def test_legacy_layout():
+
+    """
+    Test the band lookup of legacy tiles and the output origin offset
+    """
+
+    from .sphelpers import spresults, sputilities
+
+    parameter_object = sputilities.dict2class(dict(triggers=['mean', 'hog'],
+                                                   band_positions=[1, 3],
+                                                   block=4,
+                                                   scales=[8, 16],
+                                                   band_info=dict(mean=0, hog=8),
+                                                   out_bands_dict=dict(mean=4, hog=10),
+                                                   neighbors=False))
+
+    band_layout = spresults.get_band_layout(parameter_object)
+
+    # The second band position of hog follows the first.
+    parameter_object.update_info(trigger='hog', band_position=3)
+
+    assert spresults.get_legacy_start_band(parameter_object, band_layout) == 8 + 10 + 1
+
+    # The current run adds a trigger, which moves hog.
+    parameter_object.update_info(triggers=['mean', 'lac', 'hog'],
+                                 band_info=dict(mean=0, lac=8, hog=12),
+                                 out_bands_dict=dict(mean=4, lac=2, hog=10))
+
+    assert spresults.get_legacy_start_band(parameter_object, band_layout) == 8 + 10 + 1
+
+    # Features that are not in the legacy tiles are not read.
+    parameter_object.update_info(trigger='lac')
+
+    assert spresults.get_legacy_start_band(parameter_object, band_layout) is None
+
+    parameter_object.update_info(trigger='mean', band_position=2)
+
+    assert spresults.get_legacy_start_band(parameter_object, band_layout) is None
+
+    parameter_object.update_info(band_position=1, scales=[8, 32])
+
+    assert spresults.get_legacy_start_band(parameter_object, band_layout) is None
+    assert spresults.get_legacy_start_band(parameter_object, None) is None
+
+    # The output origin is the half scale less the half block, as in the kernels.
+    for block, scales, block_offset in [(4, [8, 16], 6), (3, [8], 3), (3, [9], 3), (1, [8], 4)]:
+
+        parameter_object.update_info(block=block, scales=scales)
+
+        assert sputilities.get_block_offset(parameter_object) == block_offset
+
+
+def test_update_sections():
+
+    """
+    Test that an update only re-processes sections with changed input
+    """
+
+    from .sphelpers import spresults
+
+    section_hashes = dict([('TL{:06}'.format(sect_counter), 'hash{:d}'.format(sect_counter))
+                           for sect_counter in range(1, 5)])
+
+    status_dict = dict(ALL_FINISHED='yes')
+
+    # Every section is processed without earlier checksums.
+    assert spresults.get_changed_sections(status_dict, dict(section_hashes), 4) is None
+    assert status_dict['SECTION_HASHES'] == section_hashes
+
+    # Unchanged input reuses every tile.
+    assert spresults.get_changed_sections(status_dict, dict(section_hashes), 4) == list()
+    assert status_dict['ALL_FINISHED'] == 'yes'
+
+    changed_hashes = dict(section_hashes, TL000002='changed')
+
+    assert spresults.get_changed_sections(status_dict, changed_hashes, 4) == [2]
+    assert status_dict['ALL_FINISHED'] == 'no'
+
+    # The changed sections of an unfinished update are kept.
+    changed_hashes = dict(changed_hashes, TL000004='changed')
+
+    assert spresults.get_changed_sections(status_dict, changed_hashes, 4) == [2, 4]
+
+
+def test_section_cache():
+
+    """
+    Test that prepared sections are shared between triggers and bands
+    """
+
+    import os
+    import time
+    import tempfile
+
+    from . import spprocess
+    from .sphelpers import sputilities
+
+    cache_dir = tempfile.mkdtemp()
+
+    try:
+
+        parameter_object = sputilities.dict2class(dict(section_cache_dir=cache_dir,
+                                                       cache_size=1,
+                                                       trigger='mean',
+                                                       spectral_indices=['ndvi', 'evi2'],
+                                                       use_rgb=False,
+                                                       band_position=1,
+                                                       image_min=0,
+                                                       image_max=255,
+                                                       equalize=False,
+                                                       equalize_adapt=False,
+                                                       smooth=0,
+                                                       global_stats=False))
+
+        section_cache, mean_key = spprocess._get_section_cache_key(parameter_object, 0, 0, 100, 100)
+
+        # Triggers that read the same prepared section share the key.
+        parameter_object.update_info(trigger='hog')
+
+        assert spprocess._get_section_cache_key(parameter_object, 0, 0, 100, 100)[1] == mean_key
+
+        # Other windows, bands and output ranges are cached apart.
+        assert spprocess._get_section_cache_key(parameter_object, 0, 100, 100, 100)[1] != mean_key
+
+        parameter_object.update_info(band_position=2)
+
+        assert spprocess._get_section_cache_key(parameter_object, 0, 0, 100, 100)[1] != mean_key
+
+        parameter_object.update_info(trigger='lac', band_position=1)
+
+        assert spprocess._get_section_cache_key(parameter_object, 0, 0, 100, 100)[1] != mean_key
+
+        # Triggers with their own transform are not cached.
+        parameter_object.update_info(trigger='gabor')
+
+        assert spprocess._get_section_cache_key(parameter_object, 0, 0, 100, 100)[1] is None
+
+        parameter_object.update_info(trigger='ndvi')
+
+        assert spprocess._get_section_cache_key(parameter_object, 0, 0, 100, 100)[1] is None
+
+        section_array = np.uint8(np.random.RandomState(0).randint(0, 255, size=(100, 100)))
+
+        assert section_cache.get(mean_key) is None
+
+        section_cache.put(mean_key, section_array)
+
+        cached_array = section_cache.get(mean_key)
+
+        assert np.array_equal(cached_array, section_array)
+
+        # The cached array is writable without changing the cache.
+        cached_array[:] = 0
+
+        assert np.array_equal(section_cache.get(mean_key), section_array)
+
+        # The least recently used section is removed to stay in budget.
+        large_keys = [section_cache.get_key('large', key_index) for key_index in range(0, 3)]
+
+        for key_index, large_key in enumerate(large_keys[:2]):
+
+            section_cache.put(large_key, np.zeros((400, 1024), dtype='uint8'))
+
+            cache_time = time.time() - 100 + key_index
+            os.utime(section_cache._get_file(large_key), (cache_time, cache_time))
+
+        # Loading a section marks it as used.
+        assert section_cache.get(large_keys[0]) is not None
+
+        section_cache.put(large_keys[2], np.zeros((400, 1024), dtype='uint8'))
+
+        assert section_cache.get(large_keys[1]) is None
+
+        for cache_key in [mean_key, large_keys[0], large_keys[2]]:
+            assert section_cache.get(cache_key) is not None
+
+        # Sections larger than the budget are not cached.
+        section_cache.put('too_large', np.zeros((2048, 1024), dtype='uint8'))
+
+        assert section_cache.get('too_large') is None
+
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def _read_mean_features(features_dir):
+
+    """Reads every band of the mean test features"""
+
+    with gl.ropen(os.path.join(features_dir, 'test_image__BD1_BK4_SC8_TRmean.vrt')) as f_info:
+
+        feature_bands = np.array([f_info.read(bands2open=band_position, d_type='float32')
+                                  for band_position in range(1, f_info.bands+1)], dtype='float32')
+
+    del f_info
+
+    return feature_bands
+
+
+def _check_mean_features(**kwargs):
+
+    """Checks the mean test features of a run against the reference features"""
+
+    import tempfile
+
+    data_dir = os.path.join(SPFEAS_PATH, 'data')
+    test_features_dir = tempfile.mkdtemp()
+
+    try:
+
+        spatial_features(os.path.join(data_dir, 'test_image.tif'),
+                         test_features_dir,
+                         band_positions=[1],
+                         block=4,
+                         scales=[8],
+                         triggers=['mean'],
+                         **kwargs)
+
+        good_features = _read_mean_features(os.path.join(data_dir, '_features'))
+        test_features = _read_mean_features(test_features_dir)
+
+        assert test_features.shape == good_features.shape
+        assert np.allclose(test_features, good_features)
+
+    finally:
+        shutil.rmtree(test_features_dir)
+
+
+def test_prefetch():
+
+    """
+    Test the prefetch queue depths and the prefetched features
+    """
+
+    from . import spprocess
+    from .sphelpers import sputilities
+
+    parameter_object = sputilities.dict2class(dict(trigger='mean',
+                                                   triggers=['mean'],
+                                                   spectral_indices=['ndvi', 'evi2'],
+                                                   use_rgb=False,
+                                                   fused_triggers=None,
+                                                   sect_row_size=1000,
+                                                   sect_col_size=1000,
+                                                   block=4,
+                                                   out_bands_dict=dict(mean=2),
+                                                   prefetch=4,
+                                                   prefetch_mem=1024))
+
+    assert spprocess._get_queue_depths(parameter_object) == (4, 4)
+
+    # The memory cap holds one 4 MB input section and eight 0.5 MB outputs.
+    parameter_object.update_info(prefetch_mem=8)
+
+    assert spprocess._get_queue_depths(parameter_object) == (1, 4)
+
+    # At least one section is always queued.
+    parameter_object.update_info(prefetch_mem=1)
+
+    assert spprocess._get_queue_depths(parameter_object) == (1, 1)
+
+    # The four test sections are processed in batches of two.
+    _check_mean_features(prefetch=1, n_jobs=2)
+
+
+def _get_block_means(section_array):
+    return section_array.reshape(25, 4, 25, 4).mean(axis=(1, 3)).reshape(1, 25, 25)
+
+
+def _compute_shared_section(section_ring, slot, in_shape, in_dtype):
+
+    """Writes the block means of a shared input section to the output buffer of its slot"""
+
+    section_ring.put_output(slot, _get_block_means(section_ring.get_input(slot, in_shape, in_dtype)))
+
+
+def test_section_ring():
+
+    """
+    Test the shared-memory section handoff of the single reader
+    """
+
+    import multiprocessing as multi
+
+    from .sphelpers import spshared, sputilities
+
+    section_ring = spshared.SectionRing(2, 100*100*4, 25*25*4*4)
+
+    section_arrays = [np.float32(np.random.RandomState(slot).rand(100, 100)) for slot in range(0, 2)]
+
+    in_shapes = [section_ring.put_input(slot, section_arrays[slot]) for slot in range(0, 2)]
+
+    assert in_shapes[0] == ((100, 100), '<f4')
+
+    # A worker process computes the sections in place.
+    for slot in range(0, 2):
+
+        worker = multi.Process(target=_compute_shared_section, args=(section_ring, slot) + in_shapes[slot])
+
+        worker.start()
+        worker.join()
+
+        assert worker.exitcode == 0
+
+    for slot in range(0, 2):
+        assert np.array_equal(section_ring.get_output(slot, (1, 25, 25), '<f4'), _get_block_means(section_arrays[slot]))
+
+    # The views share the buffers, so the slots are independent.
+    section_ring.get_input(0, (100, 100), '<f4')[:] = 0
+
+    assert np.array_equal(section_ring.get_input(1, (100, 100), '<f4'), section_arrays[1])
+
+    # Double precision sections that do not fit are stored in single precision.
+    assert section_ring.put_input(0, np.float64(section_arrays[0]))[1] == '<f4'
+
+    try:
+        section_ring.put_input(0, np.zeros((101, 100), dtype='float32'))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('The oversized section was not rejected.')
+
+    parameter_object = sputilities.dict2class(dict(trigger='mean',
+                                                   spectral_indices=['ndvi', 'evi2'],
+                                                   use_rgb=False,
+                                                   fused_triggers=None,
+                                                   sect_row_size=1000,
+                                                   sect_col_size=1000,
+                                                   block=4,
+                                                   out_bands_dict=dict(mean=2),
+                                                   n_jobs=2,
+                                                   prefetch_mem=1024))
+
+    # Two slots per worker, unless the memory cap holds fewer.
+    assert spshared.get_ring_size(parameter_object) == (4, 1000*1000*4, 250*250*2*4)
+
+    parameter_object.update_info(prefetch_mem=9)
+
+    assert spshared.get_ring_size(parameter_object)[0] == 2
+
+    # The single reader gives the reference features.
+    _check_mean_features(io_mode='single', n_jobs=2)
+
+
+def test_result_store():
+
+    """
+    Test the result store keys, hits and misses
+    """
+
+    import tempfile
+
+    from . import spprocess
+    from .sphelpers import spresults, sputilities
+
+    store_dir = tempfile.mkdtemp()
+
+    try:
+
+        parameter_object = sputilities.dict2class(dict(result_store=store_dir,
+                                                       trigger='lac',
+                                                       band_position=1,
+                                                       use_rgb=False,
+                                                       block=4,
+                                                       scales=[8, 16],
+                                                       lac_r=2,
+                                                       image_min=0,
+                                                       image_max=255))
+
+        result_store, lac_key = spprocess._get_result_store_key(parameter_object, 'hash1', 0, 0, 100, 100)
+
+        assert lac_key == spprocess._get_result_store_key(parameter_object, 'hash1', 0, 0, 100, 100)[1]
+
+        # Changed input pixels, windows, bands, scales and trigger parameters miss the store.
+        assert lac_key != spprocess._get_result_store_key(parameter_object, 'hash2', 0, 0, 100, 100)[1]
+        assert lac_key != spprocess._get_result_store_key(parameter_object, 'hash1', 0, 100, 100, 100)[1]
+
+        for parameter_updates in [dict(band_position=2),
+                                  dict(scales=[8]),
+                                  dict(lac_r=3),
+                                  dict(image_max=200)]:
+
+            changed_parameter_object = sputilities.dict2class(sputilities.class2dict(parameter_object))
+            changed_parameter_object.update_info(**parameter_updates)
+
+            assert lac_key != spprocess._get_result_store_key(changed_parameter_object, 'hash1', 0, 0, 100, 100)[1]
+
+        # Parameters of other triggers do not change the key.
+        parameter_object.update_info(sfs_threshold=100)
+
+        assert lac_key == spprocess._get_result_store_key(parameter_object, 'hash1', 0, 0, 100, 100)[1]
+
+        features = np.float32(np.random.RandomState(0).rand(2, 25, 25))
+
+        assert result_store.get(lac_key) is None
+
+        result_store.put(lac_key, features)
+
+        assert np.array_equal(result_store.get(lac_key), features)
+
+        # Stored features are not overwritten.
+        result_store.put(lac_key, features * 2)
+
+        assert np.array_equal(result_store.get(lac_key), features)
+
+        # Without a store, nothing is looked up.
+        parameter_object.update_info(result_store=None)
+
+        assert spprocess._get_result_store_key(parameter_object, 'hash1', 0, 0, 100, 100) == (None, None)
+
+        shutil.rmtree(store_dir)
+
+        # A second run loads every section from the store.
+        _check_mean_features(result_store=store_dir)
+
+        n_stored = len(os.listdir(os.path.join(store_dir, 'mean_BD1')))
+
+        assert n_stored > 0
+
+        _check_mean_features(result_store=store_dir)
+
+        assert len(os.listdir(os.path.join(store_dir, 'mean_BD1'))) == n_stored
+
+    finally:
+
+        if os.path.isdir(store_dir):
+            shutil.rmtree(store_dir)
+
+
+def test_fused_indices():
+
+    """
+    Test that fused spectral indices match the indices computed separately
+    """
+
+    from . import spsplit
+    from .sphelpers import spindices, sputilities
+
+    parameter_object = sputilities.dict2class(dict(trigger='ndvi',
+                                                   triggers=['ndvi', 'mean', 'evi2', 'gndvi'],
+                                                   spectral_indices=['ndvi', 'evi2', 'gndvi'],
+                                                   approx=dict(gndvi=[16]),
+                                                   block=4,
+                                                   scales=[8, 16],
+                                                   image_min=0,
+                                                   image_max=1,
+                                                   equalize=False,
+                                                   equalize_adapt=False,
+                                                   smooth=0,
+                                                   global_stats=False,
+                                                   visualize=False,
+                                                   chunk_size=512,
+                                                   n_sects=1,
+                                                   n_jobs_chunk=1,
+                                                   lac_r=2,
+                                                   weight=False,
+                                                   sfs_threshold=80,
+                                                   sfs_skip=4))
+
+    # Indices with another approximation setting are not fused.
+    fused_triggers = spindices.get_fused_triggers(parameter_object)
+
+    assert fused_triggers == ['ndvi', 'evi2']
+
+    parameter_object.update_info(approx=None,
+                                 fused_triggers=fused_triggers)
+
+    index_stack = np.float32(np.random.RandomState(0).uniform(-1, 1, size=(2, 70, 83)))
+
+    fused_features = spsplit.get_section_stats(index_stack.copy(), 70, 83, parameter_object, 1)
+
+    separate_features = list()
+
+    for trigger_counter, trigger in enumerate(fused_triggers):
+
+        parameter_object.update_info(trigger=trigger,
+                                     fused_triggers=None)
+
+        separate_features.append(spsplit.get_section_stats(index_stack[trigger_counter].copy(), 70, 83, parameter_object, 1))
+
+    separate_features = np.concatenate(separate_features, axis=0)
+
+    # The fused features are ordered by index, then by scale.
+    assert fused_features.shape == separate_features.shape
+    assert np.allclose(fused_features, separate_features)